@@ -1,73 +1,209 @@
 from db_connection import get_db_connection, close_db_connection
+from resumen import (ajustar_canastillas, ajustar_movimientos_mes, sumar_movimiento_mes_actual, leer_resumen,
+                     ajustar_movimientos_periodo, leer_tendencia, RETENCION_CONTEOS_HORA_DIAS)
+from cache import cacheado, invalidar, limpiar_cache
+from versiones import incrementar_versiones, RECURSOS
+from eventos import publicar, conteos, mes_actual
+from sincronizacion import registrar_eliminaciones, leer_cambios, marca_actual, MarcaVencida
 from datetime import datetime, timedelta
 import logging
+from collections import defaultdict
 
 import json
+import re
+import base64
+import csv
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode
 from datetime import date
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Paginación de listados
+LIMITE_PAGINA = 100
+LIMITE_PAGINA_MAX = 500
+
+# Máximo de movimientos incluidos en el detalle de una canastilla
+LIMITE_MOVIMIENTOS_DETALLE = 50
+
+# Segundos que una lectura puede servirse desde la caché. Las escrituras
+# de este proceso invalidan sus entradas de inmediato.
+TTL_CACHE_LISTADOS = 5
+TTL_CACHE_DASHBOARD = 10
+TTL_CACHE_DETALLE = 30
+
+# Filas leídas por lote en las respuestas en streaming
+TAMANO_LOTE_STREAM = 1000
+
+# Cargas masivas: máximo de elementos por petición y de valores por sentencia SQL
+LIMITE_LOTE_MOVIMIENTOS = 5000
+LIMITE_LOTE_CANASTILLAS = 5000
+LIMITE_CONSULTA_LOTE = 5000
+TAMANO_BLOQUE_SQL = 500
+
+# Importación de CSV: filas por transacción y máximo de errores detallados
+TAMANO_LOTE_IMPORTACION = 1000
+MAX_ERRORES_REPORTADOS = 100
+
+# Tendencia del dashboard: tabla leída por cada granularidad, máximo de
+# puntos por respuesta y rango por defecto
+GRANULARIDADES_TENDENCIA = {
+    'hora': 'hora',
+    'dia': 'dia',
+    'semana': 'dia',
+    'mes': 'dia',
+    'trimestre': 'dia',
+    'anio': 'dia'
+}
+MAX_PUNTOS_TENDENCIA = 1000
+RANGO_TENDENCIA_DEFECTO = '6m'
+
+CAMPOS_CANASTILLA = ('id_canastilla', 'estado', 'ubicacion')
+
+CAMPOS_MOVIMIENTO = ('id_canastilla', 'tipo_movimiento', 'ubicacion_origen', 'ubicacion_destino', 'id_usuario_responsable')
+
+# Órdenes permitidos en el inventario: columna y dirección. El ID de la
+# canastilla siempre desempata para que el cursor sea único.
+ORDENES_INVENTARIO = {
+    'id_canastilla': (None, 'ASC'),
+    'estado': ('c.estado', 'ASC'),
+    'ubicacion': ('c.ubicacion', 'ASC'),
+    'fecha_ultimo_movimiento': ('c.fecha_ultimo_movimiento', 'DESC')
+}
+
+class ParametroInvalido(ValueError):
+    """
+    Parámetro de consulta con formato inválido; se responde con 400
+    """
+
+def _codificar_cursor(valores):
+    """
+    Convierte los valores de la última fila de una página en un token opaco
+    """
+    valores = [v.strftime('%Y-%m-%d %H:%M:%S.%f') if isinstance(v, datetime) else
+               v.isoformat() if isinstance(v, date) else v for v in valores]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode('utf-8')).decode('ascii')
+
+def _decodificar_cursor(token, cantidad):
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ParametroInvalido("Cursor de paginación inválido")
+    if not isinstance(valores, list) or len(valores) != cantidad:
+        raise ParametroInvalido("Cursor de paginación inválido")
+    return valores
+
+def _validar_limite(limite):
+    if limite is None:
+        return LIMITE_PAGINA
+    try:
+        limite = int(limite)
+    except (TypeError, ValueError):
+        raise ParametroInvalido("Límite de página inválido")
+    if limite < 1:
+        raise ParametroInvalido("Límite de página inválido")
+    return min(limite, LIMITE_PAGINA_MAX)
+
+def _prefijo_like(prefijo):
+    """
+    Escapa los comodines de LIKE para buscar por prefijo
+    """
+    return prefijo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def _validar_fecha(valor, nombre):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ParametroInvalido(f"Fecha inválida en '{nombre}', use el formato AAAA-MM-DD")
+
+def _abrir_stream(sql, parametros):
+    """
+    Ejecuta la consulta con un cursor sin buffer y retorna un generador que
+    entrega las filas por lotes, de modo que la memoria no crece con el
+    tamaño de la tabla. La consulta se ejecuta antes de retornar para poder
+    responder 500 si falla; la conexión se libera al agotar o cerrar el generador.
+    """
+    connection = get_db_connection(lectura=True)
+    if connection is None:
+        return {"error": "No se pudo conectar a la base de datos"}, 500
+
+    try:
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        cursor.execute(sql, parametros)
+    except Error as e:
+        logger.error(f"Error al abrir la consulta en streaming: {e}")
+        close_db_connection(connection)
+        return {"error": "Error interno del servidor"}, 500
+
+    def filas():
+        try:
+            while True:
+                lote = cursor.fetchmany(TAMANO_LOTE_STREAM)
+                if not lote:
+                    break
+                yield from lote
+        finally:
+            try:
+                cursor.close()
+            except Error:
+                # Quedaron filas sin leer (el cliente se desconectó); el pool
+                # descarta la conexión al no poder deshacer la transacción
+                pass
+            close_db_connection(connection)
+
+    return filas(), 200
+
+
+def _bloques(elementos, tamano=TAMANO_BLOQUE_SQL):
+    for inicio in range(0, len(elementos), tamano):
+        yield elementos[inicio:inicio + tamano]
+
+def _marcadores(cantidad):
+    return ", ".join(["%s"] * cantidad)
+
+def _estado_tras_movimiento(tipo_movimiento, ubicacion_destino):
+    """
+    Retorna la (ubicacion, estado) en que queda una canastilla tras un movimiento
+    """
+    if tipo_movimiento == 'entrada':
+        return ubicacion_destino, ('Disponible' if ubicacion_destino != 'Taller' else 'En Reparación')
+    # salida
+    return 'En Tránsito', 'En Tránsito'
+
+@cacheado(TTL_CACHE_DASHBOARD, lambda: ('dashboard',), RECURSOS)
 def get_dashboard_metrics():
     """
     Obtiene todas las métricas para el dashboard
     """
-    connection = get_db_connection()
+    connection = get_db_connection(lectura=True)
     if connection is None:
         return {"error": "No se pudo conectar a la base de datos"}, 500
 
     try:
         cursor = connection.cursor(dictionary=True)
 
-        # 1. Métricas básicas de canastillas
-        cursor.execute("SELECT COUNT(*) AS total FROM canastillas")
-        total = cursor.fetchone()['total']
-
-        cursor.execute("SELECT COUNT(*) AS disponibles FROM canastillas WHERE estado = 'Disponible'")
-        disponibles = cursor.fetchone()['disponibles']
-
-        cursor.execute("SELECT COUNT(*) AS en_movimiento FROM canastillas WHERE estado = 'En Tránsito'")
-        en_movimiento = cursor.fetchone()['en_movimiento']
+        # 1. Conteos por estado y por ubicación desde los contadores materializados
+        six_months_ago = datetime.now() - timedelta(days=180)
+        resumen = leer_resumen(cursor, six_months_ago.strftime('%Y-%m'))
 
-        cursor.execute("SELECT COUNT(*) AS en_mantenimiento FROM canastillas WHERE estado = 'En Reparación'")
-        en_mantenimiento = cursor.fetchone()['en_mantenimiento']
+        por_estado = resumen['por_estado']
+        total = sum(por_estado.values())
+        disponibles = por_estado.get('Disponible', 0)
+        en_movimiento = por_estado.get('En Tránsito', 0)
+        en_mantenimiento = por_estado.get('En Reparación', 0)
 
         # 2. Distribución por ubicación (para gráfico de barras)
-        cursor.execute("""
-            SELECT 
-                ubicacion,
-                COUNT(*) as cantidad 
-            FROM canastillas 
-            GROUP BY ubicacion
-            ORDER BY cantidad DESC
-        """)
-        ubicaciones_data = cursor.fetchall()
-        
+        ubicaciones_data = sorted(resumen['por_ubicacion'].items(), key=lambda item: item[1], reverse=True)
         grafico_barras = {
-            "labels": [row['ubicacion'] for row in ubicaciones_data],
-            "data": [row['cantidad'] for row in ubicaciones_data]
+            "labels": [ubicacion for ubicacion, _ in ubicaciones_data],
+            "data": [cantidad for _, cantidad in ubicaciones_data]
         }
 
         # 3. Tendencia de movimientos (últimos 6 meses)
-        six_months_ago = (datetime.now() - timedelta(days=180)).strftime('%Y-%m-%d')
-        
-        cursor.execute("""
-            SELECT 
-                DATE_FORMAT(fecha_movimiento, '%Y-%m') as mes,
-                COUNT(*) as movimientos 
-            FROM movimientos 
-            WHERE fecha_movimiento >= %s
-            GROUP BY mes 
-            ORDER BY mes
-        """, (six_months_ago,))
-        
-        tendencia_data = cursor.fetchall()
-        
         grafico_tendencia = {
-            "labels": [row['mes'] for row in tendencia_data],
-            "data": [row['movimientos'] for row in tendencia_data]
+            "labels": list(resumen['por_mes'].keys()),
+            "data": list(resumen['por_mes'].values())
         }
 
         # 4. Movimientos recientes (últimos 5 movimientos)
@@ -87,12 +223,6 @@ def get_dashboard_metrics():
         """)
         
         movimientos_recientes = cursor.fetchall()
-        
-        # Formatear fechas para JSON
-        for movimiento in movimientos_recientes:
-            if movimiento['fecha_movimiento']:
-                if isinstance(movimiento['fecha_movimiento'], (datetime, timedelta)):
-                    movimiento['fecha_movimiento'] = movimiento['fecha_movimiento'].strftime('%Y-%m-%d %H:%M:%S')
 
         return {
             "total": total,
@@ -109,99 +239,415 @@ def get_dashboard_metrics():
         return {"error": "Error interno del servidor"}, 500
         
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
-def get_inventario():
+def _sumar_meses(fecha, meses):
+    total = fecha.year * 12 + fecha.month - 1 + meses
+    return fecha.replace(year=total // 12, month=total % 12 + 1, day=1)
+
+def _inicio_periodo(fecha, granularidad):
     """
-    Obtiene todo el inventario de canastillas
+    Comienzo del período de la granularidad que contiene a `fecha`
     """
-    connection = get_db_connection()
+    if granularidad == 'hora':
+        return fecha.replace(minute=0, second=0, microsecond=0)
+    dia = fecha.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularidad == 'dia':
+        return dia
+    if granularidad == 'semana':
+        return dia - timedelta(days=dia.weekday())
+    if granularidad == 'mes':
+        return dia.replace(day=1)
+    if granularidad == 'trimestre':
+        return dia.replace(month=(dia.month - 1) // 3 * 3 + 1, day=1)
+    return dia.replace(month=1, day=1)
+
+def _siguiente_periodo(inicio, granularidad):
+    if granularidad == 'hora':
+        return inicio + timedelta(hours=1)
+    if granularidad == 'dia':
+        return inicio + timedelta(days=1)
+    if granularidad == 'semana':
+        return inicio + timedelta(days=7)
+    return _sumar_meses(inicio, {'mes': 1, 'trimestre': 3, 'anio': 12}[granularidad])
+
+def _etiqueta_periodo(inicio, granularidad):
+    if granularidad == 'hora':
+        return inicio.strftime('%Y-%m-%d %H:00')
+    if granularidad in ('dia', 'semana'):
+        return inicio.strftime('%Y-%m-%d')
+    if granularidad == 'mes':
+        return inicio.strftime('%Y-%m')
+    if granularidad == 'trimestre':
+        return f"{inicio.year}-T{(inicio.month - 1) // 3 + 1}"
+    return str(inicio.year)
+
+def _rango_tendencia(rango, desde, hasta, granularidad, ahora):
+    """
+    Retorna (inicio, fin) alineados a la granularidad. `desde` y `hasta`
+    (AAAA-MM-DD, ambos incluidos) tienen prioridad sobre `rango`, que es
+    un número seguido de h, d, m o a (horas, días, meses, años) contado
+    hacia atrás desde ahora.
+    """
+    try:
+        if desde or hasta:
+            fin = _validar_fecha(hasta, 'hasta') + timedelta(days=1) if hasta else ahora
+            inicio = _validar_fecha(desde, 'desde') if desde else fin - timedelta(days=30)
+        else:
+            coincidencia = re.fullmatch(r'(\d{1,4})([hdma])', rango or RANGO_TENDENCIA_DEFECTO)
+            if not coincidencia:
+                raise ParametroInvalido("Rango inválido, use por ejemplo 48h, 30d, 6m o 2a")
+            cantidad, unidad = int(coincidencia.group(1)), coincidencia.group(2)
+            fin = ahora
+            if unidad == 'h':
+                inicio = ahora - timedelta(hours=cantidad)
+            elif unidad == 'd':
+                inicio = ahora - timedelta(days=cantidad)
+            else:
+                inicio = _sumar_meses(ahora, -cantidad * (12 if unidad == 'a' else 1))
+
+        # El período en curso se incluye completo
+        inicio = _inicio_periodo(inicio, granularidad)
+        fin = _siguiente_periodo(_inicio_periodo(fin - timedelta(microseconds=1), granularidad), granularidad)
+    except ParametroInvalido:
+        raise
+    except (ValueError, OverflowError):
+        # Fechas fuera de lo que admite datetime (años 1 a 9999)
+        raise ParametroInvalido("Rango de fechas fuera de los límites admitidos")
+    if inicio >= fin:
+        raise ParametroInvalido("'desde' debe ser anterior a 'hasta'")
+    return inicio, fin
+
+@cacheado(TTL_CACHE_DASHBOARD, lambda *args, **kwargs: ('dashboard',), ('movimientos',))
+def get_tendencia(rango=None, desde=None, hasta=None, granularidad=None, ubicacion=None, tipo_movimiento=None):
+    """
+    Tendencia de movimientos por período, total y por tipo. Solo lee los
+    conteos por hora y por día de resumen_movimientos_periodo; semanas,
+    meses, trimestres y años se agregan a partir de los días. `ubicacion`
+    filtra los movimientos con esa ubicación de origen o destino.
+    """
+    granularidad = granularidad or 'mes'
+    if granularidad not in GRANULARIDADES_TENDENCIA:
+        return {"error": f"Granularidad inválida, use una de: {', '.join(GRANULARIDADES_TENDENCIA)}"}, 400
+    if tipo_movimiento and tipo_movimiento not in ('entrada', 'salida'):
+        return {"error": "Tipo de movimiento inválido"}, 400
+
+    try:
+        ahora = datetime.now()
+        inicio, fin = _rango_tendencia(rango, desde, hasta, granularidad, ahora)
+    except ParametroInvalido as e:
+        return {"error": str(e)}, 400
+    if granularidad == 'hora' and inicio < ahora - timedelta(days=RETENCION_CONTEOS_HORA_DIAS):
+        return {"error": f"Los conteos por hora solo se conservan {RETENCION_CONTEOS_HORA_DIAS} días"}, 400
+
+    periodos = []
+    periodo = inicio
+    while periodo < fin:
+        if len(periodos) == MAX_PUNTOS_TENDENCIA:
+            return {"error": f"El rango supera el máximo de {MAX_PUNTOS_TENDENCIA} puntos para la granularidad '{granularidad}'"}, 400
+        periodos.append(periodo)
+        periodo = _siguiente_periodo(periodo, granularidad)
+
+    connection = get_db_connection(lectura=True)
+    if connection is None:
+        return {"error": "No se pudo conectar a la base de datos"}, 500
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+        filas = leer_tendencia(cursor, GRANULARIDADES_TENDENCIA[granularidad], inicio, fin, ubicacion, tipo_movimiento)
+
+        posiciones = {periodo: indice for indice, periodo in enumerate(periodos)}
+        total = [0] * len(periodos)
+        por_tipo = defaultdict(lambda: [0] * len(periodos))
+        for inicio_fila, tipo, movimientos in filas:
+            indice = posiciones.get(_inicio_periodo(inicio_fila, granularidad))
+            if indice is None:
+                continue
+            total[indice] += movimientos
+            por_tipo[tipo][indice] += movimientos
+
+        return {
+            "granularidad": granularidad,
+            "desde": inicio,
+            "hasta": fin,
+            "ubicacion": ubicacion,
+            "labels": [_etiqueta_periodo(periodo, granularidad) for periodo in periodos],
+            "data": total,
+            "por_tipo": dict(por_tipo)
+        }, 200
+
+    except Error as e:
+        logger.error(f"Error al obtener la tendencia de movimientos: {e}")
+        return {"error": "Error interno del servidor"}, 500
+
+    finally:
+        if connection:
+            cursor.close()
+            close_db_connection(connection)
+
+def _filtros_inventario(estado, ubicacion, busqueda):
+    """
+    Construye las condiciones WHERE de los listados del inventario
+    """
+    condiciones = []
+    parametros = []
+
+    if estado:
+        condiciones.append("c.estado = %s")
+        parametros.append(estado)
+    if ubicacion:
+        condiciones.append("c.ubicacion = %s")
+        parametros.append(ubicacion)
+    if busqueda:
+        condiciones.append("c.id_canastilla LIKE %s")
+        parametros.append(_prefijo_like(busqueda))
+
+    return condiciones, parametros
+
+def _condicion_cursor_orden(columna, direccion, valor, id_canastilla):
+    """
+    Condición que continúa después de la fila (valor, id_canastilla) en el
+    orden (columna, id_canastilla). MySQL ordena los NULL antes que
+    cualquier valor: primero en ASC y al final en DESC, y con ellos no
+    sirve comparar con = ni con < o >.
+    """
+    if direccion == 'ASC':
+        if valor is None:
+            return f"({columna} IS NULL AND c.id_canastilla > %s OR {columna} IS NOT NULL)", [id_canastilla]
+        return f"({columna} > %s OR ({columna} = %s AND c.id_canastilla > %s))", [valor, valor, id_canastilla]
+    if valor is None:
+        return f"({columna} IS NULL AND c.id_canastilla < %s)", [id_canastilla]
+    return (f"({columna} < %s OR ({columna} = %s AND c.id_canastilla < %s) OR {columna} IS NULL)",
+            [valor, valor, id_canastilla])
+
+@cacheado(TTL_CACHE_LISTADOS, lambda *args, **kwargs: ('inventario',), ('canastillas', 'usuarios'))
+def get_inventario(estado=None, ubicacion=None, busqueda=None, orden=None, cursor_pagina=None, limite=None):
+    """
+    Obtiene una página del inventario de canastillas.
+    `busqueda` filtra por prefijo del ID. En la primera página (sin cursor) la
+    misma consulta retorna el total de coincidencias y los conteos por estado.
+    """
+    try:
+        limite = _validar_limite(limite)
+        orden = orden or 'id_canastilla'
+        if orden not in ORDENES_INVENTARIO:
+            raise ParametroInvalido("Orden inválido")
+        columna_orden, direccion = ORDENES_INVENTARIO[orden]
+        comparador = '>' if direccion == 'ASC' else '<'
+        condiciones, parametros = _filtros_inventario(estado, ubicacion, busqueda)
+
+        condiciones_pagina = list(condiciones)
+        parametros_pagina = list(parametros)
+        if cursor_pagina:
+            if columna_orden:
+                valor, id_canastilla = _decodificar_cursor(cursor_pagina, 2)
+                condicion, parametros_cursor = _condicion_cursor_orden(columna_orden, direccion, valor, id_canastilla)
+                condiciones_pagina.append(condicion)
+                parametros_pagina.extend(parametros_cursor)
+            else:
+                id_canastilla, = _decodificar_cursor(cursor_pagina, 1)
+                condiciones_pagina.append(f"c.id_canastilla {comparador} %s")
+                parametros_pagina.append(id_canastilla)
+    except ParametroInvalido as e:
+        return {"error": str(e)}, 400
+
+    connection = get_db_connection(lectura=True)
     if connection is None:
         return {"error": "No se pudo conectar a la base de datos"}, 500
     
     try:
         cursor = connection.cursor(dictionary=True)
-        
-        cursor.execute("""
+
+        where = ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
+        where_pagina = ("WHERE " + " AND ".join(condiciones_pagina)) if condiciones_pagina else ""
+        orden_sql = f"c.id_canastilla {direccion}"
+        if columna_orden:
+            orden_sql = f"{columna_orden} {direccion}, " + orden_sql
+
+        # Se pide una fila de más para saber si hay otra página
+        consulta_pagina = f"""
             SELECT 
+                'fila' AS seccion,
                 c.id_canastilla,
                 c.estado,
                 c.ubicacion,
                 u.nombre as usuario_asignado,
-                c.fecha_ultimo_movimiento
+                c.fecha_ultimo_movimiento,
+                NULL AS cantidad
             FROM canastillas c
             LEFT JOIN usuarios u ON c.id_usuario_asignado = u.id_usuario
-            ORDER BY c.id_canastilla
-        """)
-        
-        inventario = cursor.fetchall()
+            {where_pagina}
+            ORDER BY {orden_sql}
+            LIMIT %s
+        """
+
+        if cursor_pagina:
+            cursor.execute(consulta_pagina, parametros_pagina + [limite + 1])
+        else:
+            # Conteos por estado y página en un solo viaje
+            cursor.execute(f"""
+                (SELECT 
+                    'conteo' AS seccion,
+                    NULL AS id_canastilla,
+                    c.estado,
+                    NULL AS ubicacion,
+                    NULL AS usuario_asignado,
+                    NULL AS fecha_ultimo_movimiento,
+                    COUNT(*) AS cantidad
+                FROM canastillas c
+                {where}
+                GROUP BY c.estado)
+                UNION ALL
+                ({consulta_pagina})
+                ORDER BY seccion, {orden_sql.replace('c.', '')}
+            """, parametros + parametros_pagina + [limite + 1])
+
+        inventario = []
+        conteos = {}
+        for row in cursor.fetchall():
+            seccion = row.pop('seccion')
+            cantidad = row.pop('cantidad')
+            if seccion == 'conteo':
+                conteos[row['estado']] = int(cantidad)
+            else:
+                inventario.append(row)
+
+        siguiente_cursor = None
+        if len(inventario) > limite:
+            inventario = inventario[:limite]
+            ultimo = inventario[-1]
+            valores = [ultimo['id_canastilla']]
+            if columna_orden:
+                valores.insert(0, ultimo[columna_orden[2:]])
+            siguiente_cursor = _codificar_cursor(valores)
         
-        # Formatear fechas para JSON
-        for item in inventario:
-            if item['fecha_ultimo_movimiento']:
-                if isinstance(item['fecha_ultimo_movimiento'], (datetime, date)):
-                    item['fecha_ultimo_movimiento'] = item['fecha_ultimo_movimiento'].strftime('%Y-%m-%d')
 
-        return {"data": inventario}, 200
+        respuesta = {"data": inventario, "siguiente_cursor": siguiente_cursor}
+        if not cursor_pagina:
+            respuesta["total"] = sum(conteos.values())
+            respuesta["conteos"] = conteos
+        return respuesta, 200
 
     except Exception as e:
         logger.error(f"Error al obtener el inventario: {e}")
         return {"error": "Error interno del servidor"}, 500
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
-def get_movimientos():
+def _filtros_movimientos(tipo_movimiento, desde, hasta, id_canastilla, id_usuario):
     """
-    Obtiene todos los movimientos
+    Construye las condiciones WHERE de los listados de movimientos
     """
-    connection = get_db_connection()
+    condiciones = []
+    parametros = []
+
+    if tipo_movimiento:
+        condiciones.append("m.tipo_movimiento = %s")
+        parametros.append(tipo_movimiento)
+    if desde:
+        condiciones.append("m.fecha_movimiento >= %s")
+        parametros.append(_validar_fecha(desde, 'desde'))
+    if hasta:
+        # 'hasta' incluye el día completo; el último día de datetime no tiene
+        # día siguiente y equivale a no poner límite
+        fin = _validar_fecha(hasta, 'hasta')
+        if fin.date() < date.max:
+            condiciones.append("m.fecha_movimiento < %s")
+            parametros.append(fin + timedelta(days=1))
+    if id_canastilla:
+        condiciones.append("m.id_canastilla = %s")
+        parametros.append(id_canastilla)
+    if id_usuario:
+        try:
+            parametros.append(int(id_usuario))
+        except ValueError:
+            raise ParametroInvalido("ID de usuario inválido")
+        condiciones.append("m.id_usuario_responsable = %s")
+
+    return condiciones, parametros
+
+def _condicion_cursor_movimientos(cursor_pagina, condiciones, parametros):
+    """
+    Agrega la condición que continúa después de la última fila de la página anterior
+    """
+    fecha, id_movimiento = _decodificar_cursor(cursor_pagina, 2)
+    condiciones.append("(m.fecha_movimiento < %s OR (m.fecha_movimiento = %s AND m.id_movimiento < %s))")
+    parametros.extend([fecha, fecha, id_movimiento])
+
+def _pagina_movimientos(cursor, condiciones, parametros, limite):
+    """
+    Ejecuta la consulta de una página de movimientos, del más reciente al
+    más antiguo. Retorna (movimientos, siguiente_cursor).
+    """
+    where = ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
+    # Se pide una fila de más para saber si hay otra página
+    cursor.execute(f"""
+        SELECT 
+            m.id_movimiento,
+            m.id_canastilla,
+            m.tipo_movimiento,
+            m.ubicacion_origen,
+            m.ubicacion_destino,
+            u.nombre as usuario_responsable,
+            m.fecha_movimiento
+        FROM movimientos m
+        LEFT JOIN usuarios u ON m.id_usuario_responsable = u.id_usuario
+        {where}
+        ORDER BY m.fecha_movimiento DESC, m.id_movimiento DESC
+        LIMIT %s
+    """, parametros + [limite + 1])
+
+    movimientos = cursor.fetchall()
+
+    siguiente_cursor = None
+    if len(movimientos) > limite:
+        movimientos = movimientos[:limite]
+        ultimo = movimientos[-1]
+        siguiente_cursor = _codificar_cursor([ultimo['fecha_movimiento'], ultimo['id_movimiento']])
+    return movimientos, siguiente_cursor
+
+def get_movimientos(tipo_movimiento=None, desde=None, hasta=None, id_canastilla=None,
+                    id_usuario=None, cursor_pagina=None, limite=None):
+    """
+    Obtiene una página de movimientos, del más reciente al más antiguo.
+    La paginación es por cursor sobre (fecha_movimiento, id_movimiento):
+    `cursor_pagina` es el valor `siguiente_cursor` de la página anterior.
+    """
+    try:
+        limite = _validar_limite(limite)
+        condiciones, parametros = _filtros_movimientos(tipo_movimiento, desde, hasta, id_canastilla, id_usuario)
+        if cursor_pagina:
+            _condicion_cursor_movimientos(cursor_pagina, condiciones, parametros)
+    except ParametroInvalido as e:
+        return {"error": str(e)}, 400
+
+    connection = get_db_connection(lectura=True)
     if connection is None:
         return {"error": "No se pudo conectar a la base de datos"}, 500
     
     try:
         cursor = connection.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT 
-                m.id_movimiento,
-                m.id_canastilla,
-                m.tipo_movimiento,
-                m.ubicacion_origen,
-                m.ubicacion_destino,
-                u.nombre as usuario_responsable,
-                m.fecha_movimiento
-            FROM movimientos m
-            LEFT JOIN usuarios u ON m.id_usuario_responsable = u.id_usuario
-            ORDER BY m.fecha_movimiento DESC
-        """)
-        
-        movimientos = cursor.fetchall()
-        
-        # Formatear fechas para JSON
-        for movimiento in movimientos:
-            if movimiento['fecha_movimiento']:
-                if isinstance(movimiento['fecha_movimiento'], (datetime, date)):
-                    movimiento['fecha_movimiento'] = movimiento['fecha_movimiento'].strftime('%Y-%m-%d %H:%M:%S')
-
-        return {"data": movimientos}, 200
+        movimientos, siguiente_cursor = _pagina_movimientos(cursor, condiciones, parametros, limite)
+        return {"data": movimientos, "siguiente_cursor": siguiente_cursor}, 200
 
     except Exception as e:
         logger.error(f"Error al obtener movimientos: {e}")
         return {"error": "Error interno del servidor"}, 500
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
+@cacheado(TTL_CACHE_DETALLE, lambda id_movimiento: (f'movimiento:{id_movimiento}',), ('movimientos', 'usuarios'))
 def get_movimiento_by_id(id_movimiento):
     """
     Obtiene un movimiento específico por ID
     """
-    connection = get_db_connection()
+    connection = get_db_connection(lectura=True)
     if connection is None:
         return {"error": "No se pudo conectar a la base de datos"}, 500
     
@@ -227,11 +673,6 @@ def get_movimiento_by_id(id_movimiento):
         
         if not movimiento:
             return {"error": "Movimiento no encontrado"}, 404
-        
-        # Formatear fecha para JSON
-        if movimiento['fecha_movimiento']:
-            if isinstance(movimiento['fecha_movimiento'], (datetime, date)):
-                movimiento['fecha_movimiento'] = movimiento['fecha_movimiento'].strftime('%Y-%m-%d %H:%M:%S')
 
         return {"data": movimiento}, 200
 
@@ -239,7 +680,7 @@ def get_movimiento_by_id(id_movimiento):
         logger.error(f"Error al obtener el movimiento: {e}")
         return {"error": "Error interno del servidor"}, 500
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
@@ -254,32 +695,230 @@ def add_canastilla(id_canastilla, estado, ubicacion):
     try:
         cursor = connection.cursor()
         
-        # Verificar si la canastilla ya existe
-        cursor.execute("SELECT id_canastilla FROM canastillas WHERE id_canastilla = %s", (id_canastilla,))
-        if cursor.fetchone():
-            return {"error": "Ya existe una canastilla con este ID"}, 400
-        
-        # Insertar nueva canastilla
+        # Insertar nueva canastilla; la clave primaria rechaza un ID repetido
         sql = """
             INSERT INTO canastillas (id_canastilla, estado, ubicacion, fecha_ultimo_movimiento)
             VALUES (%s, %s, %s, NOW())
         """
         
         cursor.execute(sql, (id_canastilla, estado, ubicacion))
+        ajustar_canastillas(cursor, [((ubicacion, estado), 1)])
+        incrementar_versiones(cursor, 'canastillas')
         connection.commit()
+        invalidar('inventario', 'dashboard', f'canastilla:{id_canastilla}')
+        publicar('canastillas', {"conteos": conteos([((ubicacion, estado), 1)])})
         
         return {"message": f"Canastilla {id_canastilla} agregada con éxito"}, 201
 
     except Error as e:
         connection.rollback()
+        if e.errno == errorcode.ER_DUP_ENTRY:
+            return {"error": "Ya existe una canastilla con este ID"}, 400
         logger.error(f"Error al agregar canastilla: {e}")
         return {"error": "Error al agregar la canastilla"}, 500
         
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
+def _validar_canastilla(datos):
+    """
+    Retorna (id_canastilla, estado, ubicacion) o None si faltan datos
+    """
+    if not isinstance(datos, dict):
+        return None
+    valores = tuple(str(datos.get(campo) or '').strip() for campo in CAMPOS_CANASTILLA)
+    return valores if all(valores) else None
+
+def _insertar_canastillas(cursor, filas):
+    """
+    Inserta un bloque de (id_canastilla, estado, ubicacion) omitiendo los IDs
+    que ya existen o que se repiten en el bloque. Retorna (cambios aplicados
+    al resumen, una por canastilla insertada; IDs duplicados).
+    """
+    ids = sorted({fila[0] for fila in filas})
+    existentes = set()
+    for bloque in _bloques(ids):
+        cursor.execute(f"""
+            SELECT id_canastilla FROM canastillas
+            WHERE id_canastilla IN ({_marcadores(len(bloque))})
+            FOR UPDATE
+        """, bloque)
+        existentes.update(row[0] for row in cursor.fetchall())
+
+    nuevas = []
+    duplicadas = []
+    for fila in filas:
+        if fila[0] in existentes:
+            duplicadas.append(fila[0])
+        else:
+            existentes.add(fila[0])
+            nuevas.append(fila)
+
+    sql = """
+        INSERT INTO canastillas (id_canastilla, estado, ubicacion, fecha_ultimo_movimiento)
+        VALUES (%s, %s, %s, NOW())
+    """
+    insertadas = []
+    for bloque in _bloques(nuevas):
+        try:
+            cursor.executemany(sql, bloque)
+            insertadas.extend(bloque)
+        except Error as e:
+            if e.errno != errorcode.ER_DUP_ENTRY:
+                raise
+            # Otra transacción insertó alguno de los IDs después de la
+            # consulta. La sentencia se deshizo completa; se reintenta fila
+            # por fila para contar solo las que realmente se insertan.
+            for fila in bloque:
+                try:
+                    cursor.execute(sql, fila)
+                    insertadas.append(fila)
+                except Error as e:
+                    if e.errno != errorcode.ER_DUP_ENTRY:
+                        raise
+                    duplicadas.append(fila[0])
+
+    cambios = [((ubicacion, estado), 1) for _, estado, ubicacion in insertadas]
+    ajustar_canastillas(cursor, cambios)
+
+    return cambios, duplicadas
+
+def add_canastillas_lote(canastillas):
+    """
+    Registra un lote de canastillas en una sola transacción. Reporta las
+    aceptadas, los IDs duplicados y los índices de los elementos inválidos.
+    """
+    if not isinstance(canastillas, list) or not canastillas:
+        return {"error": "Se esperaba una lista de canastillas"}, 400
+    if len(canastillas) > LIMITE_LOTE_CANASTILLAS:
+        return {"error": f"El lote supera el máximo de {LIMITE_LOTE_CANASTILLAS} canastillas"}, 400
+
+    filas = []
+    invalidas = []
+    for indice, datos in enumerate(canastillas):
+        fila = _validar_canastilla(datos)
+        if fila:
+            filas.append(fila)
+        else:
+            invalidas.append(indice)
+
+    aceptadas = 0
+    duplicadas = []
+    if filas:
+        connection = get_db_connection()
+        if connection is None:
+            return {"error": "No se pudo conectar a la base de datos"}, 500
+
+        try:
+            cursor = connection.cursor()
+            cambios, duplicadas = _insertar_canastillas(cursor, filas)
+            incrementar_versiones(cursor, 'canastillas')
+            connection.commit()
+            invalidar('inventario', 'dashboard')
+            aceptadas = len(cambios)
+            if cambios:
+                publicar('canastillas', {"conteos": conteos(cambios)})
+
+        except Error as e:
+            connection.rollback()
+            logger.error(f"Error al registrar el lote de canastillas: {e}")
+            return {"error": "Error al registrar el lote de canastillas"}, 500
+
+        finally:
+            if connection:
+                cursor.close()
+                close_db_connection(connection)
+
+    return {
+        "aceptadas": aceptadas,
+        "duplicadas": len(duplicadas),
+        "invalidas": len(invalidas),
+        "ids_duplicados": duplicadas,
+        "indices_invalidos": invalidas
+    }, 200
+
+def importar_canastillas_csv(archivo):
+    """
+    Importa canastillas desde un CSV con encabezado id_canastilla,estado,ubicacion.
+    El archivo se lee como flujo y se confirma cada TAMANO_LOTE_IMPORTACION
+    filas, así la memoria no depende del tamaño del archivo.
+    """
+    lector = csv.DictReader(archivo)
+    if not lector.fieldnames or any(campo not in lector.fieldnames for campo in CAMPOS_CANASTILLA):
+        return {"error": "El CSV debe tener las columnas id_canastilla, estado y ubicacion"}, 400
+
+    connection = get_db_connection()
+    if connection is None:
+        return {"error": "No se pudo conectar a la base de datos"}, 500
+
+    aceptadas = 0
+    duplicadas = 0
+    invalidas = 0
+    errores = []
+
+    def reportar(linea, mensaje):
+        if len(errores) < MAX_ERRORES_REPORTADOS:
+            errores.append({"linea": linea, "error": mensaje})
+
+    try:
+        cursor = connection.cursor()
+        lote = []
+        for datos in lector:
+            fila = _validar_canastilla(datos)
+            if fila:
+                lote.append(fila)
+            else:
+                invalidas += 1
+                reportar(lector.line_num, "Datos incompletos")
+
+            if len(lote) >= TAMANO_LOTE_IMPORTACION:
+                cambios, repetidas = _insertar_canastillas(cursor, lote)
+                incrementar_versiones(cursor, 'canastillas')
+                connection.commit()
+                invalidar('inventario', 'dashboard')
+                if cambios:
+                    publicar('canastillas', {"conteos": conteos(cambios)})
+                aceptadas += len(cambios)
+                duplicadas += len(repetidas)
+                lote = []
+
+        if lote:
+            cambios, repetidas = _insertar_canastillas(cursor, lote)
+            incrementar_versiones(cursor, 'canastillas')
+            connection.commit()
+            invalidar('inventario', 'dashboard')
+            if cambios:
+                publicar('canastillas', {"conteos": conteos(cambios)})
+            aceptadas += len(cambios)
+            duplicadas += len(repetidas)
+
+    except csv.Error as e:
+        connection.rollback()
+        reportar(lector.line_num, f"CSV mal formado: {e}")
+        return {"error": "CSV mal formado", "aceptadas": aceptadas, "duplicadas": duplicadas,
+                "invalidas": invalidas, "errores": errores}, 400
+
+    except Error as e:
+        connection.rollback()
+        logger.error(f"Error al importar canastillas: {e}")
+        return {"error": "Error al importar canastillas", "aceptadas": aceptadas, "duplicadas": duplicadas,
+                "invalidas": invalidas, "errores": errores}, 500
+
+    finally:
+        if connection:
+            cursor.close()
+            close_db_connection(connection)
+
+    return {
+        "aceptadas": aceptadas,
+        "duplicadas": duplicadas,
+        "invalidas": invalidas,
+        "errores": errores,
+        "errores_omitidos": max(0, invalidas - len(errores))
+    }, 200
+
 def add_movimiento(id_canastilla, tipo_movimiento, ubicacion_origen, ubicacion_destino, id_usuario_responsable):
     """
     Agrega un nuevo movimiento a la base de datos
@@ -291,9 +930,10 @@ def add_movimiento(id_canastilla, tipo_movimiento, ubicacion_origen, ubicacion_d
     try:
         cursor = connection.cursor()
         
-        # Verificar si la canastilla existe
-        cursor.execute("SELECT id_canastilla FROM canastillas WHERE id_canastilla = %s", (id_canastilla,))
-        if not cursor.fetchone():
+        # Verificar si la canastilla existe y bloquearla hasta el commit
+        cursor.execute("SELECT ubicacion, estado FROM canastillas WHERE id_canastilla = %s FOR UPDATE", (id_canastilla,))
+        canastilla = cursor.fetchone()
+        if not canastilla:
             return {"error": "No existe una canastilla con este ID"}, 400
         
         # Insertar nuevo movimiento
@@ -303,14 +943,10 @@ def add_movimiento(id_canastilla, tipo_movimiento, ubicacion_origen, ubicacion_d
         """
         
         cursor.execute(sql, (id_canastilla, tipo_movimiento, ubicacion_origen, ubicacion_destino, id_usuario_responsable))
+        id_movimiento = cursor.lastrowid
         
         # Actualizar la ubicación de la canastilla
-        if tipo_movimiento == 'entrada':
-            nueva_ubicacion = ubicacion_destino
-            nuevo_estado = 'Disponible' if ubicacion_destino != 'Taller' else 'En Reparación'
-        else:  # salida
-            nueva_ubicacion = 'En Tránsito'
-            nuevo_estado = 'En Tránsito'
+        nueva_ubicacion, nuevo_estado = _estado_tras_movimiento(tipo_movimiento, ubicacion_destino)
         
         update_sql = """
             UPDATE canastillas 
@@ -320,7 +956,27 @@ def add_movimiento(id_canastilla, tipo_movimiento, ubicacion_origen, ubicacion_d
         
         cursor.execute(update_sql, (nueva_ubicacion, nuevo_estado, id_canastilla))
         
+        # Actualizar contadores del dashboard
+        cambios = [(tuple(canastilla), -1), ((nueva_ubicacion, nuevo_estado), 1)]
+        ajustar_canastillas(cursor, cambios)
+        sumar_movimiento_mes_actual(cursor)
+        ajustar_movimientos_periodo(cursor, [((None, tipo_movimiento, ubicacion_origen, ubicacion_destino), 1)])
+        
+        incrementar_versiones(cursor, 'canastillas', 'movimientos')
         connection.commit()
+        invalidar('inventario', 'dashboard', f'canastilla:{id_canastilla}')
+        publicar('movimiento', {
+            "movimiento": {
+                "id_movimiento": id_movimiento,
+                "id_canastilla": id_canastilla,
+                "tipo_movimiento": tipo_movimiento,
+                "ubicacion_origen": ubicacion_origen,
+                "ubicacion_destino": ubicacion_destino,
+                "id_usuario_responsable": id_usuario_responsable,
+                "fecha_movimiento": datetime.now()
+            },
+            "conteos": conteos(cambios, [(mes_actual(), 1)])
+        })
         
         return {"message": f"Movimiento registrado con éxito para la canastilla {id_canastilla}"}, 201
 
@@ -330,10 +986,189 @@ def add_movimiento(id_canastilla, tipo_movimiento, ubicacion_origen, ubicacion_d
         return {"error": "Error al registrar el movimiento"}, 500
         
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
+def _ids_insertados(cursor, filas):
+    """
+    IDs de los movimientos de `filas` recién insertados, en el mismo orden.
+    Con innodb_autoinc_lock_mode = 2 los IDs de un INSERT de varias filas
+    pueden no ser consecutivos, así que se leen de vuelta: las canastillas
+    siguen bloqueadas, y sus movimientos más recientes son los del lote.
+    Retorna None si no se encuentran todos.
+    """
+    por_canastilla = defaultdict(int)
+    for fila in filas:
+        por_canastilla[fila[0]] += 1
+    ids = []
+    for bloque in _bloques(sorted(por_canastilla)):
+        cursor.execute(f"""
+            SELECT id_movimiento FROM movimientos
+            WHERE id_canastilla IN ({_marcadores(len(bloque))})
+            ORDER BY id_movimiento DESC
+            LIMIT %s
+        """, bloque + [sum(por_canastilla[id_canastilla] for id_canastilla in bloque)])
+        ids.extend(fila[0] for fila in cursor.fetchall())
+    if len(ids) != len(filas):
+        logger.warning(f"Se esperaban {len(filas)} IDs de movimientos insertados y se leyeron {len(ids)}")
+        return None
+    # Cada INSERT asigna IDs crecientes en el orden de sus filas
+    return sorted(ids)
+
+def add_movimientos_lote(movimientos, eventos_individuales=False):
+    """
+    Registra un lote de movimientos en una sola transacción. Las canastillas
+    se validan con consultas por conjunto, los movimientos se insertan con
+    INSERT de múltiples filas y el nuevo estado de las canastillas se aplica
+    con un UPDATE por cada estado destino. Retorna el resultado de cada
+    elemento en el mismo orden del lote. Con `eventos_individuales` se publica
+    un evento 'movimiento' por fila en lugar del resumen 'movimientos_lote'.
+    """
+    if not isinstance(movimientos, list) or not movimientos:
+        return {"error": "Se esperaba una lista de movimientos"}, 400
+    if len(movimientos) > LIMITE_LOTE_MOVIMIENTOS:
+        return {"error": f"El lote supera el máximo de {LIMITE_LOTE_MOVIMIENTOS} movimientos"}, 400
+
+    resultados = [None] * len(movimientos)
+    validos = []
+    for indice, movimiento in enumerate(movimientos):
+        if isinstance(movimiento, dict) and all(movimiento.get(campo) for campo in CAMPOS_MOVIMIENTO):
+            validos.append((indice, movimiento))
+        else:
+            resultados[indice] = {"indice": indice, "status": 400, "error": "Datos incompletos"}
+
+    registrados = 0
+    if validos:
+        connection = get_db_connection()
+        if connection is None:
+            return {"error": "No se pudo conectar a la base de datos"}, 500
+
+        try:
+            cursor = connection.cursor()
+
+            # Estado actual de todas las canastillas del lote, bloqueadas hasta
+            # el commit. Se ordenan para bloquear siempre en el mismo orden.
+            ids = sorted({str(movimiento['id_canastilla']) for _, movimiento in validos})
+            estados = {}
+            for bloque in _bloques(ids):
+                cursor.execute(f"""
+                    SELECT id_canastilla, ubicacion, estado FROM canastillas
+                    WHERE id_canastilla IN ({_marcadores(len(bloque))})
+                    FOR UPDATE
+                """, bloque)
+                for id_canastilla, ubicacion, estado in cursor.fetchall():
+                    estados[id_canastilla] = (ubicacion, estado)
+
+            # Aplicar los movimientos en orden: si una canastilla aparece varias
+            # veces, cada movimiento parte del estado que dejó el anterior
+            filas = []
+            cambios_resumen = []
+            estado_final = {}
+            for indice, movimiento in validos:
+                id_canastilla = str(movimiento['id_canastilla'])
+                if id_canastilla not in estados:
+                    resultados[indice] = {"indice": indice, "status": 400, "error": "No existe una canastilla con este ID"}
+                    continue
+
+                nuevo = _estado_tras_movimiento(movimiento['tipo_movimiento'], movimiento['ubicacion_destino'])
+                cambios_resumen.extend([(estados[id_canastilla], -1), (nuevo, 1)])
+                estados[id_canastilla] = nuevo
+                estado_final[id_canastilla] = nuevo
+                filas.append((id_canastilla, movimiento['tipo_movimiento'], movimiento['ubicacion_origen'],
+                              movimiento['ubicacion_destino'], movimiento['id_usuario_responsable']))
+                resultados[indice] = {"indice": indice, "status": 201, "id_canastilla": id_canastilla}
+
+            for bloque in _bloques(filas):
+                cursor.executemany("""
+                    INSERT INTO movimientos (id_canastilla, tipo_movimiento, ubicacion_origen, ubicacion_destino, id_usuario_responsable)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, bloque)
+
+            ids_movimientos = None
+            if filas and eventos_individuales:
+                ids_movimientos = _ids_insertados(cursor, filas)
+
+            # Un UPDATE por cada (ubicacion, estado) destino
+            por_estado = defaultdict(list)
+            for id_canastilla, nuevo in estado_final.items():
+                por_estado[nuevo].append(id_canastilla)
+            for (ubicacion, estado), ids_estado in sorted(por_estado.items()):
+                for bloque in _bloques(sorted(ids_estado)):
+                    cursor.execute(f"""
+                        UPDATE canastillas
+                        SET ubicacion = %s, estado = %s, fecha_ultimo_movimiento = NOW()
+                        WHERE id_canastilla IN ({_marcadores(len(bloque))})
+                    """, [ubicacion, estado] + bloque)
+
+            # Actualizar contadores del dashboard
+            if filas:
+                ajustar_canastillas(cursor, cambios_resumen)
+                sumar_movimiento_mes_actual(cursor, len(filas))
+                ajustar_movimientos_periodo(cursor, [((None,) + fila[1:4], 1) for fila in filas])
+                incrementar_versiones(cursor, 'canastillas', 'movimientos')
+
+            connection.commit()
+            registrados = len(filas)
+            try:
+                invalidar('inventario', 'dashboard', *(f'canastilla:{id_canastilla}' for id_canastilla in estado_final))
+                if ids_movimientos:
+                    # Movimientos de la cola de escritura: el mismo evento que add_movimiento
+                    ahora = datetime.now()
+                    for posicion, (fila, id_movimiento) in enumerate(zip(filas, ids_movimientos)):
+                        publicar('movimiento', {
+                            "movimiento": dict(zip(CAMPOS_MOVIMIENTO, fila), id_movimiento=id_movimiento,
+                                               fecha_movimiento=ahora),
+                            "conteos": conteos(cambios_resumen[2 * posicion:2 * posicion + 2], [(mes_actual(), 1)])
+                        })
+                elif filas:
+                    # Un solo evento con el total: el lote puede tener miles de movimientos
+                    publicar('movimientos_lote', {
+                        "cantidad": len(filas),
+                        "conteos": conteos(cambios_resumen, [(mes_actual(), len(filas))])
+                    })
+            except Exception as e:
+                # El lote ya está confirmado: un fallo aquí no puede convertirlo en
+                # error, o el cliente reintentaría y duplicaría los movimientos
+                logger.error(f"Error tras registrar el lote de movimientos: {e}")
+
+        except Error as e:
+            connection.rollback()
+            logger.error(f"Error al registrar el lote de movimientos: {e}")
+            return {"error": "Error al registrar el lote de movimientos"}, 500
+
+        finally:
+            if connection:
+                cursor.close()
+                close_db_connection(connection)
+
+    return {
+        "registrados": registrados,
+        "rechazados": len(movimientos) - registrados,
+        "resultados": resultados
+    }, 200
+
+def add_movimientos_agrupados(movimientos):
+    """
+    Registra en una sola transacción los movimientos individuales que juntó
+    la cola de escritura y retorna una respuesta por movimiento, igual a la
+    de add_movimiento. Si la transacción falla, cada movimiento se registra
+    por separado para que el error quede solo en el que lo causa.
+    """
+    data, status = add_movimientos_lote(movimientos, eventos_individuales=True)
+    if status != 200:
+        logger.warning(f"Falló el lote agrupado de {len(movimientos)} movimientos; se registran uno por uno")
+        return [add_movimiento(*(movimiento.get(campo) for campo in CAMPOS_MOVIMIENTO))
+                for movimiento in movimientos]
+
+    respuestas = []
+    for resultado in data['resultados']:
+        if resultado['status'] == 201:
+            respuestas.append(({"message": f"Movimiento registrado con éxito para la canastilla {resultado['id_canastilla']}"}, 201))
+        else:
+            respuestas.append(({"error": resultado['error']}, resultado['status']))
+    return respuestas
+
 def update_movimiento(id_movimiento, id_canastilla, tipo_movimiento, ubicacion_origen, ubicacion_destino, id_usuario_responsable):
     """
     Actualiza un movimiento existente
@@ -345,24 +1180,21 @@ def update_movimiento(id_movimiento, id_canastilla, tipo_movimiento, ubicacion_o
     try:
         cursor = connection.cursor(dictionary=True)  # ¡IMPORTANTE! Usar dictionary=True
         
-        # Verificar si el movimiento existe
-        cursor.execute("SELECT id_movimiento, id_canastilla FROM movimientos WHERE id_movimiento = %s", (id_movimiento,))
-        movimiento_existente = cursor.fetchone()
-        if not movimiento_existente:
-            return {"error": "No existe un movimiento con este ID"}, 404
-        
-        # Verificar si la canastilla existe
-        cursor.execute("SELECT id_canastilla FROM canastillas WHERE id_canastilla = %s", (id_canastilla,))
-        if not cursor.fetchone():
-            return {"error": "No existe una canastilla con este ID"}, 400
-        
-        # Obtener datos anteriores del movimiento
+        # Datos anteriores del movimiento y estado de la canastilla destino en
+        # una sola consulta; ambas filas quedan bloqueadas hasta el commit
         cursor.execute("""
-            SELECT tipo_movimiento, ubicacion_origen, ubicacion_destino, id_canastilla 
-            FROM movimientos 
-            WHERE id_movimiento = %s
-        """, (id_movimiento,))
+            SELECT m.tipo_movimiento, m.id_canastilla, m.ubicacion_origen, m.ubicacion_destino,
+                   m.fecha_movimiento, c.ubicacion, c.estado
+            FROM movimientos m
+            LEFT JOIN canastillas c ON c.id_canastilla = %s
+            WHERE m.id_movimiento = %s
+            FOR UPDATE
+        """, (id_canastilla, id_movimiento))
         movimiento_anterior = cursor.fetchone()
+        if not movimiento_anterior:
+            return {"error": "No existe un movimiento con este ID"}, 404
+        if movimiento_anterior['estado'] is None:
+            return {"error": "No existe una canastilla con este ID"}, 400
         
         # Actualizar el movimiento
         sql = """
@@ -375,15 +1207,11 @@ def update_movimiento(id_movimiento, id_canastilla, tipo_movimiento, ubicacion_o
         cursor.execute(sql, (id_canastilla, tipo_movimiento, ubicacion_origen, ubicacion_destino, id_usuario_responsable, id_movimiento))
         
         # Si la canastilla cambió o el tipo de movimiento cambió, actualizar la canastilla
+        cambios = []
         if (movimiento_anterior['id_canastilla'] != id_canastilla or 
             movimiento_anterior['tipo_movimiento'] != tipo_movimiento):
             
-            if tipo_movimiento == 'entrada':
-                nueva_ubicacion = ubicacion_destino
-                nuevo_estado = 'Disponible' if ubicacion_destino != 'Taller' else 'En Reparación'
-            else:  # salida
-                nueva_ubicacion = 'En Tránsito'
-                nuevo_estado = 'En Tránsito'
+            nueva_ubicacion, nuevo_estado = _estado_tras_movimiento(tipo_movimiento, ubicacion_destino)
             
             update_sql = """
                 UPDATE canastillas 
@@ -392,8 +1220,35 @@ def update_movimiento(id_movimiento, id_canastilla, tipo_movimiento, ubicacion_o
             """
             
             cursor.execute(update_sql, (nueva_ubicacion, nuevo_estado, id_canastilla))
-        
+            
+            # Actualizar contadores del dashboard
+            cambios = [((movimiento_anterior['ubicacion'], movimiento_anterior['estado']), -1),
+                       ((nueva_ubicacion, nuevo_estado), 1)]
+            ajustar_canastillas(cursor, cambios)
+
+        # Mover el movimiento a su nuevo tipo y ubicaciones en los conteos por período
+        fecha = movimiento_anterior['fecha_movimiento']
+        ajustar_movimientos_periodo(cursor, [
+            ((fecha, movimiento_anterior['tipo_movimiento'], movimiento_anterior['ubicacion_origen'],
+              movimiento_anterior['ubicacion_destino']), -1),
+            ((fecha, tipo_movimiento, ubicacion_origen, ubicacion_destino), 1)
+        ])
+        
+        incrementar_versiones(cursor, 'canastillas', 'movimientos')
         connection.commit()
+        invalidar('inventario', 'dashboard', f'movimiento:{id_movimiento}', f'canastilla:{id_canastilla}',
+                  f"canastilla:{movimiento_anterior['id_canastilla']}")
+        publicar('movimiento_actualizado', {
+            "movimiento": {
+                "id_movimiento": id_movimiento,
+                "id_canastilla": id_canastilla,
+                "tipo_movimiento": tipo_movimiento,
+                "ubicacion_origen": ubicacion_origen,
+                "ubicacion_destino": ubicacion_destino,
+                "id_usuario_responsable": id_usuario_responsable
+            },
+            "conteos": conteos(cambios)
+        })
         
         return {"message": f"Movimiento {id_movimiento} actualizado con éxito"}, 200
 
@@ -403,7 +1258,7 @@ def update_movimiento(id_movimiento, id_canastilla, tipo_movimiento, ubicacion_o
         return {"error": f"Error al actualizar el movimiento: {str(e)}"}, 500
         
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
@@ -419,14 +1274,30 @@ def delete_movimiento(id_movimiento):
         cursor = connection.cursor()
         
         # Verificar si el movimiento existe
-        cursor.execute("SELECT id_movimiento FROM movimientos WHERE id_movimiento = %s", (id_movimiento,))
-        if not cursor.fetchone():
+        cursor.execute("""
+            SELECT DATE_FORMAT(fecha_movimiento, '%Y-%m'), id_canastilla,
+                   fecha_movimiento, tipo_movimiento, ubicacion_origen, ubicacion_destino
+            FROM movimientos WHERE id_movimiento = %s FOR UPDATE
+        """, (id_movimiento,))
+        movimiento = cursor.fetchone()
+        if not movimiento:
             return {"error": "No existe un movimiento con este ID"}, 404
         
         # Eliminar el movimiento
         sql = "DELETE FROM movimientos WHERE id_movimiento = %s"
         cursor.execute(sql, (id_movimiento,))
+        
+        # Actualizar contadores del dashboard
+        ajustar_movimientos_mes(cursor, movimiento[0], -1)
+        ajustar_movimientos_periodo(cursor, [(tuple(movimiento[2:6]), -1)])
+        registrar_eliminaciones(cursor, 'movimientos', [id_movimiento])
+        incrementar_versiones(cursor, 'movimientos')
         connection.commit()
+        invalidar('dashboard', f'movimiento:{id_movimiento}', f'canastilla:{movimiento[1]}')
+        publicar('movimiento_eliminado', {
+            "id_movimiento": id_movimiento,
+            "conteos": conteos(meses=[(movimiento[0], -1)])
+        })
         
         return {"message": f"Movimiento {id_movimiento} eliminado con éxito"}, 200
 
@@ -436,15 +1307,16 @@ def delete_movimiento(id_movimiento):
         return {"error": "Error al eliminar el movimiento"}, 500
         
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
+@cacheado(TTL_CACHE_LISTADOS, lambda: ('usuarios',), ('usuarios',))
 def get_usuarios():
     """
     Obtiene todos los usuarios
     """
-    connection = get_db_connection()
+    connection = get_db_connection(lectura=True)
     if connection is None:
         return {"error": "No se pudo conectar a la base de datos"}, 500
     
@@ -465,15 +1337,6 @@ def get_usuarios():
         """)
         
         usuarios = cursor.fetchall()
-        
-        # Formatear fechas para JSON
-        for usuario in usuarios:
-            if usuario['fecha_creacion']:
-                if isinstance(usuario['fecha_creacion'], (datetime, date)):
-                    usuario['fecha_creacion'] = usuario['fecha_creacion'].strftime('%Y-%m-%d %H:%M:%S')
-            if usuario['ultimo_acceso']:
-                if isinstance(usuario['ultimo_acceso'], (datetime, date)):
-                    usuario['ultimo_acceso'] = usuario['ultimo_acceso'].strftime('%Y-%m-%d %H:%M:%S')
 
         return {"data": usuarios}, 200
 
@@ -481,15 +1344,254 @@ def get_usuarios():
         logger.error(f"Error al obtener usuarios: {e}")
         return {"error": "Error interno del servidor"}, 500
     finally:
-        if connection and connection.is_connected():
+        if connection:
+            cursor.close()
+            close_db_connection(connection)
+
+# Sincronización por cambios: las filas tienen las mismas columnas que los listados
+CONSULTA_CAMBIOS_MOVIMIENTOS = """
+    SELECT
+        m.id_movimiento,
+        m.id_canastilla,
+        m.tipo_movimiento,
+        m.ubicacion_origen,
+        m.ubicacion_destino,
+        u.nombre as usuario_responsable,
+        m.fecha_movimiento,
+        m.actualizado_en
+    FROM movimientos m
+    LEFT JOIN usuarios u ON m.id_usuario_responsable = u.id_usuario
+"""
+
+CONSULTA_CAMBIOS_CANASTILLAS = """
+    SELECT
+        c.id_canastilla,
+        c.estado,
+        c.ubicacion,
+        u.nombre as usuario_asignado,
+        c.fecha_ultimo_movimiento,
+        c.actualizado_en
+    FROM canastillas c
+    LEFT JOIN usuarios u ON c.id_usuario_asignado = u.id_usuario
+"""
+
+CONSULTA_CAMBIOS_USUARIOS = """
+    SELECT
+        s.id_usuario,
+        s.nombre,
+        s.email,
+        s.rol,
+        s.estado,
+        s.fecha_creacion,
+        s.ultimo_acceso,
+        s.actualizado_en
+    FROM usuarios s
+"""
+
+FORMATO_MARCA = '%Y-%m-%d %H:%M:%S.%f'
+
+def _leer_marca(valor, id_minimo):
+    """
+    Traduce el parámetro de sincronización. Acepta la marca retornada por la
+    consulta anterior, una fecha ISO, '0' para recibir todo o 'ahora' para
+    recibir solo la marca actual.
+    """
+    if valor in (None, '', '0'):
+        return None
+    if valor == 'ahora':
+        return valor
+    try:
+        fecha = datetime.fromisoformat(valor)
+    except ValueError:
+        fecha = None
+    if fecha is not None:
+        # Las fechas de MySQL no tienen zona horaria y no se comparan con una que la tenga
+        if fecha.tzinfo is not None:
+            raise ParametroInvalido("La fecha de sincronización no debe indicar zona horaria")
+        return ((fecha, id_minimo), (fecha, 0))
+    try:
+        fecha_filas, id_filas, fecha_eliminaciones, id_eliminacion = _decodificar_cursor(valor, 4)
+        return ((datetime.strptime(fecha_filas, FORMATO_MARCA), id_filas),
+                (datetime.strptime(fecha_eliminaciones, FORMATO_MARCA), int(id_eliminacion)))
+    except (ParametroInvalido, TypeError, ValueError):
+        raise ParametroInvalido("Marca de sincronización inválida")
+
+def _cambios(recurso, consulta, alias, columna_id, valor_marca, limite, id_minimo, convertir_id):
+    """
+    Filas creadas o modificadas y IDs eliminados desde la marca, con la
+    marca para la consulta siguiente. Si `completo` es falso quedan más
+    cambios y el cliente vuelve a consultar con la nueva marca.
+    """
+    try:
+        limite = _validar_limite(limite)
+        marca = _leer_marca(valor_marca, id_minimo)
+    except ParametroInvalido as e:
+        return {"error": str(e)}, 400
+
+    # Siempre en la primaria: la marca sale de su reloj y en una réplica
+    # atrasada quedarían antes de la marca filas que aún no llegaron
+    connection = get_db_connection()
+    if connection is None:
+        return {"error": "No se pudo conectar a la base de datos"}, 500
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+        if marca == 'ahora':
+            filas, eliminados, marca, completo = [], [], marca_actual(cursor, id_minimo), True
+        else:
+            filas, eliminados, marca, completo = leer_cambios(cursor, consulta, alias, columna_id, recurso,
+                                                              marca, limite, id_minimo)
+        (fecha_filas, id_filas), (fecha_eliminaciones, id_eliminacion) = marca
+        return {
+            "data": filas,
+            "eliminados": [convertir_id(id_registro) for id_registro in eliminados],
+            "marca": _codificar_cursor([fecha_filas, id_filas, fecha_eliminaciones, id_eliminacion]),
+            "completo": completo
+        }, 200
+
+    except MarcaVencida:
+        return {"error": "La marca de sincronización es demasiado antigua, recargue el listado", "recargar": True}, 410
+
+    except Error as e:
+        logger.error(f"Error al obtener los cambios de {recurso}: {e}")
+        return {"error": "Error interno del servidor"}, 500
+
+    finally:
+        if connection:
+            cursor.close()
+            close_db_connection(connection)
+
+def get_cambios_movimientos(since_ts, limite=None):
+    """
+    Movimientos creados, modificados y eliminados desde `since_ts`
+    """
+    return _cambios('movimientos', CONSULTA_CAMBIOS_MOVIMIENTOS, 'm', 'id_movimiento', since_ts, limite, 0, int)
+
+def get_cambios_inventario(changed_since, limite=None):
+    """
+    Canastillas creadas, modificadas y eliminadas desde `changed_since`
+    """
+    return _cambios('canastillas', CONSULTA_CAMBIOS_CANASTILLAS, 'c', 'id_canastilla', changed_since, limite, '', str)
+
+def get_cambios_usuarios(changed_since, limite=None):
+    """
+    Usuarios creados, modificados y eliminados desde `changed_since`
+    """
+    return _cambios('usuarios', CONSULTA_CAMBIOS_USUARIOS, 's', 'id_usuario', changed_since, limite, 0, int)
+
+def get_movimientos_nuevos(since_id, limite=None):
+    """
+    Movimientos con ID mayor que `since_id`, en orden de ID. Solo trae
+    altas: las ediciones y eliminaciones llegan con since_ts.
+    """
+    try:
+        limite = _validar_limite(limite)
+        since_id = int(since_id)
+    except ValueError:
+        return {"error": "since_id inválido"}, 400
+    except ParametroInvalido as e:
+        return {"error": str(e)}, 400
+
+    connection = get_db_connection()
+    if connection is None:
+        return {"error": "No se pudo conectar a la base de datos"}, 500
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(f"""
+            {CONSULTA_CAMBIOS_MOVIMIENTOS}
+            WHERE m.id_movimiento > %s
+            ORDER BY m.id_movimiento
+            LIMIT %s
+        """, (since_id, limite + 1))
+        movimientos = cursor.fetchall()
+
+        completo = len(movimientos) <= limite
+        movimientos = movimientos[:limite]
+        return {
+            "data": movimientos,
+            "ultimo_id": movimientos[-1]['id_movimiento'] if movimientos else since_id,
+            "completo": completo
+        }, 200
+
+    except Error as e:
+        logger.error(f"Error al obtener los movimientos nuevos: {e}")
+        return {"error": "Error interno del servidor"}, 500
+
+    finally:
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
+def exportar_movimientos(tipo_movimiento=None, desde=None, hasta=None, id_canastilla=None, id_usuario=None):
+    """
+    Retorna un generador con todos los movimientos que cumplen los filtros,
+    para responder en streaming sin cargar la tabla en memoria
+    """
+    try:
+        condiciones, parametros = _filtros_movimientos(tipo_movimiento, desde, hasta, id_canastilla, id_usuario)
+    except ParametroInvalido as e:
+        return {"error": str(e)}, 400
+
+    where = ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
+    return _abrir_stream(f"""
+        SELECT 
+            m.id_movimiento,
+            m.id_canastilla,
+            m.tipo_movimiento,
+            m.ubicacion_origen,
+            m.ubicacion_destino,
+            u.nombre as usuario_responsable,
+            m.fecha_movimiento
+        FROM movimientos m
+        LEFT JOIN usuarios u ON m.id_usuario_responsable = u.id_usuario
+        {where}
+        ORDER BY m.fecha_movimiento DESC, m.id_movimiento DESC
+    """, parametros)
+
+def exportar_inventario(estado=None, ubicacion=None, busqueda=None):
+    """
+    Retorna un generador con todas las canastillas que cumplen los filtros,
+    para responder en streaming sin cargar la tabla en memoria
+    """
+    condiciones, parametros = _filtros_inventario(estado, ubicacion, busqueda)
+    where = ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
+    return _abrir_stream(f"""
+        SELECT 
+            c.id_canastilla,
+            c.estado,
+            c.ubicacion,
+            u.nombre as usuario_asignado,
+            c.fecha_ultimo_movimiento
+        FROM canastillas c
+        LEFT JOIN usuarios u ON c.id_usuario_asignado = u.id_usuario
+        {where}
+        ORDER BY c.id_canastilla
+    """, parametros)
+
+def exportar_usuarios():
+    """
+    Retorna un generador con todos los usuarios, para responder en streaming
+    """
+    return _abrir_stream("""
+        SELECT 
+            id_usuario,
+            nombre,
+            email,
+            rol,
+            estado,
+            fecha_creacion,
+            ultimo_acceso
+        FROM usuarios 
+        ORDER BY nombre
+    """, ())
+
+@cacheado(TTL_CACHE_DETALLE, lambda id_usuario: (f'usuario:{id_usuario}',), ('usuarios',))
 def get_usuario_by_id(id_usuario):
     """
     Obtiene un usuario específico por ID
     """
-    connection = get_db_connection()
+    connection = get_db_connection(lectura=True)
     if connection is None:
         return {"error": "No se pudo conectar a la base de datos"}, 500
     
@@ -513,14 +1615,6 @@ def get_usuario_by_id(id_usuario):
         
         if not usuario:
             return {"error": "Usuario no encontrado"}, 404
-        
-        # Formatear fechas para JSON
-        if usuario['fecha_creacion']:
-            if isinstance(usuario['fecha_creacion'], (datetime, date)):
-                usuario['fecha_creacion'] = usuario['fecha_creacion'].strftime('%Y-%m-%d %H:%M:%S')
-        if usuario['ultimo_acceso']:
-            if isinstance(usuario['ultimo_acceso'], (datetime, date)):
-                usuario['ultimo_acceso'] = usuario['ultimo_acceso'].strftime('%Y-%m-%d %H:%M:%S')
 
         return {"data": usuario}, 200
 
@@ -528,7 +1622,7 @@ def get_usuario_by_id(id_usuario):
         logger.error(f"Error al obtener el usuario: {e}")
         return {"error": "Error interno del servidor"}, 500
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
@@ -543,34 +1637,33 @@ def add_usuario(nombre, email, password, rol, estado):
     try:
         cursor = connection.cursor()
         
-        # Verificar si el email ya existe
-        cursor.execute("SELECT id_usuario FROM usuarios WHERE email = %s", (email,))
-        if cursor.fetchone():
-            return {"error": "Ya existe un usuario con este email"}, 400
-        
         # Hash de la contraseña (deberías usar bcrypt en producción)
         # Para desarrollo, usaremos un hash simple
         import hashlib
         hashed_password = hashlib.sha256(password.encode()).hexdigest()
         
-        # Insertar nuevo usuario
+        # Insertar nuevo usuario; el índice único del email rechaza los repetidos
         sql = """
             INSERT INTO usuarios (nombre, email, password, rol, estado, fecha_creacion)
             VALUES (%s, %s, %s, %s, %s, NOW())
         """
         
         cursor.execute(sql, (nombre, email, hashed_password, rol, estado))
+        incrementar_versiones(cursor, 'usuarios')
         connection.commit()
+        invalidar('usuarios')
         
         return {"message": f"Usuario {nombre} agregado con éxito"}, 201
 
     except Error as e:
         connection.rollback()
+        if e.errno == errorcode.ER_DUP_ENTRY:
+            return {"error": "Ya existe un usuario con este email"}, 400
         logger.error(f"Error al agregar usuario: {e}")
         return {"error": "Error al agregar el usuario"}, 500
         
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
@@ -585,16 +1678,7 @@ def update_usuario(id_usuario, nombre, email, rol, estado, password=None):
     try:
         cursor = connection.cursor()
         
-        # Verificar si el usuario existe
-        cursor.execute("SELECT id_usuario FROM usuarios WHERE id_usuario = %s", (id_usuario,))
-        if not cursor.fetchone():
-            return {"error": "No existe un usuario con este ID"}, 404
-        
-        # Verificar si el email ya existe (excluyendo el usuario actual)
-        cursor.execute("SELECT id_usuario FROM usuarios WHERE email = %s AND id_usuario != %s", (email, id_usuario))
-        if cursor.fetchone():
-            return {"error": "Ya existe otro usuario con este email"}, 400
-        
+        # Un email de otro usuario lo rechaza el índice único.
         # Construir la consulta SQL dinámicamente
         if password:
             # Hash de la nueva contraseña
@@ -614,17 +1698,29 @@ def update_usuario(id_usuario, nombre, email, rol, estado, password=None):
             """
             cursor.execute(sql, (nombre, email, rol, estado, id_usuario))
         
+        # rowcount cuenta solo las filas modificadas: en 0 se distingue
+        # entre un usuario inexistente y uno sin cambios
+        if cursor.rowcount == 0:
+            cursor.execute("SELECT 1 FROM usuarios WHERE id_usuario = %s", (id_usuario,))
+            if not cursor.fetchone():
+                return {"error": "No existe un usuario con este ID"}, 404
+        
+        incrementar_versiones(cursor, 'usuarios')
         connection.commit()
+        # El nombre del usuario aparece en casi todas las respuestas cacheadas
+        limpiar_cache()
         
         return {"message": f"Usuario {nombre} actualizado con éxito"}, 200
 
     except Error as e:
         connection.rollback()
+        if e.errno == errorcode.ER_DUP_ENTRY:
+            return {"error": "Ya existe otro usuario con este email"}, 400
         logger.error(f"Error al actualizar usuario: {e}")
         return {"error": "Error al actualizar el usuario"}, 500
         
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
@@ -639,40 +1735,118 @@ def delete_usuario(id_usuario):
     try:
         cursor = connection.cursor()
         
-        # Verificar si el usuario existe
-        cursor.execute("SELECT id_usuario FROM usuarios WHERE id_usuario = %s", (id_usuario,))
-        if not cursor.fetchone():
-            return {"error": "No existe un usuario con este ID"}, 404
-        
-        # Verificar si el usuario tiene movimientos asociados
-        cursor.execute("SELECT COUNT(*) as count FROM movimientos WHERE id_usuario_responsable = %s", (id_usuario,))
-        movimientos_count = cursor.fetchone()[0]
-        
-        if movimientos_count > 0:
+        # Eliminar el usuario solo si no tiene movimientos asociados
+        cursor.execute("""
+            DELETE FROM usuarios
+            WHERE id_usuario = %s
+              AND NOT EXISTS (SELECT 1 FROM movimientos WHERE id_usuario_responsable = %s)
+        """, (id_usuario, id_usuario))
+        if cursor.rowcount == 0:
+            # Solo en este caso se consulta el motivo
+            cursor.execute("SELECT 1 FROM usuarios WHERE id_usuario = %s", (id_usuario,))
+            if not cursor.fetchone():
+                return {"error": "No existe un usuario con este ID"}, 404
             return {"error": "No se puede eliminar el usuario porque tiene movimientos asociados"}, 400
         
-        # Eliminar el usuario
-        sql = "DELETE FROM usuarios WHERE id_usuario = %s"
-        cursor.execute(sql, (id_usuario,))
+        registrar_eliminaciones(cursor, 'usuarios', [id_usuario])
+        incrementar_versiones(cursor, 'usuarios')
         connection.commit()
+        limpiar_cache()
         
         return {"message": f"Usuario {id_usuario} eliminado con éxito"}, 200
 
     except Error as e:
         connection.rollback()
+        if e.errno == errorcode.ER_ROW_IS_REFERENCED_2:
+            return {"error": "No se puede eliminar el usuario porque tiene movimientos asociados"}, 400
         logger.error(f"Error al eliminar usuario: {e}")
         return {"error": "Error al eliminar el usuario"}, 500
         
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
-def get_canastilla_by_id(id_canastilla):
+def get_canastillas_por_ids(ids):
     """
-    Obtiene una canastilla específica por ID
+    Busca varias canastillas por ID con consultas IN por bloques sobre una
+    sola conexión. Retorna las encontradas indexadas por el ID pedido y los
+    IDs que no existen, en el orden recibido.
     """
-    connection = get_db_connection()
+    if not isinstance(ids, list) or not ids:
+        return {"error": "Se esperaba una lista de IDs"}, 400
+    if len(ids) > LIMITE_CONSULTA_LOTE:
+        return {"error": f"La consulta supera el máximo de {LIMITE_CONSULTA_LOTE} IDs"}, 400
+    if not all(isinstance(id_canastilla, (str, int)) and not isinstance(id_canastilla, bool)
+               and str(id_canastilla).strip() for id_canastilla in ids):
+        return {"error": "Los IDs deben ser textos o números no vacíos"}, 400
+    pedidos = list(dict.fromkeys(str(id_canastilla).strip() for id_canastilla in ids))
+
+    connection = get_db_connection(lectura=True)
+    if connection is None:
+        return {"error": "No se pudo conectar a la base de datos"}, 500
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+
+        # La comparación de la base no distingue mayúsculas; el índice tampoco
+        por_id = {}
+        for bloque in _bloques(sorted(pedidos)):
+            cursor.execute(f"""
+                SELECT
+                    c.id_canastilla,
+                    c.estado,
+                    c.ubicacion,
+                    u.nombre as usuario_asignado,
+                    c.fecha_ultimo_movimiento
+                FROM canastillas c
+                LEFT JOIN usuarios u ON c.id_usuario_asignado = u.id_usuario
+                WHERE c.id_canastilla IN ({_marcadores(len(bloque))})
+            """, bloque)
+            for canastilla in cursor.fetchall():
+                por_id[canastilla['id_canastilla'].lower()] = canastilla
+
+        encontradas = {}
+        faltantes = []
+        for id_canastilla in pedidos:
+            canastilla = por_id.get(id_canastilla.lower())
+            if canastilla:
+                encontradas[id_canastilla] = canastilla
+            else:
+                faltantes.append(id_canastilla)
+
+        return {
+            "data": encontradas,
+            "faltantes": faltantes,
+            "encontradas": len(encontradas),
+            "total": len(pedidos)
+        }, 200
+
+    except Error as e:
+        logger.error(f"Error al consultar el lote de canastillas: {e}")
+        return {"error": "Error interno del servidor"}, 500
+
+    finally:
+        if connection:
+            cursor.close()
+            close_db_connection(connection)
+
+@cacheado(TTL_CACHE_DETALLE, lambda id_canastilla, movimientos=0: (f'canastilla:{id_canastilla}',),
+          RECURSOS)
+def get_canastilla_by_id(id_canastilla, movimientos=0):
+    """
+    Obtiene una canastilla específica por ID. Con `movimientos` incluye la
+    primera página de su historial con ese tamaño.
+    """
+    try:
+        movimientos = int(movimientos or 0)
+    except (TypeError, ValueError):
+        return {"error": "Cantidad de movimientos inválida"}, 400
+    if movimientos < 0:
+        return {"error": "Cantidad de movimientos inválida"}, 400
+    movimientos = min(movimientos, LIMITE_MOVIMIENTOS_DETALLE)
+
+    connection = get_db_connection(lectura=True)
     if connection is None:
         return {"error": "No se pudo conectar a la base de datos"}, 500
     
@@ -695,19 +1869,59 @@ def get_canastilla_by_id(id_canastilla):
         
         if not canastilla:
             return {"error": "Canastilla no encontrada"}, 404
-        
-        # Formatear fecha para JSON
-        if canastilla['fecha_ultimo_movimiento']:
-            if isinstance(canastilla['fecha_ultimo_movimiento'], (datetime, date)):
-                canastilla['fecha_ultimo_movimiento'] = canastilla['fecha_ultimo_movimiento'].strftime('%Y-%m-%d %H:%M:%S')
 
-        return {"data": canastilla}, 200
+        respuesta = {"data": canastilla}
+        if movimientos:
+            # Misma forma que GET /api/canastilla/<id>/movimientos, para seguir con su cursor
+            historial, siguiente_cursor = _pagina_movimientos(cursor, ["m.id_canastilla = %s"],
+                                                              [id_canastilla], movimientos)
+            respuesta["movimientos"] = {"data": historial, "siguiente_cursor": siguiente_cursor}
+
+        return respuesta, 200
 
     except Exception as e:
         logger.error(f"Error al obtener la canastilla: {e}")
         return {"error": "Error interno del servidor"}, 500
     finally:
-        if connection and connection.is_connected():
+        if connection:
+            cursor.close()
+            close_db_connection(connection)
+
+def get_movimientos_canastilla(id_canastilla, cursor_pagina=None, limite=None):
+    """
+    Historial de movimientos de una canastilla, del más reciente al más
+    antiguo, paginado por cursor. Recorre el índice
+    idx_movimientos_canastilla_historial sin leer la tabla.
+    """
+    try:
+        limite = _validar_limite(limite)
+        condiciones, parametros = ["m.id_canastilla = %s"], [id_canastilla]
+        if cursor_pagina:
+            _condicion_cursor_movimientos(cursor_pagina, condiciones, parametros)
+    except ParametroInvalido as e:
+        return {"error": str(e)}, 400
+
+    connection = get_db_connection(lectura=True)
+    if connection is None:
+        return {"error": "No se pudo conectar a la base de datos"}, 500
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+        movimientos, siguiente_cursor = _pagina_movimientos(cursor, condiciones, parametros, limite)
+
+        # Solo una página vacía requiere confirmar que la canastilla existe
+        if not movimientos and not cursor_pagina:
+            cursor.execute("SELECT 1 FROM canastillas WHERE id_canastilla = %s", (id_canastilla,))
+            if not cursor.fetchone():
+                return {"error": "Canastilla no encontrada"}, 404
+
+        return {"data": movimientos, "siguiente_cursor": siguiente_cursor}, 200
+
+    except Error as e:
+        logger.error(f"Error al obtener el historial de la canastilla: {e}")
+        return {"error": "Error interno del servidor"}, 500
+    finally:
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
@@ -722,9 +1936,10 @@ def update_canastilla(id_canastilla, estado, ubicacion):
     try:
         cursor = connection.cursor()
         
-        # Verificar si la canastilla existe
-        cursor.execute("SELECT id_canastilla FROM canastillas WHERE id_canastilla = %s", (id_canastilla,))
-        if not cursor.fetchone():
+        # Verificar si la canastilla existe y bloquearla hasta el commit
+        cursor.execute("SELECT ubicacion, estado FROM canastillas WHERE id_canastilla = %s FOR UPDATE", (id_canastilla,))
+        anterior = cursor.fetchone()
+        if not anterior:
             return {"error": "No existe una canastilla con este ID"}, 404
         
         # Actualizar la canastilla
@@ -735,7 +1950,12 @@ def update_canastilla(id_canastilla, estado, ubicacion):
         """
         
         cursor.execute(sql, (estado, ubicacion, id_canastilla))
+        cambios = [(tuple(anterior), -1), ((ubicacion, estado), 1)]
+        ajustar_canastillas(cursor, cambios)
+        incrementar_versiones(cursor, 'canastillas')
         connection.commit()
+        invalidar('inventario', 'dashboard', f'canastilla:{id_canastilla}')
+        publicar('canastillas', {"conteos": conteos(cambios)})
         
         return {"message": f"Canastilla {id_canastilla} actualizada con éxito"}, 200
 
@@ -745,7 +1965,7 @@ def update_canastilla(id_canastilla, estado, ubicacion):
         return {"error": "Error al actualizar la canastilla"}, 500
         
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
 
@@ -760,31 +1980,41 @@ def delete_canastilla(id_canastilla):
     try:
         cursor = connection.cursor()
         
-        # Verificar si la canastilla existe
-        cursor.execute("SELECT id_canastilla FROM canastillas WHERE id_canastilla = %s", (id_canastilla,))
-        if not cursor.fetchone():
+        # Estado de la canastilla, bloqueada hasta el commit, y si tiene movimientos
+        cursor.execute("""
+            SELECT ubicacion, estado,
+                   EXISTS (SELECT 1 FROM movimientos m WHERE m.id_canastilla = c.id_canastilla)
+            FROM canastillas c
+            WHERE id_canastilla = %s
+            FOR UPDATE
+        """, (id_canastilla,))
+        fila = cursor.fetchone()
+        if not fila:
             return {"error": "No existe una canastilla con este ID"}, 404
-        
-        # Verificar si la canastilla tiene movimientos asociados
-        cursor.execute("SELECT COUNT(*) as count FROM movimientos WHERE id_canastilla = %s", (id_canastilla,))
-        movimientos_count = cursor.fetchone()[0]
-        
-        if movimientos_count > 0:
+        if fila[2]:
             return {"error": "No se puede eliminar la canastilla porque tiene movimientos asociados"}, 400
+        anterior = fila[:2]
         
         # Eliminar la canastilla
         sql = "DELETE FROM canastillas WHERE id_canastilla = %s"
         cursor.execute(sql, (id_canastilla,))
+        ajustar_canastillas(cursor, [(tuple(anterior), -1)])
+        registrar_eliminaciones(cursor, 'canastillas', [id_canastilla])
+        incrementar_versiones(cursor, 'canastillas')
         connection.commit()
+        invalidar('inventario', 'dashboard', f'canastilla:{id_canastilla}')
+        publicar('canastillas', {"conteos": conteos([(tuple(anterior), -1)])})
         
         return {"message": f"Canastilla {id_canastilla} eliminada con éxito"}, 200
 
     except Error as e:
         connection.rollback()
+        if e.errno == errorcode.ER_ROW_IS_REFERENCED_2:
+            return {"error": "No se puede eliminar la canastilla porque tiene movimientos asociados"}, 400
         logger.error(f"Error al eliminar canastilla: {e}")
         return {"error": "Error al eliminar la canastilla"}, 500
         
     finally:
-        if connection and connection.is_connected():
+        if connection:
             cursor.close()
             close_db_connection(connection)
\ No newline at end of file
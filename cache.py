@@ -0,0 +1,191 @@
+from collections import OrderedDict, defaultdict
+from functools import wraps
+import os
+import sys
+import threading
+import time
+
+from db_connection import cumple_requisito_lectura, exigir_versiones
+from versiones import versiones_vigentes, olvidar_versiones
+
+CACHE_MAX_BYTES = int(float(os.environ.get('CACHE_MAX_MB', '64')) * 1024 * 1024)
+
+
+def _estimar_tamano(valor):
+    """
+    Estimación aproximada de la memoria que ocupa una respuesta
+    """
+    tamano = sys.getsizeof(valor)
+    if isinstance(valor, dict):
+        for clave, item in valor.items():
+            tamano += _estimar_tamano(clave) + _estimar_tamano(item)
+    elif isinstance(valor, (list, tuple)):
+        for item in valor:
+            tamano += _estimar_tamano(item)
+    return tamano
+
+
+class CacheLRU:
+    """
+    Caché en memoria con expiración por TTL, expulsión LRU acotada por bytes
+    e invalidación por etiquetas. Es local a cada proceso; cada entrada
+    puede guardar además la versión de los datos con que se calculó, y solo
+    se entrega a quien pide esa misma versión.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()  # clave -> (valor, expira, tamano, etiquetas, version)
+        self._por_etiqueta = defaultdict(set)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._aciertos = 0
+        self._fallos = 0
+        self._expulsiones = 0
+        self._invalidaciones = 0
+        self._obsoletas = 0
+
+    def obtener(self, clave, version=None):
+        """
+        Retorna (True, valor) si la clave está vigente y es de `version`, o
+        (False, None)
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[1] < time.monotonic() or entrada[4] != version:
+                if entrada is not None:
+                    self._quitar(clave)
+                    if entrada[4] != version:
+                        self._obsoletas += 1
+                self._fallos += 1
+                return False, None
+            self._entradas.move_to_end(clave)
+            self._aciertos += 1
+            return True, entrada[0]
+
+    def guardar(self, clave, valor, ttl, etiquetas=(), version=None):
+        tamano = _estimar_tamano(valor)
+        if tamano > self.max_bytes:
+            return
+
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = (valor, time.monotonic() + ttl, tamano, tuple(etiquetas), version)
+            self._bytes += tamano
+            for etiqueta in etiquetas:
+                self._por_etiqueta[etiqueta].add(clave)
+
+            while self._bytes > self.max_bytes:
+                clave_antigua = next(iter(self._entradas))
+                self._quitar(clave_antigua)
+                self._expulsiones += 1
+
+    def _quitar(self, clave):
+        # Se llama con el lock tomado
+        _, _, tamano, etiquetas, _ = self._entradas.pop(clave)
+        self._bytes -= tamano
+        for etiqueta in etiquetas:
+            claves = self._por_etiqueta.get(etiqueta)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_etiqueta[etiqueta]
+
+    def invalidar(self, *etiquetas):
+        """
+        Elimina todas las entradas marcadas con alguna de las etiquetas
+        """
+        with self._lock:
+            for etiqueta in etiquetas:
+                for clave in list(self._por_etiqueta.get(etiqueta, ())):
+                    self._quitar(clave)
+                    self._invalidaciones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._invalidaciones += len(self._entradas)
+            self._entradas.clear()
+            self._por_etiqueta.clear()
+            self._bytes = 0
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self._aciertos + self._fallos
+            return {
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "tasa_aciertos": round(self._aciertos / consultas, 4) if consultas else 0.0,
+                "expulsiones": self._expulsiones,
+                "invalidaciones": self._invalidaciones,
+                "obsoletas": self._obsoletas
+            }
+
+
+cache = CacheLRU()
+
+
+def cacheado(ttl, etiquetas, recursos):
+    """
+    Decorador de lectura a través de la caché para funciones de api.py que
+    retornan (data, status). Solo se guardan las respuestas 200.
+    `etiquetas` recibe los mismos argumentos que la función y retorna las
+    etiquetas con las que las escrituras de este proceso invalidan la
+    entrada. `recursos` son las tablas de versiones_recursos de las que
+    depende el resultado: la versión (la misma que se leyó para el ETag de
+    la petición, si la hay) se toma antes de la consulta y se guarda con la
+    entrada, y una entrada de otra versión no se entrega. Así una
+    lectura que empezó antes de una escritura no deja su resultado como
+    vigente. La versión sale de la última lectura del proceso, sin viaje a
+    la base en un acierto, y las escrituras de otros procesos se ven a más
+    tardar en VERSIONES_TTL, sin esperar el TTL de la entrada.
+    Si las versiones no se pueden leer, o no alcanzan el requisito de
+    lectura de la petición (token de lectura, o PRIMARIA en escrituras), la
+    consulta se hace sin caché. En un fallo la consulta se exige al menos
+    esas versiones, para no guardar datos de una réplica más atrasada.
+    """
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            versiones = versiones_vigentes(*recursos)
+            if versiones is None or not cumple_requisito_lectura(versiones):
+                return funcion(*args, **kwargs)
+            exigir_versiones(versiones)
+            version = tuple(sorted(versiones.items()))
+
+            clave = (funcion.__name__, args, tuple(sorted(kwargs.items())))
+            encontrado, respuesta = cache.obtener(clave, version)
+            if encontrado:
+                return respuesta
+
+            respuesta = funcion(*args, **kwargs)
+            if respuesta[1] == 200:
+                cache.guardar(clave, respuesta, ttl, etiquetas(*args, **kwargs), version)
+            return respuesta
+
+        envoltura.sin_cache = funcion
+        return envoltura
+    return decorador
+
+
+def invalidar(*etiquetas):
+    # Las escrituras llaman a invalidar tras el commit: la próxima lectura
+    # de versiones ya debe incluirlas
+    olvidar_versiones()
+    cache.invalidar(*etiquetas)
+
+
+def limpiar_cache():
+    olvidar_versiones()
+    cache.limpiar()
+
+
+def get_cache_stats():
+    """
+    Retorna los contadores de aciertos y fallos de la caché
+    """
+    return cache.estadisticas()
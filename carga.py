@@ -0,0 +1,96 @@
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def _trabajador(url, persistente, fin, resultados, lock):
+    destino = urlparse(url)
+    ruta = destino.path + ('?' + destino.query if destino.query else '')
+    encabezados = {'Accept-Encoding': 'gzip'}
+    if not persistente:
+        encabezados['Connection'] = 'close'
+
+    latencias = []
+    errores = 0
+    conexiones = 0
+    conexion = None
+    while time.monotonic() < fin:
+        if conexion is None:
+            conexion = http.client.HTTPConnection(destino.hostname, destino.port or 80, timeout=30)
+            conexiones += 1
+        inicio = time.perf_counter()
+        try:
+            conexion.request('GET', ruta, headers=encabezados)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status >= 500:
+                errores += 1
+            latencias.append(time.perf_counter() - inicio)
+            if not persistente or respuesta.will_close:
+                conexion.close()
+                conexion = None
+        except (OSError, http.client.HTTPException):
+            errores += 1
+            conexion.close()
+            conexion = None
+
+    if conexion is not None:
+        conexion.close()
+    with lock:
+        resultados['latencias'].extend(latencias)
+        resultados['errores'] += errores
+        resultados['conexiones'] += conexiones
+
+
+def generar_carga(url, clientes=16, duracion=10.0, persistente=True):
+    """
+    Lanza `clientes` hilos que piden `url` en bucle durante `duracion`
+    segundos y retorna peticiones por segundo y percentiles de latencia
+    """
+    resultados = {'latencias': [], 'errores': 0, 'conexiones': 0}
+    lock = threading.Lock()
+    fin = time.monotonic() + duracion
+    hilos = [threading.Thread(target=_trabajador, args=(url, persistente, fin, resultados, lock))
+             for _ in range(clientes)]
+    inicio = time.monotonic()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.monotonic() - inicio
+
+    latencias = sorted(resultados['latencias'])
+
+    def percentil(p):
+        if not latencias:
+            return 0.0
+        return round(latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000, 2)
+
+    return {
+        "peticiones": len(latencias),
+        "peticiones_por_segundo": round(len(latencias) / transcurrido, 1),
+        "conexiones": resultados['conexiones'],
+        "errores": resultados['errores'],
+        "latencia_p50_ms": percentil(0.50),
+        "latencia_p99_ms": percentil(0.99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga HTTP para medir el servidor")
+    parser.add_argument('url', nargs='?', default='http://127.0.0.1:8000/js/dashboard.js')
+    parser.add_argument('--clientes', type=int, default=16)
+    parser.add_argument('--duracion', type=float, default=10.0)
+    parser.add_argument('--sin-keep-alive', action='store_true',
+                        help="Abrir una conexión nueva por petición")
+    args = parser.parse_args()
+
+    resultado = generar_carga(args.url, args.clientes, args.duracion, not args.sin_keep_alive)
+    for clave, valor in resultado.items():
+        print(f"{clave:<24} {valor}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+import json
+import time
+
+# orjson es opcional; si no está instalado se usa la librería estándar
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FORMATO_FECHA_HORA = '%Y-%m-%d %H:%M:%S'
+FORMATO_FECHA = '%Y-%m-%d'
+
+
+def _por_defecto(valor):
+    """
+    Convierte los tipos que retorna MySQL y que JSON no soporta
+    """
+    if isinstance(valor, datetime):
+        return valor.strftime(FORMATO_FECHA_HORA)
+    if isinstance(valor, date):
+        return valor.strftime(FORMATO_FECHA)
+    if isinstance(valor, Decimal):
+        return int(valor) if valor == valor.to_integral_value() else float(valor)
+    if isinstance(valor, timedelta):
+        return str(valor)
+    raise TypeError(f"Tipo no serializable a JSON: {type(valor).__name__}")
+
+
+_codificador = json.JSONEncoder(default=_por_defecto, ensure_ascii=False, separators=(',', ':'))
+
+if orjson is not None:
+    # Las fechas pasan por _por_defecto para mantener el mismo formato que con json
+    _OPCIONES_ORJSON = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def codificar_json(data):
+        """
+        Serializa la respuesta a bytes UTF-8, formateando fechas al vuelo
+        """
+        return orjson.dumps(data, default=_por_defecto, option=_OPCIONES_ORJSON)
+else:
+    def codificar_json(data):
+        """
+        Serializa la respuesta a bytes UTF-8, formateando fechas al vuelo
+        """
+        return _codificador.encode(data).encode('utf-8')
+
+
+def _benchmark(filas=100000, repeticiones=5):
+    """
+    Compara el camino anterior (strftime fila por fila + json.dumps) con
+    codificar_json sobre un listado de movimientos
+    """
+    ahora = datetime.now()
+    base = [{
+        "id_movimiento": i,
+        "id_canastilla": f"CAN-{i:06d}",
+        "tipo_movimiento": 'entrada' if i % 2 else 'salida',
+        "ubicacion_origen": 'Almacén A',
+        "ubicacion_destino": 'Almacén B',
+        "usuario_responsable": 'Usuario de prueba',
+        "fecha_movimiento": ahora - timedelta(minutes=i)
+    } for i in range(filas)]
+
+    def anterior():
+        datos = [dict(fila) for fila in base]
+        for fila in datos:
+            fila['fecha_movimiento'] = fila['fecha_movimiento'].strftime(FORMATO_FECHA_HORA)
+        return json.dumps({"data": datos}).encode('utf-8')
+
+    def actual():
+        return codificar_json({"data": base})
+
+    for nombre, funcion in (("strftime + json.dumps", anterior), ("codificar_json", actual)):
+        mejor = min(_medir(funcion) for _ in range(repeticiones))
+        print(f"{nombre:<24} {mejor * 1000:8.1f} ms  ({filas} filas)")
+    print(f"orjson {'disponible' if orjson is not None else 'no instalado'}")
+
+
+def _medir(funcion):
+    inicio = time.perf_counter()
+    funcion()
+    return time.perf_counter() - inicio
+
+
+if __name__ == '__main__':
+    _benchmark()
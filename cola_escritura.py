@@ -0,0 +1,233 @@
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Agrupación de escrituras: máximo de elementos por transacción y espera
+# desde el primer elemento antes de confirmar un lote incompleto
+MAXIMO_LOTE = 100
+ESPERA_LOTE = 0.0  # segundos; con 0 el lote son los que llegaron durante el commit anterior
+
+
+class _Pendiente:
+    """
+    Elemento encolado y la respuesta que el hilo de la cola le asigna
+    """
+    __slots__ = ('elemento', 'resultado', 'listo')
+
+    def __init__(self, elemento):
+        self.elemento = elemento
+        self.resultado = None
+        self.listo = threading.Event()
+
+
+class ColaEscritura:
+    """
+    Agrupa escrituras concurrentes en transacciones. Cada llamador encola
+    su elemento y espera la respuesta; un solo hilo junta los elementos que
+    llegan durante `espera` segundos (o hasta `maximo`) y los procesa juntos
+    con `procesar`, que recibe la lista y retorna una respuesta
+    (data, status) por elemento. Al haber un solo hilo, los elementos se
+    procesan en el orden de llegada.
+    """
+
+    def __init__(self, procesar, maximo=MAXIMO_LOTE, espera=ESPERA_LOTE):
+        self._procesar = procesar
+        self.maximo = maximo
+        self.espera = espera
+        self._cola = queue.Queue()
+        self.lotes = 0
+        self.elementos = 0
+        self._hilo = threading.Thread(target=self._ciclo, name='cola-escritura', daemon=True)
+        self._hilo.start()
+
+    def enviar(self, elemento):
+        """
+        Encola un elemento y bloquea hasta que su lote se confirma. No hay
+        tiempo máximo: responder antes podría ocultar una escritura que sí
+        se confirmó.
+        """
+        pendiente = _Pendiente(elemento)
+        self._cola.put(pendiente)
+        pendiente.listo.wait()
+        return pendiente.resultado
+
+    def detener(self):
+        self._cola.put(None)
+        self._hilo.join()
+
+    def _juntar(self, primero):
+        lote = [primero]
+        limite = time.monotonic() + self.espera
+        while len(lote) < self.maximo:
+            restante = limite - time.monotonic()
+            try:
+                siguiente = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if siguiente is None:
+                # Se procesa lo juntado y se vuelve a encolar la señal de fin
+                self._cola.put(None)
+                break
+            lote.append(siguiente)
+        return lote
+
+    def _ciclo(self):
+        while True:
+            primero = self._cola.get()
+            if primero is None:
+                return
+            lote = self._juntar(primero)
+            try:
+                resultados = self._procesar([pendiente.elemento for pendiente in lote])
+            except Exception as e:
+                logger.error(f"Error inesperado al procesar un lote de {len(lote)} escrituras: {e}")
+                resultados = [({"error": "Error interno del servidor"}, 500)] * len(lote)
+            self.lotes += 1
+            self.elementos += len(lote)
+            for pendiente, resultado in zip(lote, resultados):
+                pendiente.resultado = resultado
+                pendiente.listo.set()
+
+
+_config = None
+_cola = None
+_pid = None
+_bloqueo = threading.Lock()
+
+
+def activar(maximo=MAXIMO_LOTE, espera=ESPERA_LOTE):
+    """
+    Activa la agrupación de los movimientos individuales. La cola se crea
+    al primer uso en cada proceso, así funciona también después del fork
+    del modo 'procesos'.
+    """
+    global _config
+    _config = (maximo, espera)
+
+
+def activa():
+    return _config is not None
+
+
+def enviar_movimiento(movimiento):
+    """
+    Registra un movimiento a través de la cola del proceso. Retorna la misma
+    respuesta que add_movimiento.
+    """
+    global _cola, _pid
+    with _bloqueo:
+        if _cola is None or _pid != os.getpid():
+            from api import add_movimientos_agrupados
+            _cola = ColaEscritura(add_movimientos_agrupados, *_config)
+            _pid = os.getpid()
+        cola = _cola
+    return cola.enviar(movimiento)
+
+
+def _percentil(valores, percentil):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * percentil))]
+
+
+def _medir_concurrencia(escribir, concurrencia, peticiones):
+    """
+    Ejecuta `peticiones` escrituras repartidas en `concurrencia` hilos.
+    Retorna (escrituras por segundo, latencia p50, latencia p99).
+    """
+    latencias = []
+    bloqueo = threading.Lock()
+    por_hilo = peticiones // concurrencia
+
+    def cliente(indice):
+        propias = []
+        for numero in range(por_hilo):
+            inicio = time.perf_counter()
+            escribir(indice, numero)
+            propias.append(time.perf_counter() - inicio)
+        with bloqueo:
+            latencias.extend(propias)
+
+    hilos = [threading.Thread(target=cliente, args=(indice,)) for indice in range(concurrencia)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    return len(latencias) / duracion, _percentil(latencias, 0.5), _percentil(latencias, 0.99)
+
+
+def _benchmark(concurrencias=(1, 8, 32, 128), peticiones=2000, costo_commit=0.002, costo_fila=0.00005,
+               maximo=MAXIMO_LOTE, espera=ESPERA_LOTE, base=None):
+    """
+    Compara escrituras individuales contra la cola de agrupación. Sin
+    `base` se simula la base: las transacciones se serializan (como en las
+    filas de resumen y de versiones) y cada una cuesta `costo_commit` más
+    `costo_fila` por movimiento. Con `base` = (ids de canastillas, id de
+    usuario) se escribe en la base configurada con add_movimiento.
+    """
+    if base is None:
+        transaccion = threading.Lock()
+
+        def individual(movimiento):
+            with transaccion:
+                time.sleep(costo_fila + costo_commit)
+            return {}, 201
+
+        def agrupado(movimientos):
+            with transaccion:
+                time.sleep(costo_fila * len(movimientos) + costo_commit)
+            return [({}, 201)] * len(movimientos)
+
+        def movimiento(indice, numero):
+            return {"id_canastilla": f"C{indice}"}
+    else:
+        from api import add_movimiento, add_movimientos_agrupados
+        canastillas, usuario = base
+
+        def individual(datos):
+            return add_movimiento(datos['id_canastilla'], datos['tipo_movimiento'], datos['ubicacion_origen'],
+                                  datos['ubicacion_destino'], datos['id_usuario_responsable'])
+
+        agrupado = add_movimientos_agrupados
+
+        def movimiento(indice, numero):
+            return {"id_canastilla": canastillas[(indice + numero) % len(canastillas)],
+                    "tipo_movimiento": 'entrada' if numero % 2 else 'salida',
+                    "ubicacion_origen": 'Benchmark', "ubicacion_destino": 'Benchmark',
+                    "id_usuario_responsable": usuario}
+
+    print(f"{'concurrencia':>12} {'modo':<11} {'escrituras/s':>13} {'p50 ms':>8} {'p99 ms':>8} {'por lote':>9}")
+    for concurrencia in concurrencias:
+        cola = ColaEscritura(agrupado, maximo, espera)
+        modos = (
+            ("individual", lambda indice, numero: individual(movimiento(indice, numero)), None),
+            ("agrupado", lambda indice, numero: cola.enviar(movimiento(indice, numero)), cola)
+        )
+        for nombre, escribir, cola_modo in modos:
+            por_segundo, p50, p99 = _medir_concurrencia(escribir, concurrencia, max(peticiones, concurrencia))
+            por_lote = f"{cola_modo.elementos / cola_modo.lotes:9.1f}" if cola_modo and cola_modo.lotes else f"{1:9.1f}"
+            print(f"{concurrencia:>12} {nombre:<11} {por_segundo:>13.0f} {p50 * 1000:>8.2f} {p99 * 1000:>8.2f} {por_lote}")
+        cola.detener()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de la cola de agrupación de escrituras")
+    parser.add_argument('--peticiones', type=int, default=2000)
+    parser.add_argument('--concurrencias', default='1,8,32,128')
+    parser.add_argument('--maximo', type=int, default=MAXIMO_LOTE)
+    parser.add_argument('--espera-ms', type=float, default=ESPERA_LOTE * 1000)
+    parser.add_argument('--costo-commit-ms', type=float, default=2.0,
+                        help="Costo simulado de cada commit (sin --canastillas)")
+    parser.add_argument('--canastillas', help="IDs separados por coma: escribe en la base configurada")
+    parser.add_argument('--usuario', type=int, default=1, help="ID del usuario responsable (con --canastillas)")
+    args = parser.parse_args()
+    _benchmark(concurrencias=[int(valor) for valor in args.concurrencias.split(',')],
+               peticiones=args.peticiones, costo_commit=args.costo_commit_ms / 1000,
+               maximo=args.maximo, espera=args.espera_ms / 1000,
+               base=(args.canastillas.split(','), args.usuario) if args.canastillas else None)
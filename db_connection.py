@@ -1,35 +1,562 @@
 import mysql.connector
 from mysql.connector import Error
+from collections import deque
+import contextvars
+import itertools
 import logging
+import os
+import threading
+import time
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_db_connection():
+# Parámetros de conexión
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'port': int(os.environ.get('DB_PORT', '3306')),
+    'user': os.environ.get('DB_USER', 'root'),  # Cambia por tu usuario
+    'password': os.environ.get('DB_PASSWORD', ''),  # Cambia por tu contraseña
+    'database': os.environ.get('DB_NAME', 'control_canastillas_v2')
+}
+
+# Parámetros del pool de conexiones
+POOL_MIN = int(os.environ.get('DB_POOL_MIN', '2'))
+POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+POOL_TIMEOUT_ESPERA = float(os.environ.get('DB_POOL_TIMEOUT', '5'))  # segundos esperando una conexión libre
+POOL_TIEMPO_INACTIVIDAD = float(os.environ.get('DB_POOL_INACTIVIDAD', '300'))  # segundos antes de cerrar una conexión ociosa
+POOL_INTERVALO_VERIFICACION = float(os.environ.get('DB_POOL_VERIFICACION', '30'))  # ping si la conexión lleva más tiempo ociosa
+
+# Réplicas de solo lectura: DB_REPLICAS="host:puerto,host:puerto". Usan el
+# usuario, la contraseña y la base de la primaria salvo que se indiquen
+# DB_REPLICA_USER y DB_REPLICA_PASSWORD. Para probar en una sola máquina
+# basta una segunda instancia de MySQL replicando de la primaria, por
+# ejemplo en el puerto 3307, y DB_REPLICAS=127.0.0.1:3307; con
+# `python db_connection.py` se ve el retraso que el monitor mide.
+DB_REPLICAS = [direccion.strip() for direccion in os.environ.get('DB_REPLICAS', '').split(',') if direccion.strip()]
+REPLICA_RETRASO_MAX = float(os.environ.get('DB_REPLICA_RETRASO_MAX', '2'))  # segundos; más atrasada no recibe lecturas
+REPLICA_INTERVALO = float(os.environ.get('DB_REPLICA_INTERVALO', '0.5'))  # segundos entre mediciones del retraso
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones MySQL acotado y seguro entre hilos.
+
+    Mantiene entre `minimo` y `maximo` conexiones físicas. Las conexiones
+    ociosas se verifican con un ping al entregarse y se cierran cuando pasan
+    más de `tiempo_inactividad` segundos sin uso (respetando el mínimo).
+    """
+
+    def __init__(self, config, minimo=POOL_MIN, maximo=POOL_MAX,
+                 timeout_espera=POOL_TIMEOUT_ESPERA,
+                 tiempo_inactividad=POOL_TIEMPO_INACTIVIDAD,
+                 intervalo_verificacion=POOL_INTERVALO_VERIFICACION):
+        if minimo < 0 or maximo < 1 or minimo > maximo:
+            raise ValueError("Tamaño de pool inválido")
+
+        self._config = config
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout_espera = timeout_espera
+        self.tiempo_inactividad = tiempo_inactividad
+        self.intervalo_verificacion = intervalo_verificacion
+
+        self._condicion = threading.Condition(threading.Lock())
+        self._inactivas = []  # pila de (conexion, instante_devolucion)
+        self._en_uso = set()
+        self._creando = 0
+
+        # Estadísticas
+        self._creadas = 0
+        self._descartadas = 0
+        self._entregas = 0
+        self._esperas = 0
+        self._timeouts = 0
+        self._tiempo_espera_total = 0.0
+        self._tiempo_espera_max = 0.0
+
+        for _ in range(minimo):
+            conexion = self._crear_conexion()
+            if conexion is None:
+                break
+            self._inactivas.append((conexion, time.monotonic()))
+
+    def _crear_conexion(self):
+        try:
+            conexion = mysql.connector.connect(**self._config)
+        except Error as e:
+            logger.error(f"Error al conectar a la base de datos: {e}")
+            return None
+
+        with self._condicion:
+            self._creadas += 1
+        logger.info("Conexión a la base de datos establecida correctamente")
+        return conexion
+
+    def _descartar(self, conexiones):
+        # Fuera del lock: cerrar una conexión puede bloquear esperando la red
+        for conexion in conexiones:
+            try:
+                conexion.close()
+            except Error:
+                pass
+
+    def _es_saludable(self, conexion, inactiva_desde):
+        """
+        Verifica la conexión solo si estuvo ociosa más del intervalo configurado,
+        para no pagar un ping en cada petición.
+        """
+        if time.monotonic() - inactiva_desde < self.intervalo_verificacion:
+            return True
+        try:
+            conexion.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    def _desalojar_inactivas(self, descartadas):
+        # Se llama con el lock tomado; las conexiones a cerrar se agregan a
+        # `descartadas`. Las más antiguas quedan al fondo de la pila.
+        limite = time.monotonic() - self.tiempo_inactividad
+        while (self._inactivas and self._inactivas[0][1] < limite and
+               len(self._inactivas) + len(self._en_uso) > self.minimo):
+            conexion, _ = self._inactivas.pop(0)
+            descartadas.append(conexion)
+            self._descartadas += 1
+
+    def obtener(self):
+        """
+        Entrega una conexión del pool. Retorna None si no hay conexión
+        disponible dentro del timeout de espera o si no se puede conectar.
+        """
+        inicio = time.monotonic()
+        espero = False
+        descartadas = []
+        agotado = False
+
+        with self._condicion:
+            while True:
+                self._desalojar_inactivas(descartadas)
+
+                if self._inactivas:
+                    conexion, inactiva_desde = self._inactivas.pop()
+                    self._en_uso.add(conexion)
+                    break
+
+                if len(self._en_uso) + self._creando < self.maximo:
+                    self._creando += 1
+                    conexion = None
+                    break
+
+                restante = self.timeout_espera - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self._timeouts += 1
+                    agotado = True
+                    break
+                espero = True
+                self._condicion.wait(restante)
+
+            self._registrar_espera(inicio, espero)
+
+        self._descartar(descartadas)
+        if agotado:
+            logger.error("Tiempo de espera agotado al obtener una conexión del pool")
+            return None
+
+        if conexion is None:
+            conexion = self._crear_conexion()
+            with self._condicion:
+                self._creando -= 1
+                if conexion is None:
+                    self._condicion.notify()
+                    return None
+                self._en_uso.add(conexion)
+                self._entregas += 1
+            return conexion
+
+        if not self._es_saludable(conexion, inactiva_desde):
+            logger.warning("Conexión inactiva inválida, se reemplaza por una nueva")
+            with self._condicion:
+                self._en_uso.discard(conexion)
+                self._descartadas += 1
+                self._condicion.notify()
+            self._descartar([conexion])
+            return self.obtener()
+
+        with self._condicion:
+            self._entregas += 1
+        return conexion
+
+    def _registrar_espera(self, inicio, espero):
+        if not espero:
+            return
+        espera = time.monotonic() - inicio
+        self._esperas += 1
+        self._tiempo_espera_total += espera
+        self._tiempo_espera_max = max(self._tiempo_espera_max, espera)
+
+    def devolver(self, conexion):
+        """
+        Devuelve una conexión al pool. Las transacciones abiertas se deshacen
+        y las conexiones caídas se descartan.
+        """
+        reutilizable = True
+        try:
+            if conexion.in_transaction:
+                conexion.rollback()
+        except Error:
+            reutilizable = False
+
+        with self._condicion:
+            if conexion not in self._en_uso:
+                return
+            self._en_uso.discard(conexion)
+            if reutilizable:
+                self._inactivas.append((conexion, time.monotonic()))
+            else:
+                self._descartadas += 1
+            self._condicion.notify()
+
+        if not reutilizable:
+            self._descartar([conexion])
+
+    def contiene(self, conexion):
+        with self._condicion:
+            return conexion in self._en_uso
+
+    def cerrar(self):
+        """
+        Cierra todas las conexiones ociosas del pool
+        """
+        with self._condicion:
+            descartadas = [conexion for conexion, _ in self._inactivas]
+            self._inactivas.clear()
+            self._descartadas += len(descartadas)
+        self._descartar(descartadas)
+
+    def estadisticas(self):
+        """
+        Retorna el estado actual del pool para poder dimensionarlo
+        """
+        with self._condicion:
+            return {
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "en_uso": len(self._en_uso),
+                "inactivas": len(self._inactivas),
+                "creadas": self._creadas,
+                "descartadas": self._descartadas,
+                "entregas": self._entregas,
+                "esperas": self._esperas,
+                "timeouts": self._timeouts,
+                "tiempo_espera_promedio_ms": round(self._tiempo_espera_total / self._esperas * 1000, 3) if self._esperas else 0.0,
+                "tiempo_espera_max_ms": round(self._tiempo_espera_max * 1000, 3)
+            }
+
+
+def _config_replica(direccion):
+    host, _, puerto = direccion.partition(':')
+    config = dict(DB_CONFIG, host=host, port=int(puerto or DB_CONFIG['port']))
+    if 'DB_REPLICA_USER' in os.environ:
+        config['user'] = os.environ['DB_REPLICA_USER']
+        config['password'] = os.environ.get('DB_REPLICA_PASSWORD', '')
+    return config
+
+
+def _leer_versiones(pool):
     """
-    Establece y retorna una conexión a la base de datos MySQL
+    Lee todas las filas de versiones_recursos (ver versiones.py) con una
+    conexión de `pool`. Retorna {recurso: version}, o None si falla.
     """
+    conexion = pool.obtener()
+    if conexion is None:
+        return None
+    cursor = None
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',  # Cambia por tu usuario
-            password='',  # Cambia por tu contraseña
-            database='control_canastillas_v2'
-        )
-        
-        if connection.is_connected():
-            logger.info("Conexión a la base de datos establecida correctamente")
-            return connection
-            
-    except Error as e:
-        logger.error(f"Error al conectar a la base de datos: {e}")
+        cursor = conexion.cursor()
+        cursor.execute("SELECT recurso, version FROM versiones_recursos")
+        return {recurso: int(version) for recurso, version in cursor.fetchall()}
+    except Error:
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        pool.devolver(conexion)
+
+
+def _cumple(versiones, requisito):
+    return versiones is not None and all(versiones.get(recurso, -1) >= version
+                                         for recurso, version in requisito.items())
+
+
+class Replica:
+    """
+    Pool de una réplica y lo que el monitor sabe de ella: las últimas
+    versiones leídas y el retraso estimado respecto de la primaria
+    """
+
+    def __init__(self, direccion, pool):
+        self.direccion = direccion
+        self.pool = pool
+        self.versiones = None
+        self.retraso = None  # segundos; None si no responde
+        self.lecturas = 0
+        self._lock = threading.Lock()
+
+    def contar_lectura(self):
+        with self._lock:
+            self.lecturas += 1
+
+    def actualizar_versiones(self, versiones):
+        # Las versiones solo crecen; una lectura más vieja no retrocede el estado
+        if self.versiones is not None:
+            versiones = {recurso: max(version, self.versiones.get(recurso, -1))
+                         for recurso, version in versiones.items()}
+        self.versiones = versiones
+
+    def elegible(self):
+        return self.retraso is not None and self.retraso <= REPLICA_RETRASO_MAX
+
+    def estadisticas(self):
+        return dict(self.pool.estadisticas(), direccion=self.direccion, lecturas=self.lecturas,
+                    retraso_s=round(self.retraso, 3) if self.retraso is not None else None,
+                    elegible=self.elegible())
+
+
+class MonitorReplicas:
+    """
+    Mide el retraso de cada réplica sin depender de privilegios de
+    replicación: cada `intervalo` lee las versiones de la primaria y guarda
+    la lectura con su instante; el retraso de una réplica es la antigüedad
+    de la lectura más reciente de la primaria que la réplica ya alcanzó.
+    Una réplica que no responde o que no alcanzó ninguna lectura de la
+    ventana queda sin retraso y no recibe lecturas.
+    """
+
+    def __init__(self, primaria, replicas, intervalo=REPLICA_INTERVALO, retraso_max=REPLICA_RETRASO_MAX):
+        self._primaria = primaria
+        self.replicas = replicas
+        self.intervalo = intervalo
+        self._historial = deque(maxlen=int(retraso_max / intervalo) + 2)  # (instante, versiones de la primaria)
+        self._hilo = threading.Thread(target=self._ciclo, name='monitor-replicas', daemon=True)
+        self._hilo.start()
+
+    def _ciclo(self):
+        while True:
+            try:
+                self.medir()
+            except Exception as e:
+                logger.error(f"Error inesperado al medir el retraso de las réplicas: {e}")
+            time.sleep(self.intervalo)
+
+    def medir(self):
+        versiones = _leer_versiones(self._primaria)
+        if versiones is None:
+            return
+        self._historial.append((time.monotonic(), versiones))
+        for replica in self.replicas:
+            versiones_replica = _leer_versiones(replica.pool)
+            if versiones_replica is None:
+                if replica.retraso is not None:
+                    logger.warning(f"La réplica {replica.direccion} no responde; sus lecturas van a la primaria")
+                replica.retraso = None
+                continue
+            replica.actualizar_versiones(versiones_replica)
+            ahora = time.monotonic()
+            alcanzadas = [instante for instante, leidas in self._historial if _cumple(replica.versiones, leidas)]
+            replica.retraso = ahora - alcanzadas[-1] if alcanzadas else None
+
+
+# Versiones mínimas que deben tener los datos que lee la petición en curso.
+# PRIMARIA envía todas sus lecturas a la primaria.
+PRIMARIA = 'primaria'
+_requisito_lectura = contextvars.ContextVar('requisito_lectura', default=None)
+
+
+def fijar_requisito_lectura(requisito):
+    """
+    Fija el requisito de las lecturas de la petición en curso: None,
+    PRIMARIA o {recurso: version}. Retorna el token para restablecerlo.
+    """
+    return _requisito_lectura.set(requisito)
+
+
+def restablecer_requisito_lectura(token):
+    _requisito_lectura.reset(token)
+
+
+def exigir_versiones(versiones):
+    """
+    Agrega versiones al requisito de la petición en curso, por ejemplo las
+    del ETag, para no responder con datos más viejos que lo anunciado
+    """
+    actual = _requisito_lectura.get()
+    if actual == PRIMARIA or not versiones:
+        return
+    combinado = dict(actual or {})
+    for recurso, version in versiones.items():
+        combinado[recurso] = max(version, combinado.get(recurso, -1))
+    _requisito_lectura.set(combinado)
+
+
+def cumple_requisito_lectura(versiones):
+    """
+    Indica si datos calculados con `versiones` sirven a la petición en
+    curso: su requisito, limitado a esos recursos, no pide nada más nuevo.
+    Con PRIMARIA no sirven; esas lecturas van siempre a la primaria.
+    """
+    requisito = _requisito_lectura.get()
+    if requisito == PRIMARIA:
+        return False
+    return not requisito or _cumple(versiones, {recurso: version for recurso, version in requisito.items()
+                                                if recurso in versiones})
+
+
+_pool = None
+_pid_pool = None
+_pool_lock = threading.Lock()
+_monitor = None
+_pid_monitor = None
+_turno = itertools.count()
+_lecturas_primaria = 0
+_lecturas_lock = threading.Lock()
+
+
+def _obtener_pool():
+    # El pool se crea de forma perezosa para que cada proceso tenga el suyo.
+    # Un hijo del fork no cierra las conexiones heredadas: sus sockets
+    # siguen siendo del proceso padre.
+    global _pool, _pid_pool
+    if _pool is None or _pid_pool != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pid_pool != os.getpid():
+                _pool = PoolConexiones(DB_CONFIG)
+                _pid_pool = os.getpid()
+    return _pool
+
+
+def _obtener_monitor():
+    # Como el pool, el monitor y los pools de las réplicas son de cada proceso
+    global _monitor, _pid_monitor
+    if _monitor is None or _pid_monitor != os.getpid():
+        primaria = _obtener_pool()
+        with _pool_lock:
+            if _monitor is None or _pid_monitor != os.getpid():
+                replicas = [Replica(direccion, PoolConexiones(_config_replica(direccion)))
+                            for direccion in DB_REPLICAS]
+                _monitor = MonitorReplicas(primaria, replicas)
+                _pid_monitor = os.getpid()
+    return _monitor
+
+
+def _conexion_replica():
+    """
+    Conexión de la réplica menos ocupada entre las que no están atrasadas y
+    cumplen el requisito de la petición según la última medición del
+    monitor; no se consulta la réplica en la petición. Retorna None si
+    ninguna sirve.
+    """
+    requisito = _requisito_lectura.get()
+    if requisito == PRIMARIA:
+        return None
+    replicas = _obtener_monitor().replicas
+    inicio = next(_turno) % len(replicas)
+    candidatas = [replica for replica in replicas[inicio:] + replicas[:inicio] if replica.elegible()]
+    candidatas.sort(key=lambda replica: replica.pool.estadisticas()['en_uso'])
+    for replica in candidatas:
+        if requisito and not _cumple(replica.versiones, requisito):
+            continue
+        conexion = replica.pool.obtener()
+        if conexion is not None:
+            replica.contar_lectura()
+            return conexion
+    return None
+
+
+def versiones_replicas():
+    """
+    Versiones que ya tienen todas las réplicas elegibles que cumplen el
+    requisito de la petición, según la última medición del monitor, sin
+    consultar la base. Una lectura que exige estas versiones puede ir a
+    cualquiera de esas réplicas. Retorna None si ninguna sirve.
+    """
+    if not DB_REPLICAS:
+        return None
+    requisito = _requisito_lectura.get()
+    if requisito == PRIMARIA:
         return None
+    conocidas = [replica.versiones for replica in _obtener_monitor().replicas
+                 if replica.elegible() and (not requisito or _cumple(replica.versiones, requisito))]
+    if not conocidas:
+        return None
+    return {recurso: min(versiones.get(recurso, -1) for versiones in conocidas) for recurso in conocidas[0]}
+
+
+def get_db_connection(lectura=False):
+    """
+    Obtiene una conexión a la base de datos MySQL desde el pool. Con
+    `lectura` y réplicas configuradas, la conexión es de una réplica al día
+    con el requisito de la petición, o de la primaria si ninguna lo está.
+    """
+    global _lecturas_primaria
+    if lectura and DB_REPLICAS:
+        conexion = _conexion_replica()
+        if conexion is not None:
+            return conexion
+        with _lecturas_lock:
+            _lecturas_primaria += 1
+    return _obtener_pool().obtener()
+
 
 def close_db_connection(connection):
     """
-    Cierra la conexión a la base de datos
+    Devuelve la conexión al pool del que salió para que pueda reutilizarse
+    """
+    if not connection:
+        return
+    if _monitor is not None:
+        for replica in _monitor.replicas:
+            if replica.pool.contiene(connection):
+                replica.pool.devolver(connection)
+                return
+    _obtener_pool().devolver(connection)
+
+
+def hay_replicas():
+    return bool(DB_REPLICAS)
+
+
+def get_pool_stats():
+    """
+    Retorna las estadísticas del pool de conexiones y, con réplicas, las de
+    cada réplica y las lecturas que fueron a la primaria
     """
-    if connection and connection.is_connected():
-        connection.close()
-        logger.info("Conexión a la base de datos cerrada")
\ No newline at end of file
+    estadisticas = _obtener_pool().estadisticas()
+    if DB_REPLICAS:
+        estadisticas["lecturas_primaria"] = _lecturas_primaria
+        estadisticas["replicas"] = [replica.estadisticas() for replica in _obtener_monitor().replicas]
+    return estadisticas
+
+
+def _mostrar_replicas(segundos=10):
+    """
+    Muestra cada medio segundo el retraso y las versiones de cada réplica
+    """
+    if not DB_REPLICAS:
+        print("No hay réplicas configuradas (DB_REPLICAS)")
+        return
+    monitor = _obtener_monitor()
+    primaria = _obtener_pool()
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        time.sleep(0.5)
+        print(f"primaria {_leer_versiones(primaria)}")
+        for replica in monitor.replicas:
+            retraso = f"{replica.retraso:.3f} s" if replica.retraso is not None else "sin respuesta"
+            print(f"  {replica.direccion:<22} retraso {retraso:<14} "
+                  f"{'elegible' if replica.elegible() else 'excluida'}  {replica.versiones}")
+
+
+if __name__ == '__main__':
+    _mostrar_replicas()
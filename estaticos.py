@@ -0,0 +1,194 @@
+import gzip
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+# brotli es opcional; sin él solo se ofrecen las variantes gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+CARPETAS_ESTATICAS = ('css', 'js', 'html')
+
+TIPOS_CONTENIDO = {
+    '.html': 'text/html; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.ico': 'image/x-icon'
+}
+
+# Solo vale la pena comprimir texto
+TIPOS_COMPRIMIBLES = ('.html', '.css', '.js', '.json', '.svg')
+
+INTERVALO_RECARGA = 1.0  # segundos mínimos entre revisiones de mtime
+
+# Referencias relativas a css/js dentro del HTML, para agregarles ?v=<hash>
+_REFERENCIA_RECURSO = re.compile(r'((?:href|src)=")(\.\./(?:css|js)/[^"?#]+)(")')
+
+
+class Estatico:
+    """
+    Un archivo estático en memoria con sus variantes comprimidas
+    """
+
+    def __init__(self, contenido, tipo_contenido, modificado, comprimir):
+        self.tipo_contenido = tipo_contenido
+        self.modificado = modificado
+        self.hash = hashlib.sha256(contenido).hexdigest()[:16]
+
+        # codificación -> (bytes, etag). Una variante comprimida solo se
+        # guarda si es más pequeña que el original.
+        self.variantes = {'identity': (contenido, f'"{self.hash}"')}
+        if comprimir:
+            comprimido = gzip.compress(contenido, compresslevel=9, mtime=0)
+            if len(comprimido) < len(contenido):
+                self.variantes['gzip'] = (comprimido, f'"{self.hash}-gz"')
+            if brotli is not None:
+                comprimido = brotli.compress(contenido, quality=11)
+                if len(comprimido) < len(contenido):
+                    self.variantes['br'] = (comprimido, f'"{self.hash}-br"')
+
+
+def elegir_codificacion(accept_encoding, disponibles):
+    """
+    Elige la mejor codificación aceptada por el cliente entre las
+    disponibles (br antes que gzip). Retorna 'identity' si no hay otra.
+    """
+    if not accept_encoding:
+        return 'identity'
+
+    aceptadas = {}
+    for parte in accept_encoding.split(','):
+        nombre, _, parametros = parte.strip().partition(';')
+        calidad = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        aceptadas[nombre.strip().lower()] = calidad
+
+    for codificacion in ('br', 'gzip'):
+        calidad = aceptadas.get(codificacion, aceptadas.get('*', 0.0))
+        if codificacion in disponibles and calidad > 0:
+            return codificacion
+    return 'identity'
+
+
+class AlmacenEstaticos:
+    """
+    Carga los archivos de html/, css/ y js/ una sola vez y los sirve desde
+    memoria. Con `recargar` activo revisa los mtime y vuelve a cargar todo
+    cuando alguno cambia (útil en desarrollo).
+    """
+
+    def __init__(self, raiz, carpetas=CARPETAS_ESTATICAS, recargar=False):
+        self.raiz = raiz
+        self.carpetas = carpetas
+        self.recargar = recargar
+        self._archivos = {}
+        self._mtimes = {}
+        self._ultima_revision = 0.0
+        self._lock = threading.Lock()
+        self.cargar()
+
+    def _listar(self):
+        mtimes = {}
+        for carpeta in self.carpetas:
+            directorio = os.path.join(self.raiz, carpeta)
+            if not os.path.isdir(directorio):
+                continue
+            for actual, _, nombres in os.walk(directorio):
+                for nombre in nombres:
+                    ruta_archivo = os.path.join(actual, nombre)
+                    ruta = '/' + os.path.relpath(ruta_archivo, self.raiz).replace(os.sep, '/')
+                    mtimes[ruta] = os.stat(ruta_archivo).st_mtime
+        return mtimes
+
+    def cargar(self):
+        mtimes = self._listar()
+        archivos = {}
+        # Primero css y js: el HTML necesita sus hashes para las referencias
+        for ruta in sorted(mtimes, key=lambda r: r.endswith('.html')):
+            with open(os.path.join(self.raiz, ruta[1:]), 'rb') as archivo:
+                contenido = archivo.read()
+            extension = os.path.splitext(ruta)[1].lower()
+            if extension == '.html':
+                contenido = self._versionar_referencias(ruta, contenido, archivos)
+            archivos[ruta] = Estatico(contenido,
+                                      TIPOS_CONTENIDO.get(extension, 'application/octet-stream'),
+                                      int(mtimes[ruta]),
+                                      extension in TIPOS_COMPRIMIBLES)
+
+        with self._lock:
+            self._archivos = archivos
+            self._mtimes = mtimes
+            self._ultima_revision = time.monotonic()
+        logger.info(f"{len(archivos)} archivos estáticos cargados en memoria")
+
+    def _versionar_referencias(self, ruta, contenido, archivos):
+        """
+        Agrega ?v=<hash> a las referencias a css/js para poder cachearlas
+        por largo tiempo: al cambiar el archivo cambia la URL
+        """
+        base = os.path.dirname(ruta)
+
+        def reemplazar(coincidencia):
+            destino = os.path.normpath(os.path.join(base, coincidencia.group(2))).replace(os.sep, '/')
+            estatico = archivos.get(destino)
+            if estatico is None:
+                return coincidencia.group(0)
+            return f"{coincidencia.group(1)}{coincidencia.group(2)}?v={estatico.hash}{coincidencia.group(3)}"
+
+        return _REFERENCIA_RECURSO.sub(reemplazar, contenido.decode('utf-8')).encode('utf-8')
+
+    def _revisar_cambios(self):
+        ahora = time.monotonic()
+        with self._lock:
+            if ahora - self._ultima_revision < INTERVALO_RECARGA:
+                return
+            self._ultima_revision = ahora
+            anteriores = self._mtimes
+
+        if self._listar() != anteriores:
+            self.cargar()
+
+    def obtener(self, ruta):
+        """
+        Retorna el Estatico de la ruta ('/js/dashboard.js') o None
+        """
+        if self.recargar:
+            self._revisar_cambios()
+        return self._archivos.get(ruta)
+
+
+_almacen = None
+_almacen_lock = threading.Lock()
+
+
+def cargar_estaticos(raiz=None, recargar=False):
+    """
+    Carga los archivos estáticos. Se llama al iniciar el servidor, antes de
+    crear los procesos, para que todos compartan la copia en memoria.
+    """
+    global _almacen
+    with _almacen_lock:
+        _almacen = AlmacenEstaticos(raiz or os.getcwd(), recargar=recargar)
+    return _almacen
+
+
+def obtener_estatico(ruta):
+    if _almacen is None:
+        cargar_estaticos()
+    return _almacen.obtener(ruta)
@@ -0,0 +1,319 @@
+from collections import defaultdict, deque
+from datetime import datetime
+from itertools import islice
+import logging
+import os
+import secrets
+import selectors
+import socket
+import threading
+
+from codificacion import codificar_json
+
+logger = logging.getLogger(__name__)
+
+# Eventos recientes que se conservan para reenviar a los clientes que se
+# reconectan con Last-Event-ID
+CAPACIDAD_HISTORIAL = int(os.environ.get('EVENTOS_HISTORIAL', '1000'))
+INTERVALO_LATIDO = float(os.environ.get('EVENTOS_LATIDO', '15'))  # segundos entre comentarios de keep-alive
+REINTENTO_MS = 3000  # espera sugerida al navegador antes de reconectar
+TAMANO_MAXIMO_EVENTO = 60 * 1024
+
+LATIDO = b': latido\n\n'
+
+
+class CanalEventos:
+    """
+    Canal de eventos en memoria. Cada evento se serializa una sola vez como
+    marco SSE y se guarda en un historial circular; los suscriptores solo
+    recuerdan el número del último evento que enviaron, así publicar no
+    depende del número de suscriptores.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD_HISTORIAL, instancia=None):
+        # La instancia distingue los IDs de este canal de los de un arranque anterior
+        self.instancia = instancia or secrets.token_hex(4)
+        self._historial = deque(maxlen=capacidad)
+        self._ultimo = 0
+        self._condicion = threading.Condition()
+        self._avisos = []  # funciones llamadas tras cada evento (p. ej. para despertar un loop asyncio)
+        self.cerrado = False
+
+    def publicar(self, tipo, datos):
+        """
+        Agrega un evento con el siguiente número. `datos` ya es JSON en bytes.
+        """
+        with self._condicion:
+            self.agregar(self._ultimo + 1, tipo, datos)
+
+    def agregar(self, numero, tipo, datos):
+        """
+        Agrega un evento numerado por el relevo entre procesos. Si falta
+        alguno, el historial se descarta y los suscriptores atrasados
+        reciben 'recargar'.
+        """
+        with self._condicion:
+            if numero <= self._ultimo:
+                return
+            if numero != self._ultimo + 1:
+                logger.warning(f"Se perdieron {numero - self._ultimo - 1} eventos; se descarta el historial")
+                self._historial.clear()
+            self._historial.append(b'id: %s-%d\nevent: %s\ndata: %s\n\n'
+                                   % (self.instancia.encode(), numero, tipo, datos))
+            self._ultimo = numero
+            self._condicion.notify_all()
+        for aviso in list(self._avisos):
+            aviso()
+
+    def agregar_aviso(self, aviso):
+        self._avisos.append(aviso)
+
+    def quitar_aviso(self, aviso):
+        if aviso in self._avisos:
+            self._avisos.remove(aviso)
+
+    def posicion(self, ultimo_id):
+        """
+        Traduce el Last-Event-ID del cliente a un número de evento. Retorna
+        (numero, valido); no es válido si el ID es de otro canal o ya salió
+        del historial.
+        """
+        with self._condicion:
+            ultimo = self._ultimo
+            cantidad = len(self._historial)
+        if not ultimo_id:
+            return ultimo, True
+
+        instancia, _, numero = ultimo_id.rpartition('-')
+        try:
+            numero = int(numero)
+        except ValueError:
+            return ultimo, False
+        if instancia != self.instancia or numero > ultimo or ultimo - numero > cantidad:
+            return ultimo, False
+        return numero, True
+
+    def pendientes(self, desde):
+        """
+        Retorna (marcos posteriores a `desde`, número del último evento). Los
+        marcos son None si el historial ya no los tiene.
+        """
+        with self._condicion:
+            faltan = self._ultimo - desde
+            if faltan <= 0:
+                return [], self._ultimo
+            if faltan > len(self._historial):
+                return None, self._ultimo
+            # Casi siempre falta uno o pocos: se recorren desde el final
+            marcos = list(islice(reversed(self._historial), faltan))
+            marcos.reverse()
+            return marcos, self._ultimo
+
+    def esperar(self, desde, espera):
+        """
+        Bloquea hasta que haya eventos posteriores a `desde`, el canal se
+        cierre o pasen `espera` segundos
+        """
+        with self._condicion:
+            self._condicion.wait_for(lambda: self._ultimo > desde or self.cerrado, espera)
+
+    def cerrar(self):
+        with self._condicion:
+            self.cerrado = True
+            self._condicion.notify_all()
+        for aviso in list(self._avisos):
+            aviso()
+
+
+def _marco(tipo, datos):
+    return b'event: %s\ndata: %s\n\n' % (tipo, codificar_json(datos))
+
+
+class Suscripcion:
+    """
+    Posición de un cliente en el canal. El servidor por hilos usa
+    siguientes(), que bloquea; el servidor asyncio usa disponibles() y
+    espera el aviso del canal.
+    """
+
+    def __init__(self, canal, ultimo_id=None):
+        self.canal = canal
+        self._desde, self._valido = canal.posicion(ultimo_id)
+
+    def inicio(self):
+        """
+        Primer bloque del stream: el tiempo de reconexión y los eventos que
+        el cliente se perdió, o 'recargar' si no se pueden reenviar
+        """
+        inicio = b'retry: %d\n\n' % REINTENTO_MS
+        if not self._valido:
+            return inicio + _marco(b'recargar', {})
+        return inicio + self.disponibles()
+
+    def disponibles(self):
+        marcos, self._desde = self.canal.pendientes(self._desde)
+        if marcos is None:
+            # El cliente se atrasó más que el historial
+            return _marco(b'recargar', {})
+        return b''.join(marcos)
+
+    def siguientes(self, espera=INTERVALO_LATIDO):
+        """
+        Espera eventos nuevos y los retorna; si no llegan en `espera`
+        segundos retorna un latido
+        """
+        self.canal.esperar(self._desde, espera)
+        return self.disponibles() or LATIDO
+
+
+class RespuestaEventos:
+    """
+    Respuesta text/event-stream que se mantiene abierta hasta que el
+    cliente se desconecta o el servidor se detiene
+    """
+
+    def __init__(self, suscripcion):
+        self.status = 200
+        self.suscripcion = suscripcion
+        self.encabezados = [('Content-type', 'text/event-stream; charset=utf-8'),
+                            ('Cache-Control', 'no-cache'),
+                            ('Access-Control-Allow-Origin', '*'),
+                            ('X-Accel-Buffering', 'no')]
+
+
+_canal = CanalEventos()
+_envio = None  # socket hacia el proceso padre en el modo 'procesos'
+
+
+def canal():
+    return _canal
+
+
+def suscribir(ultimo_id=None):
+    return RespuestaEventos(Suscripcion(_canal, ultimo_id))
+
+
+def publicar(tipo, datos):
+    """
+    Publica un evento para los suscriptores. Se llama después del commit;
+    un error al publicar se registra pero no afecta a la escritura.
+    """
+    try:
+        carga = codificar_json(datos)
+        if len(carga) > TAMANO_MAXIMO_EVENTO:
+            logger.warning(f"Evento '{tipo}' descartado por tamaño ({len(carga)} bytes)")
+            return
+        if _envio is not None:
+            # Sin bloquear: si el padre no lee, se pierde el evento y no la petición
+            _envio.send(tipo.encode() + b'\n' + carga, socket.MSG_DONTWAIT)
+        else:
+            _canal.publicar(tipo.encode(), carga)
+    except (OSError, TypeError, ValueError) as e:
+        logger.error(f"Error al publicar el evento '{tipo}': {e}")
+
+
+def conteos(cambios=(), meses=()):
+    """
+    Agrupa los ((ubicacion, estado), delta) aplicados al resumen y los
+    (mes, delta) de movimientos en deltas por estado, ubicación y mes
+    """
+    por_estado = defaultdict(int)
+    por_ubicacion = defaultdict(int)
+    por_mes = defaultdict(int)
+    for (ubicacion, estado), delta in cambios:
+        por_estado[estado] += delta
+        por_ubicacion[ubicacion] += delta
+    for mes, delta in meses:
+        por_mes[mes] += delta
+    return {
+        "por_estado": {clave: delta for clave, delta in por_estado.items() if delta},
+        "por_ubicacion": {clave: delta for clave, delta in por_ubicacion.items() if delta},
+        "por_mes": {clave: delta for clave, delta in por_mes.items() if delta}
+    }
+
+
+def mes_actual():
+    return datetime.now().strftime('%Y-%m')
+
+
+def detener_suscripciones():
+    """
+    Cierra el canal para que los streams abiertos terminen al apagar el servidor
+    """
+    _canal.cerrar()
+
+
+class RelevoProcesos:
+    """
+    Reparte los eventos entre los procesos del modo 'procesos'. Cada hijo
+    envía sus eventos al padre, que los numera y los reenvía a todos; así
+    todos los procesos tienen la misma secuencia y un cliente puede
+    reconectarse a cualquiera con su Last-Event-ID.
+    """
+
+    def __init__(self, procesos):
+        self._pares = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) for _ in range(procesos)]
+
+    def en_hijo(self, indice):
+        """
+        Se llama en el hijo `indice` justo después del fork
+        """
+        global _envio
+        for posicion, (padre, hijo) in enumerate(self._pares):
+            padre.close()
+            if posicion != indice:
+                hijo.close()
+        conexion = self._pares[indice][1]
+        _envio = conexion
+        threading.Thread(target=self._recibir, args=(conexion,), name='eventos-relevo', daemon=True).start()
+
+    @staticmethod
+    def _recibir(conexion):
+        while True:
+            try:
+                mensaje = conexion.recv(TAMANO_MAXIMO_EVENTO + 256)
+                numero, tipo, datos = mensaje.split(b'\n', 2)
+                _canal.agregar(int(numero), tipo, datos)
+            except OSError:
+                return
+            except ValueError as e:
+                logger.error(f"Evento mal formado del relevo: {e}")
+
+    def en_padre(self):
+        """
+        Se llama en el padre después de crear todos los hijos
+        """
+        extremos = []
+        for padre, hijo in self._pares:
+            hijo.close()
+            padre.setblocking(False)
+            extremos.append(padre)
+        threading.Thread(target=self._reenviar, args=(extremos,), name='eventos-relevo', daemon=True).start()
+
+    @staticmethod
+    def _reenviar(extremos):
+        selector = selectors.DefaultSelector()
+        for extremo in extremos:
+            selector.register(extremo, selectors.EVENT_READ)
+        numero = 0
+        while True:
+            for clave, _ in selector.select():
+                try:
+                    mensaje = clave.fileobj.recv(TAMANO_MAXIMO_EVENTO + 256)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    mensaje = b''
+                if not mensaje:
+                    selector.unregister(clave.fileobj)
+                    continue
+                numero += 1
+                mensaje = b'%d\n%s' % (numero, mensaje)
+                for extremo in extremos:
+                    try:
+                        extremo.send(mensaje)
+                    except BlockingIOError:
+                        # El hijo no está leyendo; detectará el hueco y pedirá recargar
+                        logger.warning("Un proceso no recibió un evento: cola llena")
+                    except OSError:
+                        pass
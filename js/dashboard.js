@@ -2,9 +2,43 @@ document.addEventListener('DOMContentLoaded', function() {
     // Variables globales para los gráficos
     let tendenciaChart = null;
     let barChart = null;
+
+    // Últimas métricas recibidas; los eventos del servidor se aplican sobre ellas
+    let datosActuales = null;
+    let cargando = false;
+    let recargaPendiente = false;
+
+    // Canal de eventos del servidor y respaldo por sondeo si no está disponible
+    const URL_EVENTOS = 'http://localhost:8000/api/eventos';
+    const INTERVALO_SONDEO = 60000;
+    let fuenteEventos = null;
+    let intervaloSondeo = null;
+
+    // Tendencia configurable: rango y granularidad de cada opción del filtro.
+    // La opción mensual sin ubicación usa la serie que ya traen las métricas.
+    const URL_TENDENCIA = 'http://localhost:8000/api/dashboard/tendencia';
+    const OPCIONES_TENDENCIA = {
+        hourly: { rango: '48h', granularidad: 'hora', etiqueta: 'Movimientos por hora' },
+        daily: { rango: '30d', granularidad: 'dia', etiqueta: 'Movimientos diarios' },
+        monthly: { rango: '6m', granularidad: 'mes', etiqueta: 'Movimientos mensuales' },
+        quarterly: { rango: '2a', granularidad: 'trimestre', etiqueta: 'Movimientos trimestrales' },
+        yearly: { rango: '5a', granularidad: 'anio', etiqueta: 'Movimientos anuales' }
+    };
+    const ESPERA_TENDENCIA = 2000;  // agrupa los eventos seguidos en una sola consulta
+    let filtroTendencia = 'monthly';
+    let filtroUbicacion = 'all';
+    let tendenciaFiltrada = null;
+    let temporizadorTendencia = null;
+    let consultaTendencia = 0;  // descarta respuestas de filtros anteriores
     
     // Función para obtener datos reales de la API
     const fetchDashboardData = async () => {
+        // Si llega un evento durante la carga, se vuelve a cargar al terminar
+        if (cargando) {
+            recargaPendiente = true;
+            return;
+        }
+        cargando = true;
         try {
             // Mostrar estado de carga
             mostrarEstadoCarga(true);
@@ -20,11 +54,17 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error(data.error);
             }
 
+            datosActuales = data;
+
             // Actualizar métricas en la interfaz con datos reales
             actualizarMetricas(data);
             
             // Crear o actualizar gráficos
             actualizarGraficos(data);
+            actualizarOpcionesUbicacion(data.grafico_barras.labels);
+            if (!tendenciaPorDefecto()) {
+                cargarTendencia();
+            }
             
             // Mostrar movimientos recientes si existen en la respuesta
             if (data.movimientos_recientes && data.movimientos_recientes.length > 0) {
@@ -38,9 +78,223 @@ document.addEventListener('DOMContentLoaded', function() {
             console.error('Error al obtener los datos del dashboard:', error);
             mostrarError('No se pudieron cargar los datos. Verifica la conexión con el servidor.');
             mostrarEstadoCarga(false);
+        } finally {
+            cargando = false;
+            if (recargaPendiente) {
+                recargaPendiente = false;
+                fetchDashboardData();
+            }
         }
     };
 
+    // Suma a una serie de un gráfico los cambios {etiqueta: delta}. Retorna
+    // false si aparece una etiqueta nueva que el gráfico no tiene.
+    function aplicarDeltasSerie(serie, deltas, agregarNuevas) {
+        for (const [etiqueta, delta] of Object.entries(deltas || {})) {
+            const indice = serie.labels.indexOf(etiqueta);
+            if (indice >= 0) {
+                serie.data[indice] += delta;
+            } else if (agregarNuevas) {
+                serie.labels.push(etiqueta);
+                serie.data.push(delta);
+            } else {
+                return false;
+            }
+        }
+        return true;
+    }
+
+    // Aplica los cambios de conteos enviados por el servidor
+    function aplicarConteos(conteos) {
+        const porEstado = conteos.por_estado || {};
+        for (const delta of Object.values(porEstado)) {
+            datosActuales.total += delta;
+        }
+        datosActuales.disponibles += porEstado['Disponible'] || 0;
+        datosActuales.en_movimiento += porEstado['En Tránsito'] || 0;
+        datosActuales.en_mantenimiento += porEstado['En Reparación'] || 0;
+
+        aplicarDeltasSerie(datosActuales.grafico_barras, conteos.por_ubicacion, true);
+        // Un mes que no está en el gráfico cambia la ventana: se recarga todo
+        return aplicarDeltasSerie(datosActuales.grafico_tendencia, conteos.por_mes, false);
+    }
+
+    function tendenciaPorDefecto() {
+        return filtroTendencia === 'monthly' && filtroUbicacion === 'all';
+    }
+
+    // Serie que muestra el gráfico de tendencia según los filtros
+    function serieTendencia(data) {
+        if (tendenciaPorDefecto() || !tendenciaFiltrada) {
+            return data.grafico_tendencia;
+        }
+        return tendenciaFiltrada;
+    }
+
+    // Pide la tendencia del rango, granularidad y ubicación elegidos
+    async function cargarTendencia() {
+        const consulta = ++consultaTendencia;
+        if (tendenciaPorDefecto()) {
+            tendenciaFiltrada = null;
+            if (datosActuales) {
+                refrescarGraficos();
+            }
+            return;
+        }
+        const opcion = OPCIONES_TENDENCIA[filtroTendencia];
+        const parametros = new URLSearchParams({ rango: opcion.rango, granularidad: opcion.granularidad });
+        if (filtroUbicacion !== 'all') {
+            parametros.set('ubicacion', filtroUbicacion);
+        }
+        try {
+            const response = await fetch(`${URL_TENDENCIA}?${parametros}`);
+            const data = await response.json();
+            if (!response.ok || data.error) {
+                throw new Error(data.error || 'Código: ' + response.status);
+            }
+            if (consulta !== consultaTendencia) {
+                return;
+            }
+            tendenciaFiltrada = { labels: data.labels, data: data.data };
+            if (datosActuales) {
+                refrescarGraficos();
+            }
+        } catch (error) {
+            console.error('Error al obtener la tendencia:', error);
+        }
+    }
+
+    function programarTendencia() {
+        clearTimeout(temporizadorTendencia);
+        temporizadorTendencia = setTimeout(cargarTendencia, ESPERA_TENDENCIA);
+    }
+
+    // Las opciones de ubicación son las del gráfico de barras
+    function actualizarOpcionesUbicacion(ubicaciones) {
+        const select = document.getElementById('ubicacion-filter');
+        if (!select) {
+            return;
+        }
+        const actuales = Array.from(select.options).map(opcion => opcion.value);
+        for (const ubicacion of ubicaciones) {
+            if (!actuales.includes(ubicacion)) {
+                select.add(new Option(ubicacion, ubicacion));
+            }
+        }
+    }
+
+    // Actualiza los gráficos sin recrearlos
+    function refrescarGraficos() {
+        if (!tendenciaChart || !barChart) {
+            actualizarGraficos(datosActuales);
+            return;
+        }
+        barChart.data.labels = datosActuales.grafico_barras.labels;
+        barChart.data.datasets[0].data = datosActuales.grafico_barras.data;
+        const serie = serieTendencia(datosActuales);
+        tendenciaChart.data.labels = serie.labels;
+        tendenciaChart.data.datasets[0].data = serie.data;
+        tendenciaChart.data.datasets[0].label = OPCIONES_TENDENCIA[filtroTendencia].etiqueta;
+        barChart.update('none');
+        tendenciaChart.update('none');
+    }
+
+    // Procesa un evento del servidor sin volver a pedir las métricas
+    function procesarEvento(tipo, evento) {
+        if (cargando) {
+            // Las métricas en camino pueden no incluir este cambio
+            recargaPendiente = true;
+            return;
+        }
+        if (!datosActuales) {
+            return;
+        }
+        const datos = JSON.parse(evento.data);
+        let completo = true;
+        if (datos.conteos) {
+            completo = aplicarConteos(datos.conteos);
+        }
+        if (tipo !== 'canastillas' && !tendenciaPorDefecto()) {
+            // La serie filtrada no se puede ajustar con los conteos por mes
+            programarTendencia();
+        }
+
+        const recientes = datosActuales.movimientos_recientes || [];
+        if (tipo === 'movimiento') {
+            recientes.unshift(datos.movimiento);
+            recientes.splice(5);
+        } else if (tipo === 'movimiento_actualizado') {
+            const indice = recientes.findIndex(m => m.id_movimiento === datos.movimiento.id_movimiento);
+            if (indice >= 0) {
+                recientes[indice] = { ...recientes[indice], ...datos.movimiento };
+            }
+        } else if (tipo === 'movimiento_eliminado') {
+            const indice = recientes.findIndex(m => m.id_movimiento === datos.id_movimiento);
+            if (indice >= 0) {
+                recientes.splice(indice, 1);
+            }
+        }
+        datosActuales.movimientos_recientes = recientes;
+
+        if (!completo) {
+            fetchDashboardData();
+            return;
+        }
+        actualizarMetricas(datosActuales);
+        refrescarGraficos();
+        mostrarMovimientosRecientes(recientes);
+    }
+
+    // Sondeo periódico, solo mientras el canal de eventos no funciona
+    function iniciarSondeo() {
+        if (!intervaloSondeo) {
+            intervaloSondeo = setInterval(fetchDashboardData, INTERVALO_SONDEO);
+        }
+    }
+
+    function detenerSondeo() {
+        clearInterval(intervaloSondeo);
+        intervaloSondeo = null;
+    }
+
+    // Suscripción a los cambios. El navegador reconecta solo y recupera los
+    // eventos perdidos con Last-Event-ID; si el servidor no puede reenviarlos
+    // envía 'recargar'.
+    function conectarEventos() {
+        if (!window.EventSource) {
+            fetchDashboardData();
+            iniciarSondeo();
+            return;
+        }
+
+        const fuente = new EventSource(URL_EVENTOS);
+        let primeraApertura = true;
+        fuenteEventos = fuente;
+
+        fuente.addEventListener('open', () => {
+            detenerSondeo();
+            // Las métricas se piden después de suscribirse para no perder cambios
+            if (primeraApertura) {
+                primeraApertura = false;
+                fetchDashboardData();
+            }
+        });
+        fuente.addEventListener('error', () => {
+            // CLOSED: el servidor rechazó la suscripción; se sondea y se reintenta más tarde
+            if (fuente.readyState === EventSource.CLOSED) {
+                if (!datosActuales) {
+                    fetchDashboardData();
+                }
+                iniciarSondeo();
+                setTimeout(conectarEventos, INTERVALO_SONDEO);
+            }
+        });
+        fuente.addEventListener('recargar', () => fetchDashboardData());
+        ['movimiento', 'movimientos_lote', 'movimiento_actualizado', 'movimiento_eliminado', 'canastillas'].forEach(tipo => {
+            fuente.addEventListener(tipo, evento => procesarEvento(tipo, evento));
+        });
+    }
+
     // Función para actualizar las métricas
     function actualizarMetricas(data) {
         document.getElementById('total-canastillas').textContent = data.total;
@@ -63,13 +317,14 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         // Crear gráfico de tendencia
+        const serie = serieTendencia(data);
         tendenciaChart = new Chart(tendenciaCtx, {
             type: 'line',
             data: {
-                labels: data.grafico_tendencia.labels,
+                labels: serie.labels,
                 datasets: [{
-                    label: 'Movimientos mensuales',
-                    data: data.grafico_tendencia.data,
+                    label: OPCIONES_TENDENCIA[filtroTendencia].etiqueta,
+                    data: serie.data,
                     borderColor: '#1e3c72',
                     backgroundColor: 'rgba(30, 60, 114, 0.1)',
                     tension: 0.3,
@@ -302,22 +557,22 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    // Filtros de gráficos (si los tienes en tu HTML)
+    // Filtros de gráficos: solo vuelven a pedir la tendencia
     function configurarFiltros() {
         const tendenciaFilter = document.getElementById('tendencia-filter');
         const ubicacionFilter = document.getElementById('ubicacion-filter');
         
         if (tendenciaFilter) {
             tendenciaFilter.addEventListener('change', function(e) {
-                console.log('Filtrar tendencia por:', e.target.value);
-                fetchDashboardData();
+                filtroTendencia = OPCIONES_TENDENCIA[e.target.value] ? e.target.value : 'monthly';
+                cargarTendencia();
             });
         }
         
         if (ubicacionFilter) {
             ubicacionFilter.addEventListener('change', function(e) {
-                console.log('Filtrar ubicación por:', e.target.value);
-                fetchDashboardData();
+                filtroUbicacion = e.target.value;
+                cargarTendencia();
             });
         }
     }
@@ -326,17 +581,18 @@ document.addEventListener('DOMContentLoaded', function() {
     function inicializar() {
         configurarBotonRecarga();
         configurarFiltros();
-        fetchDashboardData();
+        // Las métricas se cargan al abrir el canal de eventos
+        conectarEventos();
     }
 
     // Iniciar la aplicación
     inicializar();
 
-    // Actualizar datos periódicamente (cada 60 segundos)
-    const intervaloActualizacion = setInterval(fetchDashboardData, 60000);
-
-    // Limpiar intervalo cuando la página se cierre
+    // Cerrar el canal y el sondeo cuando la página se cierre
     window.addEventListener('beforeunload', () => {
-        clearInterval(intervaloActualizacion);
+        if (fuenteEventos) {
+            fuenteEventos.close();
+        }
+        detenerSondeo();
     });
 });
\ No newline at end of file
@@ -16,16 +16,79 @@ document.addEventListener('DOMContentLoaded', function() {
     // Variables de estado
     let canastillas = [];
     let canastillaEditando = null;
+    let siguienteCursor = null;
+    let temporizadorBusqueda = null;
 
-    // Cargar inventario al iniciar
-    fetchInventario();
+    // Sincronización por cambios: marca de la última consulta, filtros con
+    // los que se cargó la lista y conteos del servidor para esos filtros
+    const URL_INVENTARIO = 'http://localhost:8000/api/inventario';
+    let marcaCambios = null;
+    let filtrosCargados = { estado: null, ubicacion: null, q: null };
+    let estadisticas = { total: 0, conteos: {} };
+
+    // Botón para cargar la siguiente página del inventario
+    const btnCargarMas = document.createElement('button');
+    btnCargarMas.className = 'btn-update btn-cargar-mas';
+    btnCargarMas.innerHTML = '<i class="fas fa-chevron-down"></i> Cargar más';
+    btnCargarMas.style.display = 'none';
+    document.querySelector('.table-container').after(btnCargarMas);
+
+    // Filtros elegidos en la página
+    function filtrosActuales() {
+        return {
+            estado: filterStatus.value !== 'all' ? filterStatus.value : null,
+            ubicacion: filterLocation.value !== 'all' ? filterLocation.value : null,
+            q: searchInput.value.trim() || null
+        };
+    }
+
+    function cumpleFiltros(canastilla, filtros) {
+        return (!filtros.estado || canastilla.estado === filtros.estado) &&
+            (!filtros.ubicacion || canastilla.ubicacion === filtros.ubicacion) &&
+            (!filtros.q || String(canastilla.id_canastilla).toLowerCase().startsWith(filtros.q.toLowerCase()));
+    }
 
-    // Función para cargar inventario desde la API
-    const fetchInventario = async () => {
+    // Indica si las canastillas cargadas con `cargados` incluyen todas las de `nuevos`
+    function contieneFiltros(cargados, nuevos) {
+        return (!cargados.estado || cargados.estado === nuevos.estado) &&
+            (!cargados.ubicacion || cargados.ubicacion === nuevos.ubicacion) &&
+            (!cargados.q || (nuevos.q !== null && nuevos.q.toLowerCase().startsWith(cargados.q.toLowerCase())));
+    }
+
+    // Construir la URL con los filtros, que se resuelven en el servidor
+    function construirUrlInventario(cursor) {
+        const params = new URLSearchParams();
+        const filtros = filtrosActuales();
+        
+        if (filtros.estado) {
+            params.set('estado', filtros.estado);
+        }
+        if (filtros.ubicacion) {
+            params.set('ubicacion', filtros.ubicacion);
+        }
+        if (filtros.q) {
+            params.set('q', filtros.q);
+        }
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        
+        const query = params.toString();
+        return URL_INVENTARIO + (query ? '?' + query : '');
+    }
+
+    // Función para cargar inventario desde la API. Con `continuar` se agrega
+    // la siguiente página a las canastillas ya cargadas.
+    const fetchInventario = async (continuar = false) => {
         try {
             mostrarCarga(true);
             console.log("Cargando inventario desde el servidor...");
-            const response = await fetch('http://localhost:8000/api/inventario');
+            if (!continuar) {
+                // La marca se pide antes del listado para no perder cambios entre ambos
+                marcaCambios = await pedirMarca();
+                filtrosCargados = filtrosActuales();
+            }
+            const response = await fetch(construirUrlInventario(continuar ? siguienteCursor : null));
             
             // Verificar si la respuesta está vacía
             const responseText = await response.text();
@@ -43,8 +106,15 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error(data.error);
             }
             
-            canastillas = data.data || [];
-            aplicarFiltros();
+            canastillas = continuar ? canastillas.concat(data.data || []) : (data.data || []);
+            siguienteCursor = data.siguiente_cursor || null;
+            btnCargarMas.style.display = siguienteCursor ? 'flex' : 'none';
+            
+            // Los conteos solo vienen con la primera página
+            if (!continuar) {
+                estadisticas = { total: data.total || 0, conteos: { ...(data.conteos || {}) } };
+            }
+            mostrarInventario();
             
         } catch (error) {
             console.error('Error:', error);
@@ -54,33 +124,113 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     };
 
-    // Aplicar filtros al inventario
-    function aplicarFiltros() {
-        let canastillasFiltradas = [...canastillas];
-        
-        // Filtrar por estado
-        if (filterStatus.value !== 'all') {
-            canastillasFiltradas = canastillasFiltradas.filter(c => c.estado === filterStatus.value);
+    // Muestra las canastillas cargadas que cumplen los filtros actuales. Con
+    // la lista completa los conteos se calculan aquí; si no, son los del servidor.
+    function mostrarInventario() {
+        const filtros = filtrosActuales();
+        const visibles = canastillas.filter(c => cumpleFiltros(c, filtros));
+        cargarInventario(visibles);
+        if (siguienteCursor) {
+            actualizarEstadisticas(estadisticas.total, estadisticas.conteos);
+        } else {
+            const conteos = {};
+            visibles.forEach(c => { conteos[c.estado] = (conteos[c.estado] || 0) + 1; });
+            actualizarEstadisticas(visibles.length, conteos);
         }
-        
-        // Filtrar por ubicación
-        if (filterLocation.value !== 'all') {
-            canastillasFiltradas = canastillasFiltradas.filter(c => c.ubicacion === filterLocation.value);
+    }
+
+    // Marca actual de los cambios, o null si el servidor no la entrega
+    async function pedirMarca() {
+        try {
+            const response = await fetch(`${URL_INVENTARIO}?changed_since=ahora`);
+            const data = await response.json();
+            return response.ok ? data.marca : null;
+        } catch (error) {
+            return null;
         }
-        
-        // Filtrar por búsqueda
-        if (searchInput.value) {
-            const searchTerm = searchInput.value.toLowerCase();
-            canastillasFiltradas = canastillasFiltradas.filter(c => 
-                (c.id_canastilla && c.id_canastilla.toLowerCase().includes(searchTerm)) ||
-                (c.ubicacion && c.ubicacion.toLowerCase().includes(searchTerm))
-            );
+    }
+
+    function sumarConteo(estado, delta) {
+        estadisticas.conteos[estado] = (estadisticas.conteos[estado] || 0) + delta;
+        estadisticas.total += delta;
+    }
+
+    // Aplica las filas nuevas o modificadas y las eliminadas. Retorna false
+    // si algún cambio afecta a canastillas de páginas no cargadas y los
+    // conteos ya no se pueden ajustar. `nuevas` son IDs recién creados.
+    function aplicarCambios(filas, eliminados, nuevas) {
+        const actuales = new Map(canastillas.map(c => [c.id_canastilla, c]));
+        const ultimo = siguienteCursor ? canastillas[canastillas.length - 1].id_canastilla : null;
+        let exacto = true;
+
+        for (const id of eliminados) {
+            const anterior = actuales.get(id);
+            if (anterior) {
+                sumarConteo(anterior.estado, -1);
+                actuales.delete(id);
+            } else if (siguienteCursor) {
+                exacto = false;
+            }
         }
-        
-        cargarInventario(canastillasFiltradas);
-        actualizarEstadisticas(canastillasFiltradas);
+        for (const fila of filas) {
+            const anterior = actuales.get(fila.id_canastilla);
+            if (anterior) {
+                sumarConteo(anterior.estado, -1);
+                actuales.delete(fila.id_canastilla);
+            } else if (siguienteCursor && !nuevas.includes(fila.id_canastilla)) {
+                exacto = false;
+            }
+            if (cumpleFiltros(fila, filtrosCargados)) {
+                sumarConteo(fila.estado, 1);
+                // Las que van después de la última cargada llegarán al paginar
+                if (!ultimo || fila.id_canastilla <= ultimo) {
+                    actuales.set(fila.id_canastilla, fila);
+                }
+            }
+        }
+        canastillas = Array.from(actuales.values())
+            .sort((a, b) => a.id_canastilla < b.id_canastilla ? -1 : a.id_canastilla > b.id_canastilla ? 1 : 0);
+        return exacto;
     }
 
+    // Pide solo los cambios desde la última marca; sin marca recarga la lista
+    const sincronizarInventario = async (nuevas = []) => {
+        if (!marcaCambios) {
+            return fetchInventario();
+        }
+        try {
+            let completo = false;
+            let exacto = true;
+            while (!completo) {
+                const response = await fetch(`${URL_INVENTARIO}?changed_since=${encodeURIComponent(marcaCambios)}`);
+                const data = await response.json();
+                if (!response.ok || data.error) {
+                    // 410: la marca es demasiado antigua
+                    throw new Error(data.error || 'Error al sincronizar: ' + response.status);
+                }
+                exacto = aplicarCambios(data.data || [], data.eliminados || [], nuevas) && exacto;
+                completo = data.completo || data.marca === marcaCambios;
+                marcaCambios = data.marca;
+            }
+            if (!exacto) {
+                return fetchInventario();
+            }
+            mostrarInventario();
+        } catch (error) {
+            console.error('Error:', error);
+            fetchInventario();
+        }
+    };
+
+    // Si la lista completa ya está cargada con filtros más amplios, se filtra sin consultar
+    const cambiarFiltros = () => {
+        if (!siguienteCursor && contieneFiltros(filtrosCargados, filtrosActuales())) {
+            mostrarInventario();
+        } else {
+            fetchInventario();
+        }
+    };
+
     // Cargar inventario en la tabla
     function cargarInventario(canastillas) {
         inventarioBody.innerHTML = '';
@@ -156,17 +306,12 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    // Actualizar estadísticas
-    function actualizarEstadisticas(canastillas) {
-        const total = canastillas.length;
-        const disponibles = canastillas.filter(c => c.estado === 'Disponible').length;
-        const transito = canastillas.filter(c => c.estado === 'En Tránsito').length;
-        const mantenimiento = canastillas.filter(c => c.estado === 'En Reparación').length;
-        
+    // Actualizar estadísticas con los conteos calculados por el servidor
+    function actualizarEstadisticas(total, conteos) {
         document.getElementById('total-canastillas').textContent = total;
-        document.getElementById('disponibles-count').textContent = disponibles;
-        document.getElementById('transito-count').textContent = transito;
-        document.getElementById('mantenimiento-count').textContent = mantenimiento;
+        document.getElementById('disponibles-count').textContent = conteos['Disponible'] || 0;
+        document.getElementById('transito-count').textContent = conteos['En Tránsito'] || 0;
+        document.getElementById('mantenimiento-count').textContent = conteos['En Reparación'] || 0;
     }
     
     // Mostrar mensaje de error
@@ -321,10 +466,8 @@ document.addEventListener('DOMContentLoaded', function() {
             // Mostrar mensaje de éxito
             mostrarMensaje(result.message || 'Canastilla registrada con éxito', 'success');
             
-            // Recargar datos después de guardar
-            setTimeout(() => {
-                fetchInventario();
-            }, 500);
+            // Traer solo los cambios
+            sincronizarInventario(canastillaEditando ? [] : [canastillaData.id_canastilla]);
             
         } catch (error) {
             console.error('Error:', error);
@@ -378,7 +521,7 @@ document.addEventListener('DOMContentLoaded', function() {
             mostrarMensaje(`Canastilla ${id} eliminada con éxito`, 'success');
             
             // Recargar datos
-            aplicarFiltros();
+            mostrarInventario();
             
         } catch (error) {
             console.error('Error:', error);
@@ -387,12 +530,17 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // Event listeners para filtros
-    filterStatus.addEventListener('change', aplicarFiltros);
-    filterLocation.addEventListener('change', aplicarFiltros);
-    searchInput.addEventListener('input', aplicarFiltros);
+    filterStatus.addEventListener('change', cambiarFiltros);
+    filterLocation.addEventListener('change', cambiarFiltros);
+    searchInput.addEventListener('input', () => {
+        // Esperar a que el usuario termine de escribir antes de consultar
+        clearTimeout(temporizadorBusqueda);
+        temporizadorBusqueda = setTimeout(cambiarFiltros, 300);
+    });
+    btnCargarMas.addEventListener('click', () => fetchInventario(true));
     
     // Event listener para el botón de actualizar
-    btnUpdate.addEventListener('click', fetchInventario);
+    btnUpdate.addEventListener('click', () => fetchInventario());
     
     // Cargar datos iniciales
     fetchInventario();
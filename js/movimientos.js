@@ -18,12 +18,85 @@ document.addEventListener('DOMContentLoaded', function() {
     let movimientos = [];
     let canastillas = [];
     let movimientoEditando = null;
+    let siguienteCursor = null;
 
-    // Función para cargar movimientos desde la API
-    const fetchMovimientos = async () => {
+    // Sincronización por cambios: marca de la última consulta y filtros con
+    // los que se cargó la lista. Tras una escritura solo se piden los cambios.
+    const URL_MOVIMIENTOS = 'http://localhost:8000/api/movimientos';
+    let marcaCambios = null;
+    let filtrosCargados = { tipo: null, desde: null };
+
+    // Botón para cargar la siguiente página de movimientos
+    const btnCargarMas = document.createElement('button');
+    btnCargarMas.className = 'btn-update btn-cargar-mas';
+    btnCargarMas.innerHTML = '<i class="fas fa-chevron-down"></i> Cargar más';
+    btnCargarMas.style.display = 'none';
+    document.querySelector('.table-container').after(btnCargarMas);
+
+    // Filtros de tipo y fecha elegidos en la página
+    function filtrosActuales() {
+        let desde = null;
+        if (filterDate.value !== 'all') {
+            const fecha = new Date();
+            if (filterDate.value === 'week') {
+                fecha.setDate(fecha.getDate() - fecha.getDay());
+            } else if (filterDate.value === 'month') {
+                fecha.setDate(1);
+            }
+            desde = formatearFechaISO(fecha);
+        }
+        return { tipo: filterType.value !== 'all' ? filterType.value : null, desde: desde };
+    }
+
+    function cumpleFiltros(movimiento, filtros) {
+        return (!filtros.tipo || movimiento.tipo_movimiento === filtros.tipo) &&
+            (!filtros.desde || movimiento.fecha_movimiento >= filtros.desde);
+    }
+
+    // Indica si los movimientos cargados con `cargados` incluyen todos los de `nuevos`
+    function contieneFiltros(cargados, nuevos) {
+        return (!cargados.tipo || cargados.tipo === nuevos.tipo) &&
+            (!cargados.desde || (nuevos.desde !== null && nuevos.desde >= cargados.desde));
+    }
+
+    // Construir la URL con los filtros que se resuelven en el servidor
+    function construirUrlMovimientos(cursor) {
+        const params = new URLSearchParams();
+        const filtros = filtrosActuales();
+        
+        if (filtros.tipo) {
+            params.set('tipo', filtros.tipo);
+        }
+        if (filtros.desde) {
+            params.set('desde', filtros.desde);
+        }
+        
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        
+        const query = params.toString();
+        return URL_MOVIMIENTOS + (query ? '?' + query : '');
+    }
+
+    // Fecha local en formato AAAA-MM-DD
+    function formatearFechaISO(fecha) {
+        const mes = String(fecha.getMonth() + 1).padStart(2, '0');
+        const dia = String(fecha.getDate()).padStart(2, '0');
+        return `${fecha.getFullYear()}-${mes}-${dia}`;
+    }
+
+    // Función para cargar movimientos desde la API. Con `continuar` se agrega
+    // la siguiente página a los movimientos ya cargados.
+    const fetchMovimientos = async (continuar = false) => {
         try {
             console.log("Cargando movimientos desde el servidor...");
-            const response = await fetch('http://localhost:8000/api/movimientos');
+            if (!continuar) {
+                // La marca se pide antes del listado para no perder cambios entre ambos
+                marcaCambios = await pedirMarca();
+                filtrosCargados = filtrosActuales();
+            }
+            const response = await fetch(construirUrlMovimientos(continuar ? siguienteCursor : null));
             
             // Verificar si la respuesta está vacía
             const responseText = await response.text();
@@ -41,7 +114,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error(data.error);
             }
             
-            movimientos = data.data || [];
+            movimientos = continuar ? movimientos.concat(data.data || []) : (data.data || []);
+            siguienteCursor = data.siguiente_cursor || null;
+            btnCargarMas.style.display = siguienteCursor ? 'flex' : 'none';
             cargarMovimientos();
             
         } catch (error) {
@@ -50,11 +125,78 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     };
 
+    // Marca actual de los cambios, o null si el servidor no la entrega
+    async function pedirMarca() {
+        try {
+            const response = await fetch(`${URL_MOVIMIENTOS}?since_ts=ahora`);
+            const data = await response.json();
+            return response.ok ? data.marca : null;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    // Más reciente primero, igual que el listado del servidor
+    function compararMovimientos(a, b) {
+        if (a.fecha_movimiento !== b.fecha_movimiento) {
+            return a.fecha_movimiento < b.fecha_movimiento ? 1 : -1;
+        }
+        return b.id_movimiento - a.id_movimiento;
+    }
+
+    // Aplica a la lista cargada las filas nuevas o modificadas y las eliminadas
+    function aplicarCambios(filas, eliminados) {
+        const quitar = new Set(eliminados.concat(filas.map(fila => fila.id_movimiento)));
+        movimientos = movimientos.filter(m => !quitar.has(m.id_movimiento));
+        // Si quedan páginas, las filas más antiguas que la última cargada llegarán al paginar
+        const ultimo = siguienteCursor ? movimientos[movimientos.length - 1] : null;
+        for (const fila of filas) {
+            if (cumpleFiltros(fila, filtrosCargados) && (!ultimo || compararMovimientos(fila, ultimo) <= 0)) {
+                movimientos.push(fila);
+            }
+        }
+        movimientos.sort(compararMovimientos);
+    }
+
+    // Pide solo los cambios desde la última marca; sin marca recarga la lista
+    const sincronizarMovimientos = async () => {
+        if (!marcaCambios) {
+            return fetchMovimientos();
+        }
+        try {
+            let completo = false;
+            while (!completo) {
+                const response = await fetch(`${URL_MOVIMIENTOS}?since_ts=${encodeURIComponent(marcaCambios)}`);
+                const data = await response.json();
+                if (!response.ok || data.error) {
+                    // 410: la marca es demasiado antigua
+                    throw new Error(data.error || 'Error al sincronizar: ' + response.status);
+                }
+                aplicarCambios(data.data || [], data.eliminados || []);
+                completo = data.completo || data.marca === marcaCambios;
+                marcaCambios = data.marca;
+            }
+            cargarMovimientos();
+        } catch (error) {
+            console.error('Error:', error);
+            fetchMovimientos();
+        }
+    };
+
+    // Si la lista completa ya está cargada con filtros más amplios, se filtra sin consultar
+    const cambiarFiltros = () => {
+        if (!siguienteCursor && contieneFiltros(filtrosCargados, filtrosActuales())) {
+            cargarMovimientos();
+        } else {
+            fetchMovimientos();
+        }
+    };
+
     // Función para cargar canastillas desde la API
     const fetchCanastillas = async () => {
         try {
             console.log("Cargando canastillas desde el servidor...");
-            const response = await fetch('http://localhost:8000/api/inventario');
+            const response = await fetch('http://localhost:8000/api/inventario?limite=500');
             
             // Verificar si la respuesta está vacía
             const responseText = await response.text();
@@ -132,35 +274,10 @@ document.addEventListener('DOMContentLoaded', function() {
         // Aplicar filtros
         let movimientosFiltrados = [...movimientos];
         
-        if (filterType.value !== 'all') {
-            movimientosFiltrados = movimientosFiltrados.filter(m => m.tipo_movimiento === filterType.value);
-        }
-        
-        if (filterDate.value !== 'all') {
-            const hoy = new Date();
-            movimientosFiltrados = movimientosFiltrados.filter(m => {
-                if (!m.fecha_movimiento) return false;
-                
-                const fechaMovimiento = new Date(m.fecha_movimiento);
-                if (isNaN(fechaMovimiento.getTime())) return false;
-                
-                switch(filterDate.value) {
-                    case 'today':
-                        return fechaMovimiento.toDateString() === hoy.toDateString();
-                    case 'week':
-                        const inicioSemana = new Date(hoy);
-                        inicioSemana.setDate(hoy.getDate() - hoy.getDay());
-                        inicioSemana.setHours(0, 0, 0, 0);
-                        return fechaMovimiento >= inicioSemana;
-                    case 'month':
-                        return fechaMovimiento.getMonth() === hoy.getMonth() && 
-                               fechaMovimiento.getFullYear() === hoy.getFullYear();
-                    default:
-                        return true;
-                }
-            });
-        }
-        
+        // Tipo y fecha se filtran en el servidor al cargar y aquí cuando la
+        // lista cargada es más amplia; la búsqueda aplica sobre lo cargado
+        const filtros = filtrosActuales();
+        movimientosFiltrados = movimientosFiltrados.filter(m => cumpleFiltros(m, filtros));
         if (searchInput.value) {
             const searchTerm = searchInput.value.toLowerCase();
             movimientosFiltrados = movimientosFiltrados.filter(m => 
@@ -414,10 +531,8 @@ document.addEventListener('DOMContentLoaded', function() {
             // Mostrar mensaje de éxito
             mostrarMensaje(result.message || (movimientoEditando ? 'Movimiento actualizado con éxito' : 'Movimiento registrado con éxito'), 'success');
             
-            // Recargar datos después de guardar
-            setTimeout(() => {
-                fetchMovimientos();
-            }, 500);
+            // Traer solo los cambios
+            sincronizarMovimientos();
             
         } catch (error) {
             console.error('Error:', error);
@@ -499,10 +614,8 @@ document.addEventListener('DOMContentLoaded', function() {
             // Mostrar mensaje de éxito
             mostrarMensaje(result.message || 'Movimiento eliminado con éxito', 'success');
             
-            // Recargar datos después de eliminar
-            setTimeout(() => {
-                fetchMovimientos();
-            }, 500);
+            // Traer solo los cambios
+            sincronizarMovimientos();
             
         } catch (error) {
             console.error('Error:', error);
@@ -511,9 +624,10 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // Event listeners para filtros
-    filterType.addEventListener('change', cargarMovimientos);
-    filterDate.addEventListener('change', cargarMovimientos);
+    filterType.addEventListener('change', cambiarFiltros);
+    filterDate.addEventListener('change', cambiarFiltros);
     searchInput.addEventListener('input', cargarMovimientos);
+    btnCargarMas.addEventListener('click', () => fetchMovimientos(true));
     
     // Event listener para el botón de actualizar - ahora recarga la página
     btnUpdate.addEventListener('click', recargarPagina);
@@ -0,0 +1,495 @@
+from datetime import date, datetime
+from email.utils import formatdate, parsedate_to_datetime
+from http.cookies import SimpleCookie, CookieError
+import io
+
+from api import get_dashboard_metrics, get_inventario, get_movimientos, get_movimiento_by_id, add_canastilla, add_movimiento, update_movimiento, delete_movimiento
+from api import add_movimientos_lote, add_canastillas_lote, importar_canastillas_csv
+from api import get_usuarios, get_usuario_by_id, add_usuario, update_usuario, delete_usuario
+from api import get_canastilla_by_id, get_canastillas_por_ids, get_movimientos_canastilla, get_tendencia
+from api import get_cambios_movimientos, get_cambios_inventario, get_cambios_usuarios, get_movimientos_nuevos
+from api import exportar_movimientos, exportar_inventario, exportar_usuarios
+from api import ParametroInvalido, CAMPOS_CANASTILLA, CAMPOS_MOVIMIENTO
+from db_connection import get_pool_stats, hay_replicas, fijar_requisito_lectura, restablecer_requisito_lectura, PRIMARIA
+from cache import get_cache_stats
+from versiones import etag_recursos, leer_versiones, codificar_versiones, decodificar_versiones, RECURSOS
+from versiones import iniciar_peticion, terminar_peticion
+from estaticos import obtener_estatico, elegir_codificacion
+from eventos import suscribir
+import cola_escritura
+from rutas import Router, ErrorPeticion, Respuesta, respuesta_json, respuesta_stream, coincide_etag, no_modificado
+
+# Recursos de los que depende cada respuesta; su versión forma el ETag
+RECURSOS_DASHBOARD = ('canastillas', 'movimientos', 'usuarios')
+RECURSOS_INVENTARIO = ('canastillas', 'usuarios')
+RECURSOS_MOVIMIENTOS = ('movimientos', 'usuarios')
+RECURSOS_USUARIOS = ('usuarios',)
+RECURSOS_HISTORIAL = ('canastillas', 'movimientos', 'usuarios')
+RECURSOS_TENDENCIA = ('movimientos',)
+
+CACHE_ESTATICOS_VERSIONADOS = 'public, max-age=31536000, immutable'
+
+# Token de lectura: versiones de la primaria tras una escritura. El cliente
+# lo devuelve (cookie o encabezado) y sus lecturas solo van a réplicas que
+# ya las tienen. Pasado el retraso máximo de las réplicas ya no hace falta.
+COOKIE_TOKEN_LECTURA = 'lectura_minima'
+ENCABEZADO_TOKEN_LECTURA = 'X-Lectura-Minima'
+DURACION_TOKEN_LECTURA = 60  # segundos
+
+CAMPOS_USUARIO_NUEVO = ('nombre', 'email', 'password', 'rol', 'estado')
+CAMPOS_USUARIO = ('nombre', 'email', 'rol', 'estado')
+
+router = Router()
+
+
+def despachar(peticion):
+    """
+    Resuelve la ruta y ejecuta su manejador. Retorna None si ningún método
+    tiene una ruta para el path, para que el servidor aplique su respaldo.
+    """
+    try:
+        manejador, parametros = router.resolver(peticion.metodo, peticion.path)
+        if manejador is None:
+            permitidos = router.metodos_permitidos(peticion.path)
+            if not permitidos:
+                return None
+            respuesta = respuesta_json(peticion, {"error": "Método no permitido"}, 405)
+            respuesta.encabezados.append(('Allow', ', '.join(permitidos)))
+            return respuesta
+
+        peticion.parametros = parametros
+        escritura = peticion.metodo not in ('GET', 'HEAD') and not getattr(manejador, 'solo_lectura', False)
+        token = fijar_requisito_lectura(PRIMARIA if escritura else _token_lectura(peticion))
+        token_versiones = iniciar_peticion()
+        try:
+            respuesta = manejador(peticion)
+        finally:
+            terminar_peticion(token_versiones)
+            restablecer_requisito_lectura(token)
+    except (ErrorPeticion, ParametroInvalido) as e:
+        return respuesta_json(peticion, {"error": str(e)}, getattr(e, 'status', 400))
+
+    if isinstance(respuesta, tuple):
+        data, status = respuesta
+        respuesta = respuesta_json(peticion, data, status)
+    if escritura and respuesta.status < 400 and hay_replicas():
+        _agregar_token_lectura(respuesta)
+    return respuesta
+
+
+def _token_lectura(peticion):
+    """
+    Versiones mínimas que el cliente ya vio, del encabezado o de la cookie
+    """
+    token = peticion.encabezados.get(ENCABEZADO_TOKEN_LECTURA)
+    if token is None:
+        try:
+            cookie = SimpleCookie(peticion.encabezados.get('Cookie') or '')
+        except CookieError:
+            return None
+        token = cookie[COOKIE_TOKEN_LECTURA].value if COOKIE_TOKEN_LECTURA in cookie else None
+    return decodificar_versiones(token) if token else None
+
+
+def _agregar_token_lectura(respuesta):
+    # Se lee después del commit, así incluye la escritura recién confirmada
+    versiones = leer_versiones(*RECURSOS)
+    if not versiones:
+        return
+    token = codificar_versiones(versiones)
+    respuesta.encabezados += [
+        (ENCABEZADO_TOKEN_LECTURA, token),
+        ('Set-Cookie', f"{COOKIE_TOKEN_LECTURA}={token}; Max-Age={DURACION_TOKEN_LECTURA}; "
+                       f"Path=/; HttpOnly; SameSite=Lax")
+    ]
+
+
+def sin_bloqueo(peticion):
+    """
+    Indica si el manejador de la petición no consulta la base, así el
+    servidor asyncio puede ejecutarlo sin ocupar un hilo del pool
+    """
+    try:
+        manejador, _ = router.resolver(peticion.metodo, peticion.path)
+    except ErrorPeticion:
+        return False
+    return getattr(manejador, 'sin_bloqueo', False)
+
+
+def no_encontrado(peticion):
+    return respuesta_json(peticion, {"error": "Endpoint no encontrado"}, 404)
+
+
+def _condicional(peticion, recursos, *extra):
+    """
+    Lee la versión de los recursos antes de ejecutar la consulta. Retorna
+    (etag, respuesta 304 o None).
+    """
+    etag = etag_recursos(recursos, *extra)
+    encabezado = peticion.encabezados.get('If-None-Match')
+    if etag and encabezado and coincide_etag(encabezado, etag):
+        return etag, no_modificado(etag)
+    return etag, None
+
+
+def _datos_completos(data, campos):
+    """
+    Retorna el cuerpo si es un objeto con todos los campos, o None
+    """
+    if isinstance(data, dict) and all(data.get(campo) for campo in campos):
+        return data
+    return None
+
+
+def _lista_del_cuerpo(data, clave):
+    # Los lotes se aceptan como lista o como {"<clave>": [...]}
+    if isinstance(data, dict):
+        return data.get(clave)
+    return data
+
+
+# Lecturas
+
+@router.ruta('GET', '/api/dashboard/metrics')
+def dashboard(peticion):
+    # La fecha entra en el ETag porque la ventana de meses avanza sin escrituras
+    etag, respuesta = _condicional(peticion, RECURSOS_DASHBOARD, date.today().isoformat())
+    if respuesta:
+        return respuesta
+    data, status = get_dashboard_metrics()
+    return respuesta_json(peticion, data, status, etag)
+
+
+@router.ruta('GET', '/api/dashboard/tendencia')
+def tendencia(peticion):
+    # La hora entra en el ETag porque los rangos relativos avanzan sin escrituras
+    etag, respuesta = _condicional(peticion, RECURSOS_TENDENCIA, datetime.now().strftime('%Y-%m-%dT%H'))
+    if respuesta:
+        return respuesta
+    data, status = get_tendencia(
+        rango=peticion.parametro('rango'),
+        desde=peticion.parametro('desde'),
+        hasta=peticion.parametro('hasta'),
+        granularidad=peticion.parametro('granularidad'),
+        ubicacion=peticion.parametro('ubicacion'),
+        tipo_movimiento=peticion.parametro('tipo')
+    )
+    return respuesta_json(peticion, data, status, etag)
+
+
+@router.ruta('GET', '/api/inventario')
+def inventario(peticion):
+    etag, respuesta = _condicional(peticion, RECURSOS_INVENTARIO)
+    if respuesta:
+        return respuesta
+
+    # Solo los cambios desde la marca de la consulta anterior
+    if peticion.parametro('changed_since') is not None:
+        data, status = get_cambios_inventario(peticion.parametro('changed_since'), peticion.parametro('limite'))
+        return respuesta_json(peticion, data, status, etag)
+
+    if peticion.parametro('stream') == '1':
+        data, status = exportar_inventario(
+            estado=peticion.parametro('estado'),
+            ubicacion=peticion.parametro('ubicacion'),
+            busqueda=peticion.parametro('q')
+        )
+        if status == 200:
+            return respuesta_stream(peticion, data, etag)
+        return data, status
+
+    data, status = get_inventario(
+        estado=peticion.parametro('estado'),
+        ubicacion=peticion.parametro('ubicacion'),
+        busqueda=peticion.parametro('q'),
+        orden=peticion.parametro('orden'),
+        cursor_pagina=peticion.parametro('cursor'),
+        limite=peticion.parametro('limite')
+    )
+    return respuesta_json(peticion, data, status, etag)
+
+
+@router.ruta('GET', '/api/movimientos')
+def movimientos(peticion):
+    etag, respuesta = _condicional(peticion, RECURSOS_MOVIMIENTOS)
+    if respuesta:
+        return respuesta
+
+    # Solo los cambios: altas por ID o altas, ediciones y eliminaciones desde la marca
+    if peticion.parametro('since_id') is not None:
+        data, status = get_movimientos_nuevos(peticion.parametro('since_id'), peticion.parametro('limite'))
+        return respuesta_json(peticion, data, status, etag)
+    if peticion.parametro('since_ts') is not None:
+        data, status = get_cambios_movimientos(peticion.parametro('since_ts'), peticion.parametro('limite'))
+        return respuesta_json(peticion, data, status, etag)
+
+    filtros = dict(
+        tipo_movimiento=peticion.parametro('tipo'),
+        desde=peticion.parametro('desde'),
+        hasta=peticion.parametro('hasta'),
+        id_canastilla=peticion.parametro('id_canastilla'),
+        id_usuario=peticion.parametro('id_usuario')
+    )
+    if peticion.parametro('stream') == '1':
+        data, status = exportar_movimientos(**filtros)
+        if status == 200:
+            return respuesta_stream(peticion, data, etag)
+        return data, status
+
+    data, status = get_movimientos(cursor_pagina=peticion.parametro('cursor'),
+                                   limite=peticion.parametro('limite'), **filtros)
+    return respuesta_json(peticion, data, status, etag)
+
+
+@router.ruta('GET', '/api/usuarios')
+def usuarios(peticion):
+    etag, respuesta = _condicional(peticion, RECURSOS_USUARIOS)
+    if respuesta:
+        return respuesta
+
+    if peticion.parametro('changed_since') is not None:
+        data, status = get_cambios_usuarios(peticion.parametro('changed_since'), peticion.parametro('limite'))
+        return respuesta_json(peticion, data, status, etag)
+
+    if peticion.parametro('stream') == '1':
+        data, status = exportar_usuarios()
+        if status == 200:
+            return respuesta_stream(peticion, data, etag)
+        return data, status
+
+    data, status = get_usuarios()
+    return respuesta_json(peticion, data, status, etag)
+
+
+@router.ruta('GET', '/api/movimiento/{id:int}')
+def movimiento(peticion):
+    etag, respuesta = _condicional(peticion, RECURSOS_MOVIMIENTOS)
+    if respuesta:
+        return respuesta
+    data, status = get_movimiento_by_id(peticion.parametros['id'])
+    return respuesta_json(peticion, data, status, etag)
+
+
+@router.ruta('GET', '/api/canastilla/{id}')
+def canastilla(peticion):
+    # ?movimientos=N incluye los últimos N movimientos en la misma respuesta
+    movimientos = peticion.parametro('movimientos')
+    etag, respuesta = _condicional(peticion, RECURSOS_HISTORIAL if movimientos else RECURSOS_INVENTARIO)
+    if respuesta:
+        return respuesta
+    data, status = get_canastilla_by_id(peticion.parametros['id'], movimientos or 0)
+    return respuesta_json(peticion, data, status, etag)
+
+
+@router.ruta('GET', '/api/canastillas/batch')
+def canastillas_por_ids(peticion):
+    # ?ids=A,B,C o ?ids=A&ids=B; para listas largas conviene POST
+    ids = [id_canastilla for valor in peticion.consulta.get('ids', [])
+           for id_canastilla in valor.split(',') if id_canastilla.strip()]
+    etag, respuesta = _condicional(peticion, RECURSOS_INVENTARIO)
+    if respuesta:
+        return respuesta
+    data, status = get_canastillas_por_ids(ids)
+    return respuesta_json(peticion, data, status, etag)
+
+
+@router.ruta('POST', '/api/canastillas/batch')
+def canastillas_por_ids_post(peticion):
+    # Consulta sin cambios: lista de IDs o {"ids": [...]}
+    try:
+        data = peticion.json()
+    except ErrorPeticion:
+        data = None
+    return get_canastillas_por_ids(_lista_del_cuerpo(data, 'ids'))
+
+
+canastillas_por_ids_post.solo_lectura = True
+
+
+@router.ruta('GET', '/api/canastilla/{id}/movimientos')
+def movimientos_canastilla(peticion):
+    etag, respuesta = _condicional(peticion, RECURSOS_HISTORIAL)
+    if respuesta:
+        return respuesta
+    data, status = get_movimientos_canastilla(peticion.parametros['id'],
+                                              cursor_pagina=peticion.parametro('cursor'),
+                                              limite=peticion.parametro('limite'))
+    return respuesta_json(peticion, data, status, etag)
+
+
+@router.ruta('GET', '/api/usuario/{id:int}')
+def usuario(peticion):
+    etag, respuesta = _condicional(peticion, RECURSOS_USUARIOS)
+    if respuesta:
+        return respuesta
+    data, status = get_usuario_by_id(peticion.parametros['id'])
+    return respuesta_json(peticion, data, status, etag)
+
+
+@router.ruta('GET', '/api/eventos')
+def eventos(peticion):
+    # Canal SSE de cambios. El navegador envía Last-Event-ID al reconectar.
+    return suscribir(peticion.encabezados.get('Last-Event-ID') or peticion.parametro('ultimo'))
+
+
+eventos.sin_bloqueo = True
+
+
+@router.ruta('GET', '/api/sistema/pool')
+def estadisticas_pool(peticion):
+    # Estadísticas del pool de conexiones
+    return get_pool_stats(), 200
+
+
+@router.ruta('GET', '/api/sistema/cache')
+def estadisticas_cache(peticion):
+    # Aciertos y fallos de la caché de lectura de este proceso
+    return get_cache_stats(), 200
+
+
+# Escrituras
+
+@router.ruta('POST', '/api/canastilla/add')
+def crear_canastilla(peticion):
+    data = _datos_completos(peticion.json(), CAMPOS_CANASTILLA)
+    if data is None:
+        return {"error": "Datos incompletos"}, 400
+    return add_canastilla(data['id_canastilla'], data['estado'], data['ubicacion'])
+
+
+@router.ruta('POST', '/api/movimiento/add')
+def crear_movimiento(peticion):
+    data = _datos_completos(peticion.json(), CAMPOS_MOVIMIENTO)
+    if data is None:
+        return {"error": "Datos incompletos"}, 400
+    if cola_escritura.activa():
+        # Se confirma junto con los movimientos que llegan al mismo tiempo
+        return cola_escritura.enviar_movimiento({campo: data[campo] for campo in CAMPOS_MOVIMIENTO})
+    return add_movimiento(data['id_canastilla'], data['tipo_movimiento'], data['ubicacion_origen'],
+                          data['ubicacion_destino'], data['id_usuario_responsable'])
+
+
+@router.ruta('POST', '/api/movimientos/lote')
+def crear_movimientos_lote(peticion):
+    # Registro masivo de movimientos: lista o {"movimientos": [...]}
+    try:
+        data = peticion.json()
+    except ErrorPeticion:
+        data = None
+    return add_movimientos_lote(_lista_del_cuerpo(data, 'movimientos'))
+
+
+@router.ruta('POST', '/api/canastillas/lote')
+def crear_canastillas_lote(peticion):
+    # Registro masivo de canastillas: lista o {"canastillas": [...]}
+    try:
+        data = peticion.json()
+    except ErrorPeticion:
+        data = None
+    return add_canastillas_lote(_lista_del_cuerpo(data, 'canastillas'))
+
+
+@router.ruta('POST', '/api/canastillas/importar')
+def importar_canastillas(peticion):
+    # Importación de CSV leyendo el cuerpo como flujo
+    if peticion.longitud is None:
+        return {"error": "Se requiere Content-Length"}, 411
+    archivo = io.TextIOWrapper(io.BufferedReader(peticion.cuerpo), encoding='utf-8-sig', newline='')
+    try:
+        return importar_canastillas_csv(archivo)
+    except UnicodeDecodeError:
+        return {"error": "El CSV debe estar codificado en UTF-8"}, 400
+
+
+@router.ruta('POST', '/api/usuario/add')
+def crear_usuario(peticion):
+    data = _datos_completos(peticion.json(), CAMPOS_USUARIO_NUEVO)
+    if data is None:
+        return {"error": "Datos incompletos"}, 400
+    return add_usuario(data['nombre'], data['email'], data['password'], data['rol'], data['estado'])
+
+
+@router.ruta('PUT', '/api/movimiento/{id:int}')
+def editar_movimiento(peticion):
+    data = _datos_completos(peticion.json(), CAMPOS_MOVIMIENTO)
+    if data is None:
+        return {"error": "Datos incompletos"}, 400
+    return update_movimiento(peticion.parametros['id'], data['id_canastilla'], data['tipo_movimiento'],
+                             data['ubicacion_origen'], data['ubicacion_destino'], data['id_usuario_responsable'])
+
+
+@router.ruta('PUT', '/api/usuario/{id:int}')
+def editar_usuario(peticion):
+    data = _datos_completos(peticion.json(), CAMPOS_USUARIO)
+    if data is None:
+        return {"error": "Datos incompletos"}, 400
+    # La contraseña es opcional
+    return update_usuario(peticion.parametros['id'], data['nombre'], data['email'], data['rol'],
+                          data['estado'], data.get('password'))
+
+
+@router.ruta('DELETE', '/api/movimiento/{id:int}')
+def eliminar_movimiento(peticion):
+    return delete_movimiento(peticion.parametros['id'])
+
+
+@router.ruta('DELETE', '/api/usuario/{id:int}')
+def eliminar_usuario(peticion):
+    return delete_usuario(peticion.parametros['id'])
+
+
+# Archivos estáticos
+
+def _estatico(peticion):
+    """
+    Sirve un archivo estático desde memoria, comprimido según
+    Accept-Encoding. Las URLs versionadas (?v=<hash>) se cachean por un
+    año; el resto se revalida con ETag o Last-Modified.
+    """
+    estatico = obtener_estatico(peticion.path)
+    if estatico is None:
+        return Respuesta(404, b'File Not Found', [('Content-type', 'text/plain')])
+
+    codificacion = elegir_codificacion(peticion.encabezados.get('Accept-Encoding'), estatico.variantes)
+    contenido, etag = estatico.variantes[codificacion]
+
+    if peticion.parametro('v') == estatico.hash:
+        cache_control = CACHE_ESTATICOS_VERSIONADOS
+    else:
+        cache_control = 'no-cache'
+
+    if _estatico_vigente(peticion, estatico, etag):
+        return no_modificado(etag, estatico.modificado, cache_control)
+
+    encabezados = [('Content-type', estatico.tipo_contenido),
+                   ('ETag', etag),
+                   ('Last-Modified', formatdate(estatico.modificado, usegmt=True)),
+                   ('Cache-Control', cache_control)]
+    if len(estatico.variantes) > 1:
+        encabezados.append(('Vary', 'Accept-Encoding'))
+    if codificacion != 'identity':
+        encabezados.append(('Content-Encoding', codificacion))
+    return Respuesta(200, contenido, encabezados)
+
+
+def _estatico_vigente(peticion, estatico, etag):
+    """
+    Indica si la copia del cliente sigue vigente. If-None-Match tiene
+    prioridad sobre If-Modified-Since.
+    """
+    encabezado = peticion.encabezados.get('If-None-Match')
+    if encabezado:
+        return coincide_etag(encabezado, etag)
+
+    encabezado = peticion.encabezados.get('If-Modified-Since')
+    if not encabezado:
+        return False
+    try:
+        desde = parsedate_to_datetime(encabezado).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return False
+    return estatico.modificado <= desde
+
+
+for _carpeta in ('html', 'css', 'js'):
+    router.agregar('GET', f'/{_carpeta}/{{ruta:path}}', _estatico)
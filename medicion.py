@@ -0,0 +1,288 @@
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import api
+import viajes
+from db_connection import get_db_connection, close_db_connection
+from resumen import reconciliar
+
+# Datos sembrados por --sembrar; conviene apuntar DB_NAME a una base de prueba
+PREFIJO_SEMBRADO = 'MED-'
+EMAIL_SEMBRADO = 'medicion@ejemplo.co'
+UBICACIONES_SEMBRADO = ('Bodega Principal', 'Planta', 'Cliente Norte', 'Cliente Sur', 'Taller')
+ESTADOS_SEMBRADO = ('Disponible', 'En Uso', 'En Tránsito', 'En Reparación')
+TIPOS_SEMBRADO = ('entrada', 'salida', 'traslado')
+
+
+class _CursorLento(viajes._Cursor):
+    """
+    Cursor de viajes.py que además cobra el costo de cada fila enviada
+    en un executemany
+    """
+
+    def executemany(self, sql, filas):
+        time.sleep(self._conexion.costo_fila * len(filas))
+        super().executemany(sql, filas)
+
+
+class _ConexionLenta(viajes._Conexion):
+    """
+    Conexión falsa en la que cada sentencia, commit y rollback tarda `rtt`
+    segundos. Solo modela los viajes a la base, no el costo de las consultas.
+    """
+
+    def __init__(self, filas=(), rtt=0.0, costo_fila=0.0):
+        super().__init__(filas)
+        self.rtt = rtt
+        self.costo_fila = costo_fila
+
+    def registrar(self, sql):
+        super().registrar(sql)
+        time.sleep(self.rtt)
+
+    def cursor(self, dictionary=False, buffered=True):
+        return _CursorLento(self)
+
+
+def _percentil(valores, percentil):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * percentil))]
+
+
+def _medir(funcion, repeticiones):
+    """
+    Ejecuta `funcion` `repeticiones` veces después de un calentamiento.
+    Retorna (p50, p99) en segundos.
+    """
+    funcion()
+    latencias = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        latencias.append(time.perf_counter() - inicio)
+    return _percentil(latencias, 0.5), _percentil(latencias, 0.99)
+
+
+def _con_conexion(funcion, fabrica, filas=()):
+    """
+    Ejecuta `funcion` con las conexiones de api.py tomadas de `fabrica`, o
+    del pool configurado si `fabrica` es None. Cada conexión falsa responde
+    con `filas` a sus SELECT. Retorna las conexiones usadas (solo con
+    `fabrica`).
+    """
+    if fabrica is None:
+        funcion()
+        return []
+    usadas = []
+
+    def obtener(*args, **kwargs):
+        usadas.append(fabrica(filas))
+        return usadas[-1]
+
+    with mock.patch.object(api, 'get_db_connection', side_effect=obtener), \
+            mock.patch.object(api, 'close_db_connection'):
+        funcion()
+    return usadas
+
+
+def _conectar(obtener):
+    connection = obtener()
+    if connection is None:
+        raise SystemExit("No se pudo conectar a la base de datos")
+    return connection
+
+
+def _imprimir(filas, elementos=None):
+    # Con `elementos` se agrega el throughput: elementos por segundo según el p50
+    print(f"{'escenario':<34} {'viajes':>7} {'p50 ms':>9} {'p99 ms':>9}" + (f" {'por segundo':>12}" if elementos else ""))
+    for nombre, viajes_base, p50, p99 in filas:
+        print(f"{nombre:<34} {viajes_base:>7} {p50 * 1000:>9.2f} {p99 * 1000:>9.2f}" +
+              (f" {elementos / p50:>12.0f}" if elementos else ""))
+
+
+# Dashboard: las siete consultas anteriores contra la versión actual
+
+CONSULTAS_DASHBOARD_ANTES = [
+    ("SELECT COUNT(*) AS total FROM canastillas", ()),
+    ("SELECT COUNT(*) AS disponibles FROM canastillas WHERE estado = 'Disponible'", ()),
+    ("SELECT COUNT(*) AS en_movimiento FROM canastillas WHERE estado = 'En Tránsito'", ()),
+    ("SELECT COUNT(*) AS en_mantenimiento FROM canastillas WHERE estado = 'En Reparación'", ()),
+    ("SELECT ubicacion, COUNT(*) as cantidad FROM canastillas GROUP BY ubicacion ORDER BY cantidad DESC", ()),
+    ("""SELECT DATE_FORMAT(fecha_movimiento, '%Y-%m') as mes, COUNT(*) as movimientos
+        FROM movimientos WHERE fecha_movimiento >= %s GROUP BY mes ORDER BY mes""", None),
+    ("""SELECT m.id_movimiento, m.id_canastilla, m.tipo_movimiento, m.ubicacion_origen, m.ubicacion_destino,
+               u.nombre as usuario_responsable, m.fecha_movimiento
+        FROM movimientos m LEFT JOIN usuarios u ON m.id_usuario_responsable = u.id_usuario
+        ORDER BY m.fecha_movimiento DESC LIMIT 5""", ()),
+]
+
+
+def _dashboard_antes():
+    """
+    Métricas del dashboard como se calculaban antes: cuatro COUNT(*), el
+    GROUP BY por ubicación, la tendencia sobre movimientos y los recientes
+    """
+    connection = _conectar(api.get_db_connection)
+    cursor = connection.cursor(dictionary=True)
+    try:
+        seis_meses = (datetime.now() - timedelta(days=180)).strftime('%Y-%m-%d')
+        for sql, parametros in CONSULTAS_DASHBOARD_ANTES:
+            cursor.execute(sql, (seis_meses,) if parametros is None else parametros)
+            cursor.fetchall()
+    finally:
+        cursor.close()
+        api.close_db_connection(connection)
+
+
+def medir_dashboard(repeticiones, fabrica=None):
+    """
+    Latencia de las métricas del dashboard antes y después, sin la caché
+    """
+    escenarios = (("dashboard antes (7 consultas)", _dashboard_antes),
+                  ("dashboard actual", api.get_dashboard_metrics.sin_cache))
+    filas = []
+    for nombre, funcion in escenarios:
+        # Los viajes se cuentan una vez con una conexión falsa sin demora
+        usadas = _con_conexion(funcion, lambda filas: _ConexionLenta(filas))
+        p50, p99 = _medir(lambda: _con_conexion(funcion, fabrica), repeticiones)
+        filas.append((nombre, sum(len(conexion.sentencias) for conexion in usadas), p50, p99))
+    _imprimir(filas)
+
+
+# Movimientos: N POST individuales contra un POST al endpoint de lote
+
+def _movimientos_sembrados(cantidad):
+    """
+    `cantidad` movimientos sobre canastillas sembradas, para medir contra
+    la base configurada
+    """
+    connection = _conectar(get_db_connection)
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT id_usuario FROM usuarios WHERE email = %s", (EMAIL_SEMBRADO,))
+        usuario = cursor.fetchone()
+        cursor.execute("SELECT id_canastilla FROM canastillas WHERE id_canastilla LIKE %s LIMIT %s",
+                       (PREFIJO_SEMBRADO + '%', cantidad))
+        ids = [fila[0] for fila in cursor.fetchall()]
+    finally:
+        cursor.close()
+        close_db_connection(connection)
+    if usuario is None or not ids:
+        raise SystemExit("No hay datos sembrados: ejecutar antes con --sembrar")
+    return [{"id_canastilla": ids[indice % len(ids)], "tipo_movimiento": 'traslado',
+             "ubicacion_origen": 'Planta', "ubicacion_destino": 'Bodega Principal',
+             "id_usuario_responsable": usuario[0]} for indice in range(cantidad)]
+
+
+def medir_lote(cantidad, repeticiones, fabrica=None):
+    """
+    Latencia de registrar `cantidad` movimientos con add_movimiento uno por
+    uno (lo que hacen N POST /api/movimiento/add) y con un solo
+    add_movimientos_lote (POST /api/movimientos/lote). No incluye HTTP.
+    """
+    simulados, filas_lote = viajes._lote_movimientos(cantidad)
+    movimientos = simulados if fabrica is not None else _movimientos_sembrados(cantidad)
+    filas_individual = [('A', 'Disponible')]
+
+    def individuales(movimientos, fabrica):
+        usadas = []
+        for movimiento in movimientos:
+            usadas += _con_conexion(lambda: api.add_movimiento(
+                movimiento['id_canastilla'], movimiento['tipo_movimiento'], movimiento['ubicacion_origen'],
+                movimiento['ubicacion_destino'], movimiento['id_usuario_responsable']), fabrica, filas_individual)
+        return usadas
+
+    def lote(movimientos, fabrica):
+        return _con_conexion(lambda: api.add_movimientos_lote(movimientos), fabrica, filas_lote)
+
+    filas = []
+    for nombre, funcion in ((f"{cantidad} POST individuales", individuales),
+                            (f"1 POST de lote ({cantidad})", lote)):
+        usadas = funcion(simulados, lambda filas: _ConexionLenta(filas))
+        p50, p99 = _medir(lambda: funcion(movimientos, fabrica), repeticiones)
+        filas.append((nombre, sum(len(conexion.sentencias) for conexion in usadas), p50, p99))
+    _imprimir(filas, cantidad)
+
+
+# Datos de prueba
+
+def sembrar(canastillas, movimientos, dias=365, bloque=5000):
+    """
+    Inserta canastillas, un usuario y movimientos repartidos en los últimos
+    `dias` en la base configurada, y reconcilia los contadores del
+    dashboard. Las filas sembradas usan el prefijo PREFIJO_SEMBRADO.
+    """
+    aleatorio = random.Random(42)
+    connection = _conectar(get_db_connection)
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO usuarios (nombre, email, password, rol, estado, fecha_creacion)
+            VALUES ('Medición', %s, '', 'operador', 'activo', NOW())
+            ON DUPLICATE KEY UPDATE id_usuario = LAST_INSERT_ID(id_usuario)
+        """, (EMAIL_SEMBRADO,))
+        id_usuario = cursor.lastrowid
+
+        ids = [f"{PREFIJO_SEMBRADO}{numero:07d}" for numero in range(canastillas)]
+        for inicio in range(0, canastillas, bloque):
+            cursor.executemany("""
+                INSERT IGNORE INTO canastillas (id_canastilla, estado, ubicacion, fecha_ultimo_movimiento)
+                VALUES (%s, %s, %s, NOW())
+            """, [(id_canastilla, aleatorio.choice(ESTADOS_SEMBRADO), aleatorio.choice(UBICACIONES_SEMBRADO))
+                  for id_canastilla in ids[inicio:inicio + bloque]])
+            connection.commit()
+
+        ahora = datetime.now()
+        for inicio in range(0, movimientos, bloque):
+            cursor.executemany("""
+                INSERT INTO movimientos (id_canastilla, tipo_movimiento, ubicacion_origen, ubicacion_destino,
+                                         id_usuario_responsable, fecha_movimiento)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, [(aleatorio.choice(ids), aleatorio.choice(TIPOS_SEMBRADO), aleatorio.choice(UBICACIONES_SEMBRADO),
+                   aleatorio.choice(UBICACIONES_SEMBRADO), id_usuario,
+                   ahora - timedelta(seconds=aleatorio.randrange(dias * 86400)))
+                  for _ in range(min(bloque, movimientos - inicio))])
+            connection.commit()
+    finally:
+        cursor.close()
+        close_db_connection(connection)
+    reconciliar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mediciones de latencia antes y después de las optimizaciones")
+    parser.add_argument('escenario', choices=('dashboard', 'lote'))
+    parser.add_argument('--repeticiones', type=int, default=50)
+    parser.add_argument('--simulado', action='store_true',
+                        help="Sin base: cada viaje tarda --rtt-ms y las consultas no cuestan")
+    parser.add_argument('--rtt-ms', type=float, default=0.5)
+    parser.add_argument('--costo-fila-ms', type=float, default=0.02,
+                        help="Costo simulado de cada fila de un executemany")
+    parser.add_argument('--cantidad', type=int, default=100, help="Movimientos del escenario lote")
+    parser.add_argument('--sembrar', action='store_true', help="Siembra datos en la base configurada antes de medir")
+    parser.add_argument('--canastillas', type=int, default=100000)
+    parser.add_argument('--movimientos', type=int, default=1000000)
+    args = parser.parse_args()
+
+    fabrica = None
+    if args.simulado:
+        # Los viajes contados son exactos; las latencias solo reflejan el rtt supuesto
+        print(f"Simulado: cada viaje tarda {args.rtt_ms} ms y las consultas no cuestan. "
+              "No es una medición contra MySQL.")
+        fabrica = lambda filas: _ConexionLenta(filas, args.rtt_ms / 1000, args.costo_fila_ms / 1000)
+    elif args.sembrar:
+        sembrar(args.canastillas, args.movimientos)
+
+    if args.escenario == 'dashboard':
+        medir_dashboard(args.repeticiones, fabrica)
+    else:
+        medir_lote(args.cantidad, args.repeticiones, fabrica)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
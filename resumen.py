@@ -0,0 +1,323 @@
+from db_connection import get_db_connection, close_db_connection
+from sincronizacion import purgar_eliminaciones
+from versiones import incrementar_versiones
+from collections import defaultdict
+from datetime import datetime, timedelta
+import logging
+import threading
+
+from mysql.connector import Error
+
+logger = logging.getLogger(__name__)
+
+# Meses revisados por la reconciliación periódica
+MESES_RECONCILIACION = 13
+
+# Días revisados de los conteos por hora y por día en cada reconciliación
+DIAS_RECONCILIACION_PERIODO = 7
+
+# Días que se conservan los conteos por hora; los diarios se conservan siempre
+RETENCION_CONTEOS_HORA_DIAS = 90
+
+# Formato del inicio de cada período en resumen_movimientos_periodo
+FORMATOS_PERIODO = {
+    'hora': '%Y-%m-%d %H:00:00',
+    'dia': '%Y-%m-%d 00:00:00'
+}
+
+
+def ajustar_canastillas(cursor, cambios):
+    """
+    Aplica deltas a los conteos por (ubicacion, estado) dentro de la
+    transacción del llamador. `cambios` es una lista de ((ubicacion, estado), delta).
+    """
+    deltas = defaultdict(int)
+    for clave, delta in cambios:
+        deltas[clave] += delta
+
+    # Orden fijo para que transacciones concurrentes bloqueen las filas en el mismo orden
+    filas = [(ubicacion, estado, delta) for (ubicacion, estado), delta in sorted(deltas.items()) if delta]
+    if not filas:
+        return
+
+    cursor.executemany("""
+        INSERT INTO resumen_canastillas (ubicacion, estado, cantidad)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE cantidad = cantidad + VALUES(cantidad)
+    """, filas)
+
+
+def ajustar_movimientos_mes(cursor, mes, delta):
+    """
+    Suma `delta` al total de movimientos del mes ('YYYY-MM') indicado
+    """
+    cursor.execute("""
+        INSERT INTO resumen_movimientos_mes (mes, movimientos)
+        VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE movimientos = movimientos + VALUES(movimientos)
+    """, (mes, delta))
+
+
+def sumar_movimiento_mes_actual(cursor, cantidad=1):
+    """
+    Suma movimientos al mes actual según el reloj de la base de datos,
+    el mismo que usa fecha_movimiento
+    """
+    cursor.execute("""
+        INSERT INTO resumen_movimientos_mes (mes, movimientos)
+        VALUES (DATE_FORMAT(NOW(), '%Y-%m'), %s)
+        ON DUPLICATE KEY UPDATE movimientos = movimientos + VALUES(movimientos)
+    """, (cantidad,))
+
+
+def ajustar_movimientos_periodo(cursor, cambios):
+    """
+    Aplica deltas a los conteos de movimientos por hora y por día dentro de
+    la transacción del llamador. `cambios` es una lista de
+    ((fecha, tipo_movimiento, ubicacion_origen, ubicacion_destino), delta);
+    una fecha None es el momento actual según el reloj de la base. Ambas
+    granularidades están en la misma tabla para escribirlas en una sola
+    sentencia.
+    """
+    deltas = defaultdict(int)
+    for clave, delta in cambios:
+        deltas[clave] += delta
+
+    # Orden fijo para que transacciones concurrentes bloqueen las filas en el mismo orden
+    filas = []
+    for (fecha, tipo, origen, destino), delta in sorted(deltas.items(), key=lambda item: (str(item[0][0]), item[0][1:])):
+        if not delta:
+            continue
+        for granularidad, formato in FORMATOS_PERIODO.items():
+            filas.append((granularidad, fecha, formato, tipo, origen, destino, delta))
+    if not filas:
+        return
+
+    cursor.executemany("""
+        INSERT INTO resumen_movimientos_periodo
+            (granularidad, inicio, tipo_movimiento, ubicacion_origen, ubicacion_destino, movimientos)
+        VALUES (%s, DATE_FORMAT(COALESCE(%s, NOW()), %s), %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE movimientos = movimientos + VALUES(movimientos)
+    """, filas)
+
+
+def leer_tendencia(cursor, granularidad, inicio, fin, ubicacion=None, tipo_movimiento=None):
+    """
+    Conteos de movimientos por período y tipo entre `inicio` (incluido) y
+    `fin` (excluido), desde la tabla de la granularidad 'hora' o 'dia'. El
+    costo depende del número de períodos, no del número de movimientos.
+    """
+    condiciones = ["granularidad = %s", "inicio >= %s", "inicio < %s"]
+    parametros = [granularidad, inicio, fin]
+    if ubicacion:
+        condiciones.append("(ubicacion_origen = %s OR ubicacion_destino = %s)")
+        parametros.extend([ubicacion, ubicacion])
+    if tipo_movimiento:
+        condiciones.append("tipo_movimiento = %s")
+        parametros.append(tipo_movimiento)
+
+    cursor.execute(f"""
+        SELECT inicio, tipo_movimiento, SUM(movimientos) AS movimientos
+        FROM resumen_movimientos_periodo
+        WHERE {' AND '.join(condiciones)}
+        GROUP BY inicio, tipo_movimiento
+        HAVING SUM(movimientos) <> 0
+    """, parametros)
+    return [(row['inicio'], row['tipo_movimiento'], int(row['movimientos'])) for row in cursor.fetchall()]
+
+
+def purgar_conteos_hora(dias=RETENCION_CONTEOS_HORA_DIAS):
+    """
+    Elimina los conteos por hora más antiguos que `dias`
+    """
+    connection = get_db_connection()
+    if connection is None:
+        return
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            DELETE FROM resumen_movimientos_periodo
+            WHERE granularidad = 'hora' AND inicio < %s
+        """, (datetime.now() - timedelta(days=dias),))
+        connection.commit()
+
+    except Error as e:
+        connection.rollback()
+        logger.error(f"Error al purgar los conteos por hora: {e}")
+
+    finally:
+        if connection:
+            cursor.close()
+            close_db_connection(connection)
+
+
+def leer_resumen(cursor, desde_mes):
+    """
+    Lee los contadores materializados en una sola consulta. El costo no
+    depende del tamaño de la flota sino del número de ubicaciones y estados.
+    """
+    cursor.execute("""
+        SELECT 'canastillas' AS seccion, ubicacion, estado, cantidad, NULL AS mes
+        FROM resumen_canastillas
+        WHERE cantidad <> 0
+        UNION ALL
+        SELECT 'mes', NULL, NULL, movimientos, mes
+        FROM resumen_movimientos_mes
+        WHERE mes >= %s AND movimientos <> 0
+    """, (desde_mes,))
+
+    por_estado = defaultdict(int)
+    por_ubicacion = defaultdict(int)
+    por_mes = {}
+    for row in cursor.fetchall():
+        if row['seccion'] == 'canastillas':
+            por_estado[row['estado']] += int(row['cantidad'])
+            por_ubicacion[row['ubicacion']] += int(row['cantidad'])
+        else:
+            por_mes[row['mes']] = int(row['cantidad'])
+
+    return {
+        "por_estado": dict(por_estado),
+        "por_ubicacion": dict(por_ubicacion),
+        "por_mes": dict(sorted(por_mes.items()))
+    }
+
+
+def _calcular_desviaciones(cursor, desde_mes, bloquear):
+    bloqueo = " FOR UPDATE" if bloquear else ""
+
+    # Con bloqueo, se leen primero los contadores para que ninguna escritura
+    # pueda quedar a medio aplicar entre ambas lecturas
+    cursor.execute("SELECT ubicacion, estado, cantidad FROM resumen_canastillas" + bloqueo)
+    guardado = {(row[0], row[1]): int(row[2]) for row in cursor.fetchall()}
+    cursor.execute("SELECT mes, movimientos FROM resumen_movimientos_mes WHERE mes >= %s" + bloqueo, (desde_mes,))
+    guardado_mes = {row[0]: int(row[1]) for row in cursor.fetchall()}
+
+    cursor.execute("SELECT ubicacion, estado, COUNT(*) FROM canastillas GROUP BY ubicacion, estado")
+    real = {(row[0], row[1]): int(row[2]) for row in cursor.fetchall()}
+    cursor.execute("""
+        SELECT DATE_FORMAT(fecha_movimiento, '%Y-%m') AS mes, COUNT(*)
+        FROM movimientos
+        WHERE fecha_movimiento >= %s
+        GROUP BY mes
+    """, (desde_mes + '-01',))
+    real_mes = {row[0]: int(row[1]) for row in cursor.fetchall()}
+
+    desviaciones = [(clave, real.get(clave, 0) - guardado.get(clave, 0))
+                    for clave in set(real) | set(guardado)
+                    if real.get(clave, 0) != guardado.get(clave, 0)]
+    desviaciones_mes = [(mes, real_mes.get(mes, 0) - guardado_mes.get(mes, 0))
+                        for mes in set(real_mes) | set(guardado_mes)
+                        if real_mes.get(mes, 0) != guardado_mes.get(mes, 0)]
+    return desviaciones, desviaciones_mes
+
+
+def _desviaciones_periodo(cursor, desde, bloquear):
+    """
+    Diferencias entre los conteos por hora y por día desde `desde` y los
+    movimientos. Retorna [((granularidad, inicio, tipo, origen, destino), delta)].
+    """
+    bloqueo = " FOR UPDATE" if bloquear else ""
+    cursor.execute("""
+        SELECT granularidad, inicio, tipo_movimiento, ubicacion_origen, ubicacion_destino, movimientos
+        FROM resumen_movimientos_periodo
+        WHERE granularidad IN ('hora', 'dia') AND inicio >= %s
+    """ + bloqueo, (desde,))
+    guardado = {(row[0], str(row[1])) + tuple(row[2:5]): int(row[5]) for row in cursor.fetchall()}
+
+    real = {}
+    for granularidad, formato in FORMATOS_PERIODO.items():
+        cursor.execute("""
+            SELECT DATE_FORMAT(fecha_movimiento, %s) AS inicio, tipo_movimiento, ubicacion_origen,
+                   ubicacion_destino, COUNT(*)
+            FROM movimientos
+            WHERE fecha_movimiento >= %s
+            GROUP BY inicio, tipo_movimiento, ubicacion_origen, ubicacion_destino
+        """, (formato, desde))
+        real.update({(granularidad, str(row[0])) + tuple(row[1:4]): int(row[4]) for row in cursor.fetchall()})
+
+    return [(clave, real.get(clave, 0) - guardado.get(clave, 0))
+            for clave in set(real) | set(guardado)
+            if real.get(clave, 0) != guardado.get(clave, 0)]
+
+
+def _corregir_periodo(cursor, desviaciones):
+    # Orden fijo, como en ajustar_movimientos_periodo
+    cursor.executemany("""
+        INSERT INTO resumen_movimientos_periodo
+            (granularidad, inicio, tipo_movimiento, ubicacion_origen, ubicacion_destino, movimientos)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE movimientos = movimientos + VALUES(movimientos)
+    """, [clave + (delta,) for clave, delta in sorted(desviaciones)])
+
+
+def reconciliar(meses=MESES_RECONCILIACION, dias_periodo=DIAS_RECONCILIACION_PERIODO):
+    """
+    Compara los contadores materializados con las tablas base y corrige
+    las diferencias: conteos por ubicación y estado, totales de los últimos
+    `meses` y conteos por hora y por día de los últimos `dias_periodo`.
+    Primero revisa sin bloquear; solo si encuentra desviaciones repite la
+    comparación bloqueando los contadores y repara.
+    """
+    connection = get_db_connection()
+    if connection is None:
+        return {"error": "No se pudo conectar a la base de datos"}, 500
+
+    desde_mes = (datetime.now() - timedelta(days=31 * (meses - 1))).strftime('%Y-%m')
+    desde_periodo = datetime.combine(datetime.now().date() - timedelta(days=dias_periodo), datetime.min.time())
+
+    try:
+        cursor = connection.cursor()
+
+        desviaciones, desviaciones_mes = _calcular_desviaciones(cursor, desde_mes, bloquear=False)
+        desviaciones_periodo = _desviaciones_periodo(cursor, desde_periodo, bloquear=False)
+        connection.rollback()
+        if not desviaciones and not desviaciones_mes and not desviaciones_periodo:
+            return {"desviaciones": 0}, 200
+
+        desviaciones, desviaciones_mes = _calcular_desviaciones(cursor, desde_mes, bloquear=True)
+        desviaciones_periodo = _desviaciones_periodo(cursor, desde_periodo, bloquear=True)
+        ajustar_canastillas(cursor, desviaciones)
+        for mes, delta in sorted(desviaciones_mes):
+            ajustar_movimientos_mes(cursor, mes, delta)
+        if desviaciones_periodo:
+            _corregir_periodo(cursor, desviaciones_periodo)
+        # Las respuestas del dashboard cambian: su ETag y la caché dependen de estas versiones
+        incrementar_versiones(cursor, 'canastillas', 'movimientos')
+        connection.commit()
+
+        total = len(desviaciones) + len(desviaciones_mes) + len(desviaciones_periodo)
+        if total:
+            logger.warning(f"Reconciliación del resumen: {total} contadores corregidos")
+        return {"desviaciones": total}, 200
+
+    except Error as e:
+        connection.rollback()
+        logger.error(f"Error al reconciliar el resumen del dashboard: {e}")
+        return {"error": "Error al reconciliar el resumen"}, 500
+
+    finally:
+        if connection:
+            cursor.close()
+            close_db_connection(connection)
+
+
+def iniciar_reconciliacion_periodica(intervalo):
+    """
+    Ejecuta reconciliar() y las purgas de datos vencidos cada `intervalo`
+    segundos en un hilo en segundo plano
+    """
+    detener = threading.Event()
+
+    def ciclo():
+        while not detener.wait(intervalo):
+            try:
+                reconciliar()
+                purgar_conteos_hora()
+                purgar_eliminaciones()
+            except Exception as e:
+                logger.error(f"Error inesperado en la reconciliación periódica: {e}")
+
+    threading.Thread(target=ciclo, name='reconciliacion-resumen', daemon=True).start()
+    return detener
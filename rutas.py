@@ -0,0 +1,388 @@
+from email.utils import formatdate
+import gzip
+import io
+import json
+import os
+import re
+import time
+import zlib
+
+from codificacion import codificar_json
+from estaticos import elegir_codificacion
+
+TAMANO_CHUNK = 64 * 1024  # bytes acumulados antes de escribir un chunk en streaming
+
+# Compresión gzip de las respuestas JSON. Con niveles bajos el tamaño es casi
+# el mismo que con 9 y el costo de CPU varias veces menor.
+COMPRESION_MIN_BYTES = int(os.environ.get('COMPRESION_MIN_BYTES', '1024'))
+COMPRESION_NIVEL = int(os.environ.get('COMPRESION_NIVEL', '3'))
+
+# Tipos de parámetro de ruta y su conversión. 'path' toma el resto del path.
+_CONVERSORES = {
+    'int': int,
+    'str': str,
+    'path': str
+}
+
+_PARAMETRO = re.compile(r'\{(\w+)(?::(\w+))?\}')
+
+
+class ErrorPeticion(Exception):
+    """
+    Petición mal formada; se responde con `status` y el mensaje como error
+    """
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+class LectorLimitado(io.RawIOBase):
+    """
+    Expone como archivo solo los `restante` bytes del cuerpo de la petición
+    """
+    def __init__(self, origen, restante):
+        self._origen = origen
+        self.restante = restante
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.restante <= 0:
+            return 0
+        datos = self._origen.read(min(len(buffer), self.restante))
+        self.restante -= len(datos)
+        buffer[:len(datos)] = datos
+        return len(datos)
+
+
+class Peticion:
+    """
+    Datos de una petición independientes del servidor que la recibió
+    """
+
+    def __init__(self, metodo, path, consulta, encabezados, cuerpo, longitud):
+        self.metodo = metodo
+        self.path = path
+        self.consulta = consulta  # resultado de parse_qs
+        self.encabezados = encabezados  # cualquier objeto con .get(nombre)
+        self.cuerpo = cuerpo  # LectorLimitado sobre el cuerpo
+        self.longitud = longitud  # Content-Length, o None si no se envió
+        self.parametros = {}
+
+    def parametro(self, nombre):
+        """
+        Retorna el primer valor de un parámetro de la query string, o None
+        """
+        valores = self.consulta.get(nombre)
+        return valores[0] if valores else None
+
+    def json(self):
+        """
+        Lee y decodifica el cuerpo JSON de la petición
+        """
+        if self.longitud is None:
+            raise ErrorPeticion("Se requiere Content-Length", 411)
+        try:
+            return json.loads(self.cuerpo.read(self.longitud).decode('utf-8'))
+        except ValueError:
+            raise ErrorPeticion("JSON inválido")
+
+    def acepta_gzip(self):
+        return elegir_codificacion(self.encabezados.get('Accept-Encoding'), ('gzip',)) == 'gzip'
+
+
+class Respuesta:
+    """
+    Respuesta completa en memoria. El servidor agrega Content-Length.
+    """
+
+    def __init__(self, status, cuerpo=b'', encabezados=(), cerrar=False):
+        self.status = status
+        self.cuerpo = cuerpo
+        self.encabezados = list(encabezados)
+        self.cerrar = cerrar
+
+
+class RespuestaStream:
+    """
+    Respuesta cuyo cuerpo se produce por partes con fragmentos_stream()
+    """
+
+    def __init__(self, filas, comprimir, encabezados=()):
+        self.status = 200
+        self.filas = filas
+        self.comprimir = comprimir
+        self.encabezados = list(encabezados)
+
+
+def respuesta_json(peticion, data, status=200, etag=None, cerrar=False):
+    """
+    Serializa la respuesta y la comprime con gzip si el cliente lo acepta
+    y supera COMPRESION_MIN_BYTES
+    """
+    cuerpo = codificar_json(data)
+    encabezados = [('Content-type', 'application/json'),
+                   ('Access-Control-Allow-Origin', '*'),
+                   ('Vary', 'Accept-Encoding')]
+    if etag and status == 200:
+        encabezados += [('ETag', etag), ('Cache-Control', 'no-cache')]
+    if len(cuerpo) >= COMPRESION_MIN_BYTES and peticion.acepta_gzip():
+        cuerpo = gzip.compress(cuerpo, compresslevel=COMPRESION_NIVEL)
+        encabezados.append(('Content-Encoding', 'gzip'))
+    return Respuesta(status, cuerpo, encabezados, cerrar)
+
+
+def respuesta_stream(peticion, filas, etag=None):
+    """
+    Respuesta {"data": [...]} escrita a medida que llegan las filas. El
+    tamaño total no se conoce: si el cliente acepta gzip se comprime siempre.
+    """
+    comprimir = peticion.acepta_gzip()
+    encabezados = [('Content-type', 'application/json'),
+                   ('Access-Control-Allow-Origin', '*'),
+                   ('Vary', 'Accept-Encoding')]
+    if etag:
+        encabezados += [('ETag', etag), ('Cache-Control', 'no-cache')]
+    if comprimir:
+        encabezados.append(('Content-Encoding', 'gzip'))
+    return RespuestaStream(filas, comprimir, encabezados)
+
+
+def fragmentos_stream(respuesta):
+    """
+    Genera el cuerpo de una RespuestaStream en fragmentos de hasta
+    TAMANO_CHUNK bytes. Con compresión, el compresor se vacía en cada
+    fragmento para no retrasar datos.
+    """
+    compresor = None
+    if respuesta.comprimir:
+        compresor = zlib.compressobj(COMPRESION_NIVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def preparar(datos, final=False):
+        if compresor is None:
+            return datos
+        return compresor.compress(datos) + compresor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+    try:
+        # Enviar el inicio de inmediato para reducir el tiempo al primer byte
+        yield preparar(b'{"data":[')
+
+        partes = []
+        tamano = 0
+        separador = b''
+        for fila in respuesta.filas:
+            parte = separador + codificar_json(fila)
+            separador = b','
+            partes.append(parte)
+            tamano += len(parte)
+            if tamano >= TAMANO_CHUNK:
+                yield preparar(b''.join(partes))
+                partes = []
+                tamano = 0
+
+        partes.append(b']}')
+        yield preparar(b''.join(partes), final=True)
+    finally:
+        respuesta.filas.close()
+
+
+def coincide_etag(encabezado, etag):
+    """
+    Comparación débil de If-None-Match contra el ETag actual
+    """
+    if encabezado.strip() == '*':
+        return True
+    actual = etag[2:] if etag.startswith('W/') else etag
+    for candidato in encabezado.split(','):
+        candidato = candidato.strip()
+        if candidato.startswith('W/'):
+            candidato = candidato[2:]
+        if candidato == actual:
+            return True
+    return False
+
+
+def no_modificado(etag=None, modificado=None, cache_control='no-cache'):
+    encabezados = [('Cache-Control', cache_control), ('Access-Control-Allow-Origin', '*')]
+    if etag:
+        encabezados.append(('ETag', etag))
+    if modificado is not None:
+        encabezados.append(('Last-Modified', formatdate(modificado, usegmt=True)))
+    return Respuesta(304, encabezados=encabezados)
+
+
+class _Nodo:
+    """
+    Nodo del árbol de rutas con parámetros: un segmento del path
+    """
+    __slots__ = ('literales', 'parametro', 'resto', 'manejadores')
+
+    def __init__(self):
+        self.literales = {}  # segmento -> _Nodo
+        self.parametro = None  # (nombre, conversor, _Nodo)
+        self.resto = None  # (nombre, {metodo: manejador}) para {x:path}
+        self.manejadores = {}  # metodo -> manejador
+
+
+class Router:
+    """
+    Tabla de rutas por método y plantilla de path. Las rutas sin
+    parámetros se resuelven con un diccionario; las que tienen parámetros
+    (/api/movimiento/{id:int}) con un árbol por segmentos, así el costo
+    depende de la profundidad del path y no del número de rutas.
+    """
+
+    def __init__(self):
+        self._estaticas = {}  # path -> {metodo: manejador}
+        self._raiz = _Nodo()
+
+    def agregar(self, metodo, plantilla, manejador):
+        if '{' not in plantilla:
+            self._estaticas.setdefault(plantilla, {})[metodo] = manejador
+            return
+
+        nodo = self._raiz
+        segmentos = plantilla.strip('/').split('/')
+        for posicion, segmento in enumerate(segmentos):
+            parametro = _PARAMETRO.fullmatch(segmento)
+            if parametro is None:
+                if '{' in segmento:
+                    raise ValueError(f"Un parámetro debe ocupar el segmento completo: {plantilla}")
+                nodo = nodo.literales.setdefault(segmento, _Nodo())
+                continue
+
+            nombre, tipo = parametro.group(1), parametro.group(2) or 'str'
+            if tipo not in _CONVERSORES:
+                raise ValueError(f"Tipo de parámetro desconocido en {plantilla}: {tipo}")
+            if tipo == 'path':
+                if posicion != len(segmentos) - 1:
+                    raise ValueError(f"Un parámetro path debe ser el último segmento: {plantilla}")
+                if nodo.resto is None:
+                    nodo.resto = (nombre, {})
+                nodo.resto[1][metodo] = manejador
+                return
+
+            if nodo.parametro is None:
+                nodo.parametro = (nombre, _CONVERSORES[tipo], _Nodo())
+            elif nodo.parametro[0] != nombre or nodo.parametro[1] is not _CONVERSORES[tipo]:
+                raise ValueError(f"Parámetro en conflicto con otra ruta: {plantilla}")
+            nodo = nodo.parametro[2]
+        nodo.manejadores[metodo] = manejador
+
+    def ruta(self, metodo, plantilla):
+        """
+        Decorador para registrar un manejador
+        """
+        def decorador(manejador):
+            self.agregar(metodo, plantilla, manejador)
+            return manejador
+        return decorador
+
+    def _buscar(self, nodo, segmentos, posicion, valores):
+        # Retorna ({metodo: manejador}, valores) del primer nodo terminal;
+        # los segmentos fijos tienen prioridad sobre los parámetros
+        if posicion == len(segmentos):
+            if nodo.manejadores:
+                return nodo.manejadores, valores
+        else:
+            segmento = segmentos[posicion]
+            hijo = nodo.literales.get(segmento)
+            if hijo is not None:
+                encontrado = self._buscar(hijo, segmentos, posicion + 1, valores)
+                if encontrado is not None:
+                    return encontrado
+            if nodo.parametro is not None and segmento:
+                nombre, conversor, hijo = nodo.parametro
+                encontrado = self._buscar(hijo, segmentos, posicion + 1,
+                                          valores + ((nombre, conversor, segmento),))
+                if encontrado is not None:
+                    return encontrado
+        if nodo.resto is not None and posicion < len(segmentos):
+            nombre, manejadores = nodo.resto
+            return manejadores, valores + ((nombre, str, '/'.join(segmentos[posicion:])),)
+        return None
+
+    def _coincidencia(self, path):
+        manejadores = self._estaticas.get(path)
+        if manejadores is not None:
+            return manejadores, ()
+        return self._buscar(self._raiz, path.strip('/').split('/'), 0, ())
+
+    def resolver(self, metodo, path):
+        """
+        Retorna (manejador, parametros), o (None, None) si ninguna ruta
+        coincide. Lanza ErrorPeticion si un parámetro no tiene el tipo esperado.
+        """
+        manejadores = self._estaticas.get(path)
+        if manejadores is not None and metodo in manejadores:
+            return manejadores[metodo], {}
+
+        encontrado = self._buscar(self._raiz, path.strip('/').split('/'), 0, ())
+        if encontrado is None or metodo not in encontrado[0]:
+            return None, None
+
+        manejadores, valores = encontrado
+        parametros = {}
+        for nombre, conversor, valor in valores:
+            try:
+                parametros[nombre] = conversor(valor)
+            except ValueError:
+                raise ErrorPeticion(f"Valor inválido para '{nombre}' en la ruta")
+        return manejadores[metodo], parametros
+
+    def metodos_permitidos(self, path):
+        """
+        Métodos con alguna ruta que coincide con el path, para responder 405
+        """
+        encontrado = self._coincidencia(path)
+        return sorted(encontrado[0]) if encontrado else []
+
+
+def _benchmark(rutas=60, repeticiones=200000):
+    """
+    Compara el costo de despacho del Router con una cadena if/elif
+    equivalente de `path ==` y `path.startswith`
+    """
+    router = Router()
+    cadena = []
+
+    def despachar_cadena(path):
+        for tipo, valor in cadena:
+            if tipo == 'igual':
+                if path == valor:
+                    return valor
+            elif path.startswith(valor):
+                return int(path.split('/')[-1])
+        return None
+
+    for i in range(rutas):
+        if i % 3 == 2:
+            router.agregar('GET', f'/api/recurso{i}/{{id:int}}', despachar_cadena)
+            cadena.append(('prefijo', f'/api/recurso{i}/'))
+        else:
+            router.agregar('GET', f'/api/recurso{i}/listado', despachar_cadena)
+            cadena.append(('igual', f'/api/recurso{i}/listado'))
+
+    casos = {
+        "primera ruta fija": '/api/recurso0/listado',
+        "última ruta fija": f'/api/recurso{rutas - 2}/listado',
+        "última ruta con parámetro": f'/api/recurso{rutas - 1}/123',
+        "ruta inexistente": '/api/no-existe'
+    }
+    print(f"{rutas} rutas, {repeticiones} resoluciones por caso")
+    for nombre, path in casos.items():
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            router.resolver('GET', path)
+        tabla = (time.perf_counter() - inicio) / repeticiones * 1e9
+
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            despachar_cadena(path)
+        if_elif = (time.perf_counter() - inicio) / repeticiones * 1e9
+        print(f"{nombre:<28} router {tabla:8.0f} ns   if/elif {if_elif:8.0f} ns")
+
+
+if __name__ == '__main__':
+    _benchmark()
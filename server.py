@@ -1,335 +1,392 @@
 import http.server
 import socketserver
-import json
 import os
+import argparse
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, parse_qs
-from api import get_dashboard_metrics, get_inventario, get_movimientos, get_movimiento_by_id, add_canastilla, add_movimiento, update_movimiento, delete_movimiento
-from api import get_usuarios, get_usuario_by_id, add_usuario, update_usuario, delete_usuario
+from estaticos import cargar_estaticos
+from resumen import iniciar_reconciliacion_periodica
+import cola_escritura
+from rutas import Peticion, LectorLimitado, RespuestaStream, fragmentos_stream, respuesta_json
+from eventos import RespuestaEventos, RelevoProcesos, detener_suscripciones
+from manejadores import despachar, no_encontrado
+from servidor_async import ejecutar_async, MAX_CONEXIONES as MAX_CONEXIONES_ASYNC
 
 PORT = 8000
+MAX_HILOS = 32
+INTERVALO_RECONCILIACION = 600  # segundos entre reconciliaciones del resumen del dashboard
+
+# Conexiones persistentes (HTTP/1.1)
+INACTIVIDAD_CONEXION = float(os.environ.get('HTTP_INACTIVIDAD', '5'))  # segundos esperando la siguiente petición
+TIMEOUT_PETICION = float(os.environ.get('HTTP_TIMEOUT_PETICION', '60'))  # segundos sin progreso dentro de una petición
+MAX_PETICIONES_CONEXION = int(os.environ.get('HTTP_MAX_PETICIONES', '100'))
 
 class MyHandler(http.server.SimpleHTTPRequestHandler):
-    def do_GET(self):
+    protocol_version = 'HTTP/1.1'
+    timeout = INACTIVIDAD_CONEXION
+    # Cabeceras y cuerpo salen en escrituras separadas; con Nagle activo, en
+    # una conexión persistente el cuerpo esperaría el ACK retrasado del cliente
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.peticiones_atendidas = 0
+
+    def handle_one_request(self):
+        # Entre peticiones rige el tiempo de inactividad; parse_request
+        # lo amplía una vez recibida la línea de la petición
+        self.connection.settimeout(INACTIVIDAD_CONEXION)
+        self.peticiones_atendidas += 1
+        super().handle_one_request()
+
+    def parse_request(self):
+        self.connection.settimeout(TIMEOUT_PETICION)
+        return super().parse_request()
+
+    def end_headers(self):
+        # Cerrar al llegar al máximo de peticiones, o si todos los hilos están
+        # ocupados, para no retener un hilo con una conexión ociosa
+        if not self.close_connection and (
+                self.peticiones_atendidas >= MAX_PETICIONES_CONEXION or
+                getattr(self.server, 'saturado', lambda: False)()):
+            self.send_header('Connection', 'close')
+        super().end_headers()
+
+    def _atender(self):
+        """
+        Construye la Peticion, la despacha por la tabla de rutas y escribe
+        la respuesta
+        """
         parsed_path = urlparse(self.path)
-        path = parsed_path.path
+        longitud = self.headers.get('Content-Length')
+        try:
+            longitud = int(longitud) if longitud is not None else None
+            if longitud is not None and longitud < 0:
+                raise ValueError
+        except ValueError:
+            self.send_error(400, "Content-Length inválido")
+            return
 
-        if path == '/api/dashboard/metrics':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            data, status = get_dashboard_metrics()
-            self.wfile.write(json.dumps(data).encode('utf-8'))
-    
-        elif path == '/api/inventario':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            data, status = get_inventario()
-            self.wfile.write(json.dumps(data).encode('utf-8'))
-            
-        elif path == '/api/movimientos':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            data, status = get_movimientos()
-            self.wfile.write(json.dumps(data).encode('utf-8'))
-            
-        elif path == '/api/usuarios':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
+        cuerpo = LectorLimitado(self.rfile, longitud or 0)
+        peticion = Peticion(self.command, parsed_path.path, parse_qs(parsed_path.query),
+                            self.headers, cuerpo, longitud)
+        respuesta = despachar(peticion)
+        if respuesta is None:
+            if self.command == 'GET':
+                super().do_GET()
+                return
+            respuesta = no_encontrado(peticion)
+
+        if isinstance(respuesta, RespuestaEventos):
+            self._escribir_eventos(peticion, respuesta)
+            return
+
+        # Si quedó un cuerpo sin leer, la conexión no puede reutilizarse
+        self._escribir(respuesta, cerrar=cuerpo.restante > 0)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _atender
+
+    def _escribir(self, respuesta, cerrar=False):
+        """
+        Escritor único de respuestas: agrega Content-Length, o usa chunked
+        en las respuestas en streaming
+        """
+        if isinstance(respuesta, RespuestaStream):
+            self._escribir_stream(respuesta, cerrar)
+            return
+
+        self.send_response(respuesta.status)
+        for nombre, valor in respuesta.encabezados:
+            self.send_header(nombre, valor)
+        if respuesta.status != 304:
+            self.send_header('Content-Length', str(len(respuesta.cuerpo)))
+        if respuesta.cerrar or cerrar:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        if respuesta.status != 304:
+            self.wfile.write(respuesta.cuerpo)
+
+    def _escribir_stream(self, respuesta, cerrar=False):
+        """
+        Con HTTP/1.1 usa Transfer-Encoding: chunked; con HTTP/1.0 la
+        respuesta termina al cerrar la conexión
+        """
+        chunked = self.request_version >= 'HTTP/1.1'
+        fragmentos = fragmentos_stream(respuesta)
+        try:
+            self.send_response(respuesta.status)
+            for nombre, valor in respuesta.encabezados:
+                self.send_header(nombre, valor)
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            if cerrar or not chunked:
+                self.send_header('Connection', 'close')
             self.end_headers()
-            data, status = get_usuarios()
-            self.wfile.write(json.dumps(data).encode('utf-8'))
-            
-        elif path.startswith('/api/movimiento/'):
-            # Obtener un movimiento específico por ID
-            try:
-                movimiento_id = int(path.split('/')[-1])
-                data, status = get_movimiento_by_id(movimiento_id)
-                self.send_response(status)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps(data).encode('utf-8'))
-            except (ValueError, IndexError):
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "ID de movimiento inválido"}).encode('utf-8'))
-                
-        elif path.startswith('/api/usuario/'):
-            # Obtener un usuario específico por ID
-            try:
-                usuario_id = int(path.split('/')[-1])
-                data, status = get_usuario_by_id(usuario_id)
-                self.send_response(status)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps(data).encode('utf-8'))
-            except (ValueError, IndexError):
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "ID de usuario inválido"}).encode('utf-8'))
-                
-        elif path.startswith('/html/'):
-            # Servir archivos HTML desde la carpeta 'html'
-            file_path = os.path.join(os.getcwd(), path[1:])
-            try:
-                with open(file_path, 'rb') as file:
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/html')
-                    self.end_headers()
-                    self.wfile.write(file.read())
-            except FileNotFoundError:
-                self.send_error(404, "File Not Found")
-                
-        elif path.startswith('/css/'):
-            # Servir archivos CSS
-            file_path = os.path.join(os.getcwd(), path[1:])
-            try:
-                with open(file_path, 'rb') as file:
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/css')
-                    self.end_headers()
-                    self.wfile.write(file.read())
-            except FileNotFoundError:
-                self.send_error(404, "File Not Found")
-                
-        elif path.startswith('/js/'):
-            # Servir archivos JavaScript
-            file_path = os.path.join(os.getcwd(), path[1:])
-            try:
-                with open(file_path, 'rb') as file:
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/javascript')
-                    self.end_headers()
-                    self.wfile.write(file.read())
-            except FileNotFoundError:
-                self.send_error(404, "File Not Found")
-        else:
-            super().do_GET()
-    
-    def do_POST(self):
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-
-        if path == '/api/canastilla/add':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            
-            id_canastilla = data.get('id_canastilla')
-            estado = data.get('estado')
-            ubicacion = data.get('ubicacion')
-            
-            if id_canastilla and estado and ubicacion:
-                response_data, status = add_canastilla(id_canastilla, estado, ubicacion)
-                self.send_response(status)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps(response_data).encode('utf-8'))
-            else:
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "Datos incompletos"}).encode('utf-8'))
-                
-        elif path == '/api/movimiento/add':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            
-            id_canastilla = data.get('id_canastilla')
-            tipo_movimiento = data.get('tipo_movimiento')
-            ubicacion_origen = data.get('ubicacion_origen')
-            ubicacion_destino = data.get('ubicacion_destino')
-            id_usuario_responsable = data.get('id_usuario_responsable')
-            
-            if id_canastilla and tipo_movimiento and ubicacion_origen and ubicacion_destino and id_usuario_responsable:
-                response_data, status = add_movimiento(id_canastilla, tipo_movimiento, ubicacion_origen, ubicacion_destino, id_usuario_responsable)
-                self.send_response(status)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps(response_data).encode('utf-8'))
-            else:
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "Datos incompletos"}).encode('utf-8'))
-                
-        elif path == '/api/usuario/add':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            
-            nombre = data.get('nombre')
-            email = data.get('email')
-            password = data.get('password')
-            rol = data.get('rol')
-            estado = data.get('estado')
-            
-            if nombre and email and password and rol and estado:
-                response_data, status = add_usuario(nombre, email, password, rol, estado)
-                self.send_response(status)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps(response_data).encode('utf-8'))
-            else:
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "Datos incompletos"}).encode('utf-8'))
-                
-        else:
-            super().do_POST()
-    
-    def do_PUT(self):
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
 
-        if path.startswith('/api/movimiento/'):
-            try:
-                movimiento_id = int(path.split('/')[-1])
-                content_length = int(self.headers['Content-Length'])
-                put_data = self.rfile.read(content_length)
-                data = json.loads(put_data.decode('utf-8'))
-                
-                id_canastilla = data.get('id_canastilla')
-                tipo_movimiento = data.get('tipo_movimiento')
-                ubicacion_origen = data.get('ubicacion_origen')
-                ubicacion_destino = data.get('ubicacion_destino')
-                id_usuario_responsable = data.get('id_usuario_responsable')
-                
-                if id_canastilla and tipo_movimiento and ubicacion_origen and ubicacion_destino and id_usuario_responsable:
-                    response_data, status = update_movimiento(movimiento_id, id_canastilla, tipo_movimiento, ubicacion_origen, ubicacion_destino, id_usuario_responsable)
-                    self.send_response(status)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
-                    self.wfile.write(json.dumps(response_data).encode('utf-8'))
-                else:
-                    self.send_response(400)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "Datos incompletos"}).encode('utf-8'))
-                    
-            except (ValueError, IndexError):
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "ID de movimiento inválido"}).encode('utf-8'))
-                
-        elif path.startswith('/api/usuario/'):
-            try:
-                usuario_id = int(path.split('/')[-1])
-                content_length = int(self.headers['Content-Length'])
-                put_data = self.rfile.read(content_length)
-                data = json.loads(put_data.decode('utf-8'))
-                
-                nombre = data.get('nombre')
-                email = data.get('email')
-                rol = data.get('rol')
-                estado = data.get('estado')
-                password = data.get('password')  # Opcional
-                
-                if nombre and email and rol and estado:
-                    response_data, status = update_usuario(usuario_id, nombre, email, rol, estado, password)
-                    self.send_response(status)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
-                    self.wfile.write(json.dumps(response_data).encode('utf-8'))
+            for datos in fragmentos:
+                if not datos:
+                    continue
+                if chunked:
+                    self.wfile.write(b'%X\r\n%s\r\n' % (len(datos), datos))
                 else:
-                    self.send_response(400)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "Datos incompletos"}).encode('utf-8'))
-                    
-            except (ValueError, IndexError):
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "ID de usuario inválido"}).encode('utf-8'))
-                
-        else:
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": "Endpoint no encontrado"}).encode('utf-8'))
-    
-    def do_DELETE(self):
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
+                    self.wfile.write(datos)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except Exception as e:
+            # Las cabeceras ya se enviaron: se corta la conexión sin el chunk
+            # final para que el cliente detecte la respuesta incompleta
+            self.log_error("Error durante la respuesta en streaming: %s", e)
+            self.close_connection = True
+        finally:
+            fragmentos.close()
 
-        if path.startswith('/api/movimiento/'):
-            try:
-                movimiento_id = int(path.split('/')[-1])
-                response_data, status = delete_movimiento(movimiento_id)
-                self.send_response(status)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps(response_data).encode('utf-8'))
-                    
-            except (ValueError, IndexError):
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "ID de movimiento inválido"}).encode('utf-8'))
-                
-        elif path.startswith('/api/usuario/'):
-            try:
-                usuario_id = int(path.split('/')[-1])
-                response_data, status = delete_usuario(usuario_id)
-                self.send_response(status)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps(response_data).encode('utf-8'))
-                    
-            except (ValueError, IndexError):
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "ID de usuario inválido"}).encode('utf-8'))
-                
-        else:
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
+    def _escribir_eventos(self, peticion, respuesta):
+        """
+        Mantiene abierto el stream de eventos en este hilo. Cada suscriptor
+        ocupa un hilo del pool, por eso el servidor admite pocos; para
+        muchos suscriptores se usa --modo async.
+        """
+        reservar = getattr(self.server, 'reservar_suscripcion', None)
+        if reservar is None or not reservar():
+            self._escribir(respuesta_json(peticion, {"error": "No hay cupo para más suscripciones"}, 503,
+                                          cerrar=True))
+            return
+
+        suscripcion = respuesta.suscripcion
+        try:
+            self.send_response(respuesta.status)
+            for nombre, valor in respuesta.encabezados:
+                self.send_header(nombre, valor)
+            # Sin Content-Length ni chunked: el stream termina al cerrar
+            self.send_header('Connection', 'close')
             self.end_headers()
-            self.wfile.write(json.dumps({"error": "Endpoint no encontrado"}).encode('utf-8'))
-    
+            self.close_connection = True
+
+            self.wfile.write(suscripcion.inicio())
+            while not suscripcion.canal.cerrado:
+                self.wfile.write(suscripcion.siguientes())
+        except OSError:
+            # El cliente se desconectó o dejó de leer
+            pass
+        finally:
+            self.server.liberar_suscripcion()
+
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
-Handler = MyHandler
-with socketserver.TCPServer(("", PORT), Handler) as httpd:
-    print(f"Servidor corriendo en el puerto {PORT}")
-    print(f"Accede a: http://localhost:{PORT}/html/dashboard.html")
-    httpd.serve_forever()
\ No newline at end of file
+class ServidorHilos(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    Servidor HTTP que atiende cada conexión en un pool acotado de hilos.
+    Cuando todos los hilos están ocupados deja de aceptar conexiones y las
+    nuevas esperan en la cola del socket.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, max_hilos=MAX_HILOS, reuse_port=False):
+        self.reuse_port = reuse_port
+        self._executor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix='http')
+        self._cupos = threading.BoundedSemaphore(max_hilos)
+        self.max_hilos = max_hilos
+        self._activas = 0
+        self._activas_lock = threading.Lock()
+        # Los streams de eventos retienen su hilo: se reserva la otra mitad para las peticiones
+        self.max_suscripciones = max_hilos // 2
+        self._suscripciones = 0
+        super().__init__(server_address, handler_class)
+
+    def saturado(self):
+        """
+        Indica si todos los hilos están atendiendo conexiones
+        """
+        return self._activas >= self.max_hilos
+
+    def reservar_suscripcion(self):
+        with self._activas_lock:
+            if self._suscripciones >= self.max_suscripciones:
+                return False
+            self._suscripciones += 1
+            return True
+
+    def liberar_suscripcion(self):
+        with self._activas_lock:
+            self._suscripciones -= 1
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        self._cupos.acquire()
+        with self._activas_lock:
+            self._activas += 1
+        try:
+            futuro = self._executor.submit(self.process_request_thread, request, client_address)
+        except RuntimeError:
+            # El executor ya se cerró: la petición llegó durante el apagado
+            self._liberar_cupo()
+            self.shutdown_request(request)
+            return
+        futuro.add_done_callback(lambda _: self._liberar_cupo())
+
+    def _liberar_cupo(self):
+        with self._activas_lock:
+            self._activas -= 1
+        self._cupos.release()
+
+    def server_close(self):
+        super().server_close()
+        # Esperar a que terminen las peticiones en curso
+        self._executor.shutdown(wait=True)
+
+
+def _apagar_al_recibir_senal(httpd):
+    # shutdown() bloquea hasta que serve_forever termina, por eso se llama desde otro hilo
+    def manejador(signum, frame):
+        print("Deteniendo servidor, esperando peticiones en curso...")
+        detener_suscripciones()
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, manejador)
+    signal.signal(signal.SIGINT, manejador)
+
+
+class ServidorSimple(socketserver.TCPServer):
+    """
+    Servidor de un solo hilo. Siempre se reporta saturado para que cada
+    respuesta cierre la conexión: una conexión persistente ociosa
+    bloquearía a los demás clientes.
+    """
+    def saturado(self):
+        return True
+
+
+def ejecutar_simple(port):
+    """
+    Modo original: una petición a la vez
+    """
+    with ServidorSimple(("", port), MyHandler) as httpd:
+        _apagar_al_recibir_senal(httpd)
+        httpd.serve_forever()
+
+
+def ejecutar_hilos(port, max_hilos, reuse_port=False):
+    """
+    Atiende peticiones concurrentes con un pool acotado de hilos
+    """
+    with ServidorHilos(("", port), MyHandler, max_hilos, reuse_port) as httpd:
+        _apagar_al_recibir_senal(httpd)
+        httpd.serve_forever()
+
+
+def ejecutar_procesos(port, procesos, max_hilos, al_iniciar=None):
+    """
+    Lanza varios procesos que comparten el puerto con SO_REUSEPORT para
+    aprovechar todos los núcleos. Cada proceso usa su propio pool de hilos
+    y su propio pool de conexiones a la base de datos.
+    """
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise SystemExit("SO_REUSEPORT no está disponible en este sistema")
+
+    # Los eventos publicados en un proceso llegan a los suscriptores de todos
+    relevo = RelevoProcesos(procesos)
+    hijos = []
+    for indice in range(procesos):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                relevo.en_hijo(indice)
+                ejecutar_hilos(port, max_hilos, reuse_port=True)
+            finally:
+                os._exit(0)
+        hijos.append(pid)
+    relevo.en_padre()
+
+    if al_iniciar:
+        al_iniciar()
+
+    def reenviar_senal(signum, frame):
+        for pid in hijos:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, reenviar_senal)
+    signal.signal(signal.SIGINT, reenviar_senal)
+
+    for pid in hijos:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+
+
+def _iniciar_tareas_periodicas(args):
+    if args.reconciliar_cada > 0:
+        iniciar_reconciliacion_periodica(args.reconciliar_cada)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de control de canastillas")
+    parser.add_argument('--puerto', type=int, default=PORT)
+    parser.add_argument('--modo', choices=['simple', 'hilos', 'procesos', 'async'], default='hilos',
+                        help="Modelo de concurrencia del servidor")
+    parser.add_argument('--hilos', type=int, default=MAX_HILOS,
+                        help="Máximo de peticiones atendidas a la vez por proceso")
+    parser.add_argument('--max-conexiones', type=int, default=MAX_CONEXIONES_ASYNC,
+                        help="Máximo de conexiones abiertas en modo 'async'")
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                        help="Número de procesos en modo 'procesos'")
+    parser.add_argument('--recargar-estaticos', action='store_true',
+                        help="Recargar html/css/js cuando cambian en disco (desarrollo)")
+    parser.add_argument('--reconciliar-cada', type=float, default=INTERVALO_RECONCILIACION,
+                        help="Segundos entre reconciliaciones del resumen del dashboard (0 para desactivar)")
+    parser.add_argument('--agrupar-escrituras', action='store_true',
+                        help="Confirmar juntos los movimientos individuales que llegan al mismo tiempo")
+    parser.add_argument('--agrupar-maximo', type=int, default=cola_escritura.MAXIMO_LOTE,
+                        help="Máximo de movimientos por transacción agrupada")
+    parser.add_argument('--agrupar-espera-ms', type=float, default=cola_escritura.ESPERA_LOTE * 1000,
+                        help="Milisegundos que se esperan más movimientos antes de confirmar un lote")
+    args = parser.parse_args()
+
+    if args.agrupar_escrituras:
+        cola_escritura.activar(args.agrupar_maximo, args.agrupar_espera_ms / 1000)
+
+    # Antes de crear los procesos, para que compartan la copia en memoria
+    cargar_estaticos(recargar=args.recargar_estaticos)
+
+    print(f"Servidor corriendo en el puerto {args.puerto} (modo {args.modo})")
+    print(f"Accede a: http://localhost:{args.puerto}/html/dashboard.html")
+
+    if args.modo == 'simple':
+        _iniciar_tareas_periodicas(args)
+        ejecutar_simple(args.puerto)
+    elif args.modo == 'hilos':
+        _iniciar_tareas_periodicas(args)
+        ejecutar_hilos(args.puerto, args.hilos)
+    elif args.modo == 'async':
+        # Las conexiones son corrutinas; --hilos acota las consultas simultáneas
+        _iniciar_tareas_periodicas(args)
+        ejecutar_async(args.puerto, args.hilos, args.max_conexiones)
+    else:
+        # Las tareas periódicas corren una sola vez, en el proceso padre
+        ejecutar_procesos(args.puerto, args.procesos, args.hilos,
+                          al_iniciar=lambda: _iniciar_tareas_periodicas(args))
+
+
+if __name__ == '__main__':
+    main()
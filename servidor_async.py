@@ -0,0 +1,380 @@
+import asyncio
+import http.client
+import logging
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TimeoutFuturo
+from email.parser import BytesParser
+from email.utils import formatdate
+from http import HTTPStatus
+from io import BytesIO
+from urllib.parse import urlsplit, parse_qs
+
+from rutas import Peticion, LectorLimitado, Respuesta, RespuestaStream, fragmentos_stream
+from manejadores import despachar, no_encontrado, sin_bloqueo
+from eventos import RespuestaEventos, canal, INTERVALO_LATIDO, LATIDO
+
+logger = logging.getLogger(__name__)
+
+# Una conexión ociosa solo cuesta una corrutina y sus buffers, así que puede
+# esperar mucho más que en el servidor por hilos
+INACTIVIDAD_CONEXION = float(os.environ.get('ASYNC_INACTIVIDAD', '75'))
+TIMEOUT_PETICION = float(os.environ.get('HTTP_TIMEOUT_PETICION', '60'))
+MAX_PETICIONES_CONEXION = int(os.environ.get('ASYNC_MAX_PETICIONES', '1000'))
+MAX_CONEXIONES = int(os.environ.get('ASYNC_MAX_CONEXIONES', '10000'))
+MAX_EN_COLA = int(os.environ.get('ASYNC_MAX_EN_COLA', '1000'))  # peticiones esperando un hilo antes de responder 503
+MAX_CUERPO = int(os.environ.get('ASYNC_MAX_CUERPO_MB', '20')) * 1024 * 1024
+# Cuerpos más grandes no se leen antes de despachar: el manejador los lee
+# del socket a medida que los procesa (importación CSV)
+CUERPO_EN_MEMORIA = int(os.environ.get('ASYNC_CUERPO_EN_MEMORIA_KB', '1024')) * 1024
+MAX_ENCABEZADOS = 64 * 1024
+
+
+class _CierreConexion(Exception):
+    pass
+
+
+class _CuerpoAsync(LectorLimitado):
+    """
+    Cuerpo que el manejador lee desde su hilo: cada lectura se pide al
+    StreamReader en el loop y se espera el resultado, así en memoria solo
+    está el fragmento que se está procesando
+    """
+
+    def __init__(self, reader, loop, longitud):
+        super().__init__(None, longitud)
+        self._reader = reader
+        self._loop = loop
+
+    def readinto(self, buffer):
+        if self.restante <= 0:
+            return 0
+        futuro = asyncio.run_coroutine_threadsafe(
+            self._reader.readexactly(min(len(buffer), self.restante)), self._loop)
+        try:
+            datos = futuro.result(TIMEOUT_PETICION)
+        except TimeoutFuturo:
+            futuro.cancel()
+            raise ConnectionError("Tiempo agotado leyendo el cuerpo de la petición")
+        except asyncio.IncompleteReadError:
+            raise ConnectionError("El cliente cerró la conexión antes de enviar el cuerpo")
+        self.restante -= len(datos)
+        buffer[:len(datos)] = datos
+        return len(datos)
+
+
+class ServidorAsync:
+    """
+    Servidor HTTP/1.1 sobre asyncio que sirve las mismas rutas que MyHandler.
+
+    Las conexiones se atienden con corrutinas; los manejadores, que usan el
+    driver síncrono de MySQL, corren en un pool de `max_hilos` hilos. No
+    hay todavía una ruta con un driver async de MySQL: cada consulta en
+    curso ocupa un hilo, así que las consultas simultáneas siguen acotadas
+    por `max_hilos` y solo las conexiones ociosas son baratas. La
+    contrapresión se aplica en tres puntos: un máximo de conexiones
+    abiertas, un máximo de peticiones esperando hilo (el resto recibe 503)
+    y drain() después de cada escritura, que pausa al productor cuando el
+    cliente lee lento.
+    """
+
+    def __init__(self, puerto, max_hilos, max_conexiones=MAX_CONEXIONES, max_en_cola=MAX_EN_COLA,
+                 reuse_port=False):
+        self.puerto = puerto
+        self.max_hilos = max_hilos
+        self.max_conexiones = max_conexiones
+        self.max_en_cola = max_en_cola
+        self.reuse_port = reuse_port
+        self._executor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix='async-api')
+        self._hilos = None
+        self._conexiones = set()
+        self._ociosas = set()  # conexiones esperando su siguiente petición
+        self._en_cola = 0
+        self._servidor = None
+        self._deteniendo = False
+        self._aviso_eventos = None  # se reemplaza en cada evento; los streams esperan el actual
+
+    async def _ejecutar(self, funcion, *args):
+        # Único camino hacia api.py. Una ruta con driver async (por ejemplo
+        # aiomysql) entraría aquí para los manejadores que tengan versión async.
+        return await asyncio.get_running_loop().run_in_executor(self._executor, funcion, *args)
+
+    async def _leer_peticion(self, reader):
+        """
+        Lee la línea de la petición, las cabeceras y el cuerpo. Retorna None
+        si el cliente cerró la conexión o quedó inactivo entre peticiones.
+        """
+        try:
+            linea = await asyncio.wait_for(reader.readline(), INACTIVIDAD_CONEXION)
+            # Algunos clientes envían una línea vacía extra después de un POST
+            while linea in (b'\r\n', b'\n'):
+                linea = await asyncio.wait_for(reader.readline(), INACTIVIDAD_CONEXION)
+        except (asyncio.TimeoutError, ConnectionError):
+            return None
+        if not linea:
+            return None
+
+        partes = linea.decode('latin-1').rstrip('\r\n').split()
+        if len(partes) != 3 or not partes[2].startswith('HTTP/'):
+            raise _CierreConexion(HTTPStatus.BAD_REQUEST)
+        metodo, destino, version = partes
+
+        bloque = bytearray()
+        while True:
+            linea = await asyncio.wait_for(reader.readline(), TIMEOUT_PETICION)
+            if not linea:
+                return None
+            if linea in (b'\r\n', b'\n'):
+                break
+            bloque += linea
+            if len(bloque) > MAX_ENCABEZADOS:
+                raise _CierreConexion(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+        encabezados = BytesParser(_class=http.client.HTTPMessage).parsebytes(bytes(bloque))
+
+        if encabezados.get('Transfer-Encoding'):
+            raise _CierreConexion(HTTPStatus.LENGTH_REQUIRED)
+        longitud = encabezados.get('Content-Length')
+        try:
+            longitud = int(longitud) if longitud is not None else None
+            if longitud is not None and longitud < 0:
+                raise ValueError
+        except ValueError:
+            raise _CierreConexion(HTTPStatus.BAD_REQUEST)
+        if longitud is not None and longitud > MAX_CUERPO:
+            raise _CierreConexion(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+        if longitud and longitud > CUERPO_EN_MEMORIA:
+            cuerpo = _CuerpoAsync(reader, asyncio.get_running_loop(), longitud)
+        else:
+            datos = await asyncio.wait_for(reader.readexactly(longitud), TIMEOUT_PETICION) if longitud else b''
+            cuerpo = LectorLimitado(BytesIO(datos), len(datos))
+
+        url = urlsplit(destino)
+        peticion = Peticion(metodo, url.path, parse_qs(url.query), encabezados, cuerpo, longitud)
+        return peticion, version
+
+    @staticmethod
+    def _cuerpo_sin_leer(peticion):
+        # Lo que el manejador no leyó sigue en el socket: la conexión no
+        # puede leer otra petición y se cierra después de responder
+        return isinstance(peticion.cuerpo, _CuerpoAsync) and peticion.cuerpo.restante > 0
+
+    def _atender(self, peticion):
+        # Corre en un hilo del pool
+        respuesta = despachar(peticion)
+        if respuesta is None:
+            respuesta = no_encontrado(peticion)
+        return respuesta
+
+    def _mantener_abierta(self, peticion, version, atendidas):
+        conexion = (peticion.encabezados.get('Connection') or '').lower()
+        if version == 'HTTP/1.0':
+            mantener = conexion == 'keep-alive'
+        else:
+            mantener = conexion != 'close'
+        return mantener and atendidas < MAX_PETICIONES_CONEXION
+
+    def _cabecera(self, status, encabezados, mantener):
+        lineas = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                  f"Date: {formatdate(usegmt=True)}",
+                  "Server: canastillas-async"]
+        lineas += [f"{nombre}: {valor}" for nombre, valor in encabezados]
+        if not mantener:
+            lineas.append("Connection: close")
+        return ('\r\n'.join(lineas) + '\r\n\r\n').encode('latin-1')
+
+    async def _escribir(self, writer, respuesta, version, mantener):
+        if isinstance(respuesta, RespuestaStream):
+            await self._escribir_stream(writer, respuesta, version, mantener)
+            return
+
+        encabezados = list(respuesta.encabezados)
+        if respuesta.status != 304:
+            encabezados.append(('Content-Length', str(len(respuesta.cuerpo))))
+        writer.write(self._cabecera(respuesta.status, encabezados, mantener))
+        if respuesta.status != 304:
+            writer.write(respuesta.cuerpo)
+        await writer.drain()
+
+    async def _escribir_stream(self, writer, respuesta, version, mantener):
+        """
+        Las filas se leen en el pool de hilos, una parte a la vez; drain()
+        detiene la lectura de la base mientras el cliente no consume
+        """
+        chunked = version >= 'HTTP/1.1'
+        fragmentos = fragmentos_stream(respuesta)
+        encabezados = list(respuesta.encabezados)
+        if chunked:
+            encabezados.append(('Transfer-Encoding', 'chunked'))
+        try:
+            writer.write(self._cabecera(200, encabezados, mantener and chunked))
+            while True:
+                datos = await self._ejecutar(next, fragmentos, None)
+                if datos is None:
+                    break
+                if not datos:
+                    continue
+                writer.write(b'%X\r\n%s\r\n' % (len(datos), datos) if chunked else datos)
+                await writer.drain()
+            if chunked:
+                writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        except Exception:
+            await self._ejecutar(fragmentos.close)
+            raise
+        if not chunked:
+            raise _CierreConexion(None)
+
+    def _nuevo_evento(self):
+        # Corre en el loop: despierta a todos los streams con un solo set()
+        aviso, self._aviso_eventos = self._aviso_eventos, asyncio.Event()
+        aviso.set()
+
+    async def _escribir_eventos(self, writer, respuesta):
+        """
+        Stream de eventos. Un suscriptor es solo una corrutina: los marcos
+        ya vienen serializados del canal y se comparten entre todos. Un
+        cliente lento queda atrás en el historial sin frenar a los demás.
+        """
+        encabezados = respuesta.encabezados
+        suscripcion = respuesta.suscripcion
+        writer.write(self._cabecera(200, encabezados, False))
+        writer.write(suscripcion.inicio())
+        await writer.drain()
+        while not self._deteniendo and not suscripcion.canal.cerrado:
+            aviso = self._aviso_eventos
+            datos = suscripcion.disponibles()
+            if not datos:
+                try:
+                    await asyncio.wait_for(aviso.wait(), INTERVALO_LATIDO)
+                    continue
+                except asyncio.TimeoutError:
+                    datos = LATIDO
+            writer.write(datos)
+            # Un cliente que no lee en TIMEOUT_PETICION se desconecta
+            await asyncio.wait_for(writer.drain(), TIMEOUT_PETICION)
+
+    async def _respuesta_simple(self, writer, status, mensaje):
+        cuerpo = f'{{"error":"{mensaje}"}}'.encode('utf-8')
+        writer.write(self._cabecera(status, [('Content-type', 'application/json'),
+                                             ('Access-Control-Allow-Origin', '*'),
+                                             ('Content-Length', str(len(cuerpo)))], False))
+        writer.write(cuerpo)
+        await writer.drain()
+
+    async def _conexion(self, reader, writer):
+        if len(self._conexiones) >= self.max_conexiones:
+            await self._respuesta_simple(writer, 503, "Servidor saturado")
+            writer.close()
+            return
+
+        tarea = asyncio.current_task()
+        self._conexiones.add(tarea)
+        atendidas = 0
+        try:
+            while True:
+                self._ociosas.add(tarea)
+                try:
+                    leida = await self._leer_peticion(reader)
+                except _CierreConexion as e:
+                    await self._respuesta_simple(writer, e.args[0], HTTPStatus(e.args[0]).phrase)
+                    break
+                finally:
+                    self._ociosas.discard(tarea)
+                if leida is None:
+                    break
+                peticion, version = leida
+                atendidas += 1
+                mantener = self._mantener_abierta(peticion, version, atendidas) and not self._deteniendo
+
+                if peticion.metodo == 'OPTIONS':
+                    respuesta = Respuesta(200, encabezados=[
+                        ('Access-Control-Allow-Origin', '*'),
+                        ('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS'),
+                        ('Access-Control-Allow-Headers', 'Content-Type')])
+                    mantener = mantener and not self._cuerpo_sin_leer(peticion)
+                    await self._escribir(writer, respuesta, version, mantener)
+                    if not mantener:
+                        break
+                    continue
+
+                if sin_bloqueo(peticion):
+                    # Suscribirse a los eventos no consulta la base: no espera hilo
+                    respuesta = self._atender(peticion)
+                    if isinstance(respuesta, RespuestaEventos):
+                        await self._escribir_eventos(writer, respuesta)
+                        break
+                    mantener = mantener and not self._cuerpo_sin_leer(peticion)
+                    await self._escribir(writer, respuesta, version, mantener)
+                    if not mantener:
+                        break
+                    continue
+
+                if self._en_cola >= self.max_en_cola:
+                    # Desprender carga antes de acumular más espera
+                    await self._respuesta_simple(writer, 503, "Servidor saturado")
+                    break
+
+                self._en_cola += 1
+                try:
+                    await self._hilos.acquire()
+                finally:
+                    self._en_cola -= 1
+                try:
+                    respuesta = await self._ejecutar(self._atender, peticion)
+                    mantener = mantener and not self._cuerpo_sin_leer(peticion)
+                    # Un stream conserva su cupo mientras lee de la base
+                    await self._escribir(writer, respuesta, version, mantener)
+                except _CierreConexion:
+                    break
+                finally:
+                    self._hilos.release()
+                if not mantener:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            logger.error(f"Error al atender la conexión: {e}")
+        finally:
+            self._conexiones.discard(tarea)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def servir(self):
+        self._hilos = asyncio.Semaphore(self.max_hilos)
+        self._servidor = await asyncio.start_server(self._conexion, host='', port=self.puerto,
+                                                    reuse_address=True, reuse_port=self.reuse_port,
+                                                    backlog=1024)
+        loop = asyncio.get_running_loop()
+        self._aviso_eventos = asyncio.Event()
+
+        def avisar():
+            # El canal publica desde los hilos del pool
+            loop.call_soon_threadsafe(self._nuevo_evento)
+
+        canal().agregar_aviso(avisar)
+        detener = asyncio.Event()
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(senal, detener.set)
+
+        async with self._servidor:
+            await detener.wait()
+            print("Deteniendo servidor, esperando peticiones en curso...")
+            self._deteniendo = True
+            self._nuevo_evento()
+            self._servidor.close()
+            # Las conexiones ociosas se cierran; las que están respondiendo
+            # terminan su respuesta y cierran
+            for tarea in list(self._ociosas):
+                tarea.cancel()
+            await asyncio.gather(*self._conexiones, return_exceptions=True)
+        canal().quitar_aviso(avisar)
+        self._executor.shutdown(wait=True)
+
+
+def ejecutar_async(port, max_hilos, max_conexiones=MAX_CONEXIONES):
+    asyncio.run(ServidorAsync(port, max_hilos, max_conexiones).servir())
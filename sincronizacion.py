@@ -0,0 +1,150 @@
+from db_connection import get_db_connection, close_db_connection
+from datetime import datetime, timedelta
+import logging
+
+from mysql.connector import Error
+
+logger = logging.getLogger(__name__)
+
+# Segundos hacia atrás que se vuelven a revisar en cada sincronización. Una
+# transacción puede confirmar filas con una marca de tiempo anterior a la de
+# otra que ya se entregó; si dura menos que este margen, sus cambios llegan
+# en la consulta siguiente. Las filas del margen pueden llegar dos veces.
+MARGEN_SINCRONIZACION = 5
+
+# Días que se conservan las eliminaciones. Un cliente con una marca más
+# antigua debe recargar el listado completo.
+RETENCION_ELIMINACIONES_DIAS = 30
+
+INICIO = datetime(1970, 1, 1)
+
+
+class MarcaVencida(Exception):
+    """
+    La marca es anterior a las eliminaciones conservadas
+    """
+
+
+def registrar_eliminaciones(cursor, recurso, ids):
+    """
+    Registra las filas eliminadas dentro de la transacción del llamador,
+    para que los clientes que sincronizan las quiten de su copia
+    """
+    cursor.executemany("""
+        INSERT INTO eliminaciones (recurso, id_registro) VALUES (%s, %s)
+    """, [(recurso, str(id_registro)) for id_registro in ids])
+
+
+def _corte(cursor):
+    cursor.execute("SELECT NOW(6) - INTERVAL %s SECOND AS corte", (MARGEN_SINCRONIZACION,))
+    fila = cursor.fetchone()
+    return fila['corte'] if isinstance(fila, dict) else fila[0]
+
+
+def marca_actual(cursor, id_minimo):
+    """
+    Marca desde la que un cliente que acaba de cargar un listado recibe
+    los cambios posteriores
+    """
+    corte = _corte(cursor)
+    return ((corte, id_minimo), (corte, 0))
+
+
+def leer_cambios(cursor, consulta, alias, columna_id, recurso, marca, limite, id_minimo):
+    """
+    Lee las filas modificadas y las eliminaciones posteriores a `marca`.
+    `consulta` es el SELECT ... FROM de las filas, con la tabla del recurso
+    como `alias`. `marca` es ((fecha, id) de filas, (fecha, id) de
+    eliminaciones), o None para empezar desde el principio. Retorna
+    (filas, ids eliminados, nueva marca, completo).
+    """
+    corte = _corte(cursor)
+    if marca is None:
+        # Un cliente sin copia no necesita las eliminaciones anteriores
+        marca = ((INICIO, id_minimo), (corte, 0))
+    elif marca[1][0] < corte - timedelta(days=RETENCION_ELIMINACIONES_DIAS):
+        raise MarcaVencida()
+    (fecha_filas, id_filas), (fecha_eliminaciones, id_eliminacion) = marca
+
+    cursor.execute(f"""
+        {consulta}
+        WHERE {alias}.actualizado_en > %s
+           OR ({alias}.actualizado_en = %s AND {alias}.{columna_id} > %s)
+        ORDER BY {alias}.actualizado_en, {alias}.{columna_id}
+        LIMIT %s
+    """, (fecha_filas, fecha_filas, id_filas, limite + 1))
+    filas = cursor.fetchall()
+
+    # Las eliminaciones de IDs que volvieron a existir ya llegan como filas
+    cursor.execute(f"""
+        SELECT e.id_eliminacion, e.id_registro, e.eliminado_en
+        FROM eliminaciones e
+        WHERE e.recurso = %s
+          AND (e.eliminado_en > %s OR (e.eliminado_en = %s AND e.id_eliminacion > %s))
+          AND NOT EXISTS (SELECT 1 FROM {recurso} t WHERE t.{columna_id} = e.id_registro)
+        ORDER BY e.eliminado_en, e.id_eliminacion
+        LIMIT %s
+    """, (recurso, fecha_eliminaciones, fecha_eliminaciones, id_eliminacion, limite + 1))
+    eliminaciones = cursor.fetchall()
+
+    filas, filas_completas = _pagina(filas, limite, corte, 'actualizado_en')
+    eliminaciones, eliminaciones_completas = _pagina(eliminaciones, limite, corte, 'eliminado_en')
+    completo = filas_completas and eliminaciones_completas
+
+    ultima_fila = (filas[-1]['actualizado_en'], filas[-1][columna_id]) if filas else None
+    ultima_eliminacion = None
+    if eliminaciones:
+        ultima_eliminacion = (eliminaciones[-1]['eliminado_en'], eliminaciones[-1]['id_eliminacion'])
+
+    nueva_marca = (_avanzar(marca[0], ultima_fila, corte, id_minimo),
+                   _avanzar(marca[1], ultima_eliminacion, corte, 0))
+    return filas, [e['id_registro'] for e in eliminaciones], nueva_marca, completo
+
+
+def _pagina(registros, limite, corte, columna_fecha):
+    """
+    Registros a entregar de los `limite` + 1 leídos y si no quedan más. Si
+    no caben todos, solo se entregan los anteriores al corte, para que la
+    marca avance en cada página. Si ninguno lo es, la página se da por
+    completa: el resto llega en una sincronización posterior, cuando ya
+    quede antes del corte, en lugar de pedir otra vez la misma página.
+    """
+    if len(registros) <= limite:
+        return registros, True
+    anteriores = [registro for registro in registros[:limite] if registro[columna_fecha] <= corte]
+    if anteriores:
+        return anteriores, False
+    return registros[:limite], True
+
+
+def _avanzar(marca, ultima, corte, id_minimo):
+    # La marca llega hasta la última fila entregada, pero no pasa del corte
+    if ultima is None:
+        return marca
+    nueva = ultima if ultima[0] <= corte else (corte, id_minimo)
+    return max(marca, nueva)
+
+
+def purgar_eliminaciones(dias=RETENCION_ELIMINACIONES_DIAS):
+    """
+    Elimina los registros de eliminaciones más antiguos que `dias`
+    """
+    connection = get_db_connection()
+    if connection is None:
+        return
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            DELETE FROM eliminaciones WHERE eliminado_en < NOW(6) - INTERVAL %s DAY
+        """, (dias,))
+        connection.commit()
+
+    except Error as e:
+        connection.rollback()
+        logger.error(f"Error al purgar las eliminaciones: {e}")
+
+    finally:
+        if connection:
+            cursor.close()
+            close_db_connection(connection)
@@ -0,0 +1,29 @@
+-- Contadores materializados del dashboard.
+-- api.py los mantiene de forma incremental en cada escritura y
+-- resumen.reconciliar() corrige cualquier desviación.
+
+CREATE TABLE IF NOT EXISTS resumen_canastillas (
+    ubicacion VARCHAR(100) NOT NULL,
+    estado VARCHAR(50) NOT NULL,
+    cantidad INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (ubicacion, estado)
+);
+
+CREATE TABLE IF NOT EXISTS resumen_movimientos_mes (
+    mes CHAR(7) NOT NULL,
+    movimientos INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (mes)
+);
+
+-- Carga inicial a partir de los datos existentes
+DELETE FROM resumen_canastillas;
+INSERT INTO resumen_canastillas (ubicacion, estado, cantidad)
+SELECT ubicacion, estado, COUNT(*)
+FROM canastillas
+GROUP BY ubicacion, estado;
+
+DELETE FROM resumen_movimientos_mes;
+INSERT INTO resumen_movimientos_mes (mes, movimientos)
+SELECT DATE_FORMAT(fecha_movimiento, '%Y-%m'), COUNT(*)
+FROM movimientos
+GROUP BY DATE_FORMAT(fecha_movimiento, '%Y-%m');
@@ -0,0 +1,15 @@
+-- Índices para la paginación por cursor y los filtros de GET /api/movimientos.
+-- Todos terminan en (fecha_movimiento, id_movimiento) para que el ORDER BY
+-- y la condición del cursor se resuelvan recorriendo el índice.
+
+CREATE INDEX idx_movimientos_fecha
+    ON movimientos (fecha_movimiento, id_movimiento);
+
+CREATE INDEX idx_movimientos_tipo_fecha
+    ON movimientos (tipo_movimiento, fecha_movimiento, id_movimiento);
+
+CREATE INDEX idx_movimientos_canastilla_fecha
+    ON movimientos (id_canastilla, fecha_movimiento, id_movimiento);
+
+CREATE INDEX idx_movimientos_usuario_fecha
+    ON movimientos (id_usuario_responsable, fecha_movimiento, id_movimiento);
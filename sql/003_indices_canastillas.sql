@@ -0,0 +1,14 @@
+-- Índices para los filtros y órdenes de GET /api/inventario.
+-- Terminan en id_canastilla, que desempata el cursor de paginación.
+
+CREATE INDEX idx_canastillas_estado
+    ON canastillas (estado, id_canastilla);
+
+CREATE INDEX idx_canastillas_ubicacion
+    ON canastillas (ubicacion, id_canastilla);
+
+CREATE INDEX idx_canastillas_ubicacion_estado
+    ON canastillas (ubicacion, estado, id_canastilla);
+
+CREATE INDEX idx_canastillas_fecha
+    ON canastillas (fecha_ultimo_movimiento, id_canastilla);
@@ -0,0 +1,14 @@
+-- Versión de cada recurso para los ETag de la API.
+-- Cada escritura incrementa la versión de los recursos que modifica dentro
+-- de su transacción; una petición condicional solo necesita leer esta tabla.
+
+CREATE TABLE IF NOT EXISTS versiones_recursos (
+    recurso VARCHAR(30) NOT NULL,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY (recurso)
+);
+
+INSERT IGNORE INTO versiones_recursos (recurso, version) VALUES
+    ('canastillas', 0),
+    ('movimientos', 0),
+    ('usuarios', 0);
@@ -0,0 +1,11 @@
+-- Historial de una canastilla (GET /api/canastilla/<id>/movimientos).
+-- Reemplaza idx_movimientos_canastilla_fecha por un índice que además
+-- incluye las columnas del listado: la página se lee del índice, en orden,
+-- sin buscar cada fila en la tabla. El filtro id_canastilla de
+-- GET /api/movimientos usa el mismo prefijo.
+
+ALTER TABLE movimientos
+    ADD INDEX idx_movimientos_canastilla_historial
+        (id_canastilla, fecha_movimiento, id_movimiento,
+         tipo_movimiento, ubicacion_origen, ubicacion_destino, id_usuario_responsable),
+    DROP INDEX idx_movimientos_canastilla_fecha;
@@ -0,0 +1,8 @@
+-- Email único en usuarios. add_usuario y update_usuario ya no consultan
+-- antes de escribir: el índice rechaza el email repetido (error 1062) y
+-- la API responde 400. Si la tabla tiene duplicados, este índice no se
+-- crea hasta resolverlos:
+--   SELECT email, COUNT(*) FROM usuarios GROUP BY email HAVING COUNT(*) > 1;
+
+CREATE UNIQUE INDEX idx_usuarios_email
+    ON usuarios (email);
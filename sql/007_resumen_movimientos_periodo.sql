@@ -0,0 +1,35 @@
+-- Conteos de movimientos por hora y por día, por tipo y por ubicación de
+-- origen y destino. api.py los mantiene en cada escritura y la tendencia
+-- del dashboard (/api/dashboard/tendencia) solo lee esta tabla, así un
+-- rango de dos años cuesta según el número de días y no de movimientos.
+-- Las dos granularidades comparten tabla para escribirlas en una sola
+-- sentencia. Los conteos por hora se conservan 90 días
+-- (resumen.purgar_conteos_hora).
+
+CREATE TABLE IF NOT EXISTS resumen_movimientos_periodo (
+    granularidad VARCHAR(4) NOT NULL,  -- 'hora' o 'dia'
+    inicio DATETIME NOT NULL,          -- comienzo de la hora o del día
+    tipo_movimiento VARCHAR(20) NOT NULL,
+    ubicacion_origen VARCHAR(100) NOT NULL,
+    ubicacion_destino VARCHAR(100) NOT NULL,
+    movimientos INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularidad, inicio, tipo_movimiento, ubicacion_origen, ubicacion_destino)
+);
+
+-- Carga inicial a partir de los datos existentes; volver a ejecutarla
+-- reconstruye la tabla
+DELETE FROM resumen_movimientos_periodo;
+INSERT INTO resumen_movimientos_periodo
+    (granularidad, inicio, tipo_movimiento, ubicacion_origen, ubicacion_destino, movimientos)
+SELECT 'hora', DATE_FORMAT(fecha_movimiento, '%Y-%m-%d %H:00:00'),
+       tipo_movimiento, ubicacion_origen, ubicacion_destino, COUNT(*)
+FROM movimientos
+WHERE fecha_movimiento >= NOW() - INTERVAL 90 DAY
+GROUP BY DATE_FORMAT(fecha_movimiento, '%Y-%m-%d %H:00:00'), tipo_movimiento, ubicacion_origen, ubicacion_destino;
+
+INSERT INTO resumen_movimientos_periodo
+    (granularidad, inicio, tipo_movimiento, ubicacion_origen, ubicacion_destino, movimientos)
+SELECT 'dia', DATE(fecha_movimiento),
+       tipo_movimiento, ubicacion_origen, ubicacion_destino, COUNT(*)
+FROM movimientos
+GROUP BY DATE(fecha_movimiento), tipo_movimiento, ubicacion_origen, ubicacion_destino;
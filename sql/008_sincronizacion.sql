@@ -0,0 +1,31 @@
+-- Sincronización por cambios (?since_ts= en /api/movimientos y
+-- ?changed_since= en /api/inventario y /api/usuarios).
+-- actualizado_en cambia en cada INSERT y UPDATE que modifica la fila; el
+-- índice termina en el ID, que desempata la marca del cliente. Las
+-- eliminaciones se registran en la misma transacción del DELETE y se
+-- conservan 30 días (sincronizacion.purgar_eliminaciones).
+
+ALTER TABLE movimientos
+    ADD COLUMN actualizado_en DATETIME(6) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_movimientos_actualizado (actualizado_en, id_movimiento);
+
+ALTER TABLE canastillas
+    ADD COLUMN actualizado_en DATETIME(6) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_canastillas_actualizado (actualizado_en, id_canastilla);
+
+ALTER TABLE usuarios
+    ADD COLUMN actualizado_en DATETIME(6) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_usuarios_actualizado (actualizado_en, id_usuario);
+
+CREATE TABLE IF NOT EXISTS eliminaciones (
+    id_eliminacion BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+    recurso VARCHAR(30) NOT NULL,      -- tabla de la fila eliminada
+    id_registro VARCHAR(50) NOT NULL,  -- ID de la fila eliminada
+    eliminado_en DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    PRIMARY KEY (id_eliminacion),
+    INDEX idx_eliminaciones_recurso (recurso, eliminado_en, id_eliminacion),
+    INDEX idx_eliminaciones_fecha (eliminado_en)
+);
@@ -0,0 +1,150 @@
+from unittest import mock
+
+import pytest
+
+import cache
+import versiones
+from cache import CacheLRU, cacheado, invalidar, limpiar_cache
+from db_connection import PRIMARIA, fijar_requisito_lectura, restablecer_requisito_lectura
+from versiones import iniciar_peticion, terminar_peticion
+
+
+class _Versiones:
+    def __init__(self):
+        self.actuales = {'canastillas': 1, 'movimientos': 1, 'usuarios': 1}
+        self.lecturas = 0
+
+    def __call__(self, *recursos):
+        self.lecturas += 1
+        return {recurso: self.actuales[recurso] for recurso in recursos}
+
+
+@pytest.fixture
+def base():
+    leer = _Versiones()
+    limpiar_cache()
+    token_requisito = fijar_requisito_lectura(None)
+    with mock.patch.object(versiones, 'leer_versiones', leer):
+        yield leer
+    restablecer_requisito_lectura(token_requisito)
+    limpiar_cache()
+
+
+def _peticion(funcion, *args):
+    token = iniciar_peticion()
+    try:
+        return funcion(*args)
+    finally:
+        terminar_peticion(token)
+
+
+def _contador():
+    consultas = []
+
+    @cacheado(60, lambda valor: (f'prueba:{valor}',), ('movimientos',))
+    def consultar(valor):
+        consultas.append(valor)
+        return {"valor": valor, "consulta": len(consultas)}, 200
+
+    return consultar, consultas
+
+
+def test_acierto_sin_consulta_ni_lectura_de_versiones(base):
+    consultar, consultas = _contador()
+    primera = _peticion(consultar, 'a')
+    assert _peticion(consultar, 'a') == primera
+    assert consultas == ['a']
+    assert base.lecturas == 1
+
+
+def test_argumentos_distintos_fallan(base):
+    consultar, consultas = _contador()
+    _peticion(consultar, 'a')
+    _peticion(consultar, 'b')
+    assert consultas == ['a', 'b']
+
+
+def test_invalidar_por_etiqueta(base):
+    consultar, consultas = _contador()
+    _peticion(consultar, 'a')
+    invalidar('prueba:a')
+    _peticion(consultar, 'a')
+    assert consultas == ['a', 'a']
+
+
+def test_version_distinta_no_se_entrega(base):
+    consultar, consultas = _contador()
+    _peticion(consultar, 'a')
+    # Escritura de otro proceso: la caché local no se invalida
+    base.actuales['movimientos'] = 2
+    versiones.olvidar_versiones()
+    _, status = _peticion(consultar, 'a')
+    assert status == 200
+    assert consultas == ['a', 'a']
+    assert cache.get_cache_stats()['obsoletas'] == 1
+
+
+def test_version_de_otro_recurso_no_afecta(base):
+    consultar, consultas = _contador()
+    _peticion(consultar, 'a')
+    base.actuales['usuarios'] = 2
+    versiones.olvidar_versiones()
+    _peticion(consultar, 'a')
+    assert consultas == ['a']
+
+
+def test_sin_versiones_consulta_sin_cache(base):
+    consultar, consultas = _contador()
+    with mock.patch.object(versiones, 'leer_versiones', return_value=None):
+        _peticion(consultar, 'a')
+        _peticion(consultar, 'a')
+    assert consultas == ['a', 'a']
+
+
+def test_errores_no_se_guardan(base):
+    respuestas = iter([({"error": "x"}, 500), ({"ok": True}, 200)])
+
+    @cacheado(60, lambda: (), ('movimientos',))
+    def consultar():
+        return next(respuestas)
+
+    assert _peticion(consultar)[1] == 500
+    assert _peticion(consultar)[1] == 200
+
+
+def test_requisito_mas_nuevo_consulta_sin_cache(base):
+    consultar, consultas = _contador()
+    _peticion(consultar, 'a')
+    token = fijar_requisito_lectura({'movimientos': 5})
+    try:
+        _peticion(consultar, 'a')
+    finally:
+        restablecer_requisito_lectura(token)
+    assert consultas == ['a', 'a']
+
+
+def test_primaria_consulta_sin_cache(base):
+    consultar, consultas = _contador()
+    _peticion(consultar, 'a')
+    token = fijar_requisito_lectura(PRIMARIA)
+    try:
+        _peticion(consultar, 'a')
+    finally:
+        restablecer_requisito_lectura(token)
+    assert consultas == ['a', 'a']
+
+
+def test_lru_expulsa_la_menos_usada():
+    lru = CacheLRU(max_bytes=10 ** 6)
+    lru.guardar('a', 'x' * 300000, 60)
+    lru.guardar('b', 'x' * 300000, 60)
+    lru.obtener('a')
+    lru.guardar('c', 'x' * 500000, 60)
+    assert lru.obtener('a')[0]
+    assert not lru.obtener('b')[0]
+
+
+def test_entrada_vencida():
+    lru = CacheLRU()
+    lru.guardar('a', 1, -1)
+    assert lru.obtener('a') == (False, None)
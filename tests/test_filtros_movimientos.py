@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+
+import api
+from api import ParametroInvalido, _filtros_movimientos
+
+
+def test_sin_filtros():
+    assert _filtros_movimientos(None, None, None, None, None) == ([], [])
+
+
+def test_hasta_incluye_el_dia_completo():
+    condiciones, parametros = _filtros_movimientos(None, '2026-01-01', '2026-01-31', None, None)
+    assert condiciones == ["m.fecha_movimiento >= %s", "m.fecha_movimiento < %s"]
+    assert parametros == [datetime(2026, 1, 1), datetime(2026, 2, 1)]
+
+
+def test_hasta_en_el_ultimo_dia_admitido_no_limita():
+    condiciones, parametros = _filtros_movimientos(None, '2026-01-01', '9999-12-31', None, None)
+    assert condiciones == ["m.fecha_movimiento >= %s"]
+    assert parametros == [datetime(2026, 1, 1)]
+
+
+def test_todos_los_filtros_en_orden():
+    condiciones, parametros = _filtros_movimientos('entrada', None, None, 'C-1', '7')
+    assert condiciones == ["m.tipo_movimiento = %s", "m.id_canastilla = %s", "m.id_usuario_responsable = %s"]
+    assert parametros == ['entrada', 'C-1', 7]
+
+
+@pytest.mark.parametrize('argumentos', [
+    (None, '2026-13-01', None, None, None),
+    (None, None, '31/01/2026', None, None),
+    (None, None, None, None, 'siete'),
+])
+def test_parametros_invalidos(argumentos):
+    with pytest.raises(ParametroInvalido):
+        _filtros_movimientos(*argumentos)
+
+
+def test_get_movimientos_fecha_invalida_responde_400():
+    data, status = api.get_movimientos(hasta='2026-02-30')
+    assert status == 400
+    assert 'error' in data
@@ -0,0 +1,73 @@
+from unittest import mock
+
+import pytest
+
+import api
+from viajes import _Conexion, _lote_movimientos
+
+
+@pytest.fixture
+def eventos():
+    publicados = []
+    with mock.patch.object(api, 'publicar', lambda tipo, datos: publicados.append((tipo, datos))), \
+            mock.patch.object(api, 'invalidar'):
+        yield publicados
+
+
+def _ejecutar(funcion, movimientos, filas):
+    conexion = _Conexion(filas)
+    with mock.patch.object(api, 'get_db_connection', return_value=conexion), \
+            mock.patch.object(api, 'close_db_connection'):
+        return funcion(movimientos), conexion.sentencias
+
+
+def test_lote_valida_y_resume_en_un_evento(eventos):
+    movimientos, filas = _lote_movimientos(cantidad=20, canastillas=4)
+    movimientos.append({"id_canastilla": 'C1'})
+    (data, status), sentencias = _ejecutar(api.add_movimientos_lote, movimientos, filas)
+    assert status == 200
+    assert data['registrados'] == 20
+    assert data['rechazados'] == 1
+    assert data['resultados'][-1] == {"indice": 20, "status": 400, "error": "Datos incompletos"}
+    assert [tipo for tipo, _ in eventos] == ['movimientos_lote']
+    assert eventos[0][1]['cantidad'] == 20
+    assert sentencias[-1] == 'COMMIT'
+
+
+def test_canastilla_inexistente_se_rechaza(eventos):
+    movimientos, filas = _lote_movimientos(cantidad=2, canastillas=2)
+    movimientos[1]['id_canastilla'] = 'X'
+    (data, status), _ = _ejecutar(api.add_movimientos_lote, movimientos, filas)
+    assert status == 200
+    assert data['registrados'] == 1
+    assert data['resultados'][1]['status'] == 400
+
+
+def test_fallo_tras_el_commit_no_cambia_la_respuesta(eventos):
+    movimientos, filas = _lote_movimientos(cantidad=3, canastillas=3)
+    with mock.patch.object(api, 'invalidar', side_effect=RuntimeError("fallo simulado")):
+        respuestas, sentencias = _ejecutar(api.add_movimientos_agrupados, movimientos, filas)
+    assert [status for _, status in respuestas] == [201, 201, 201]
+    # Sin reintento uno por uno: un solo INSERT de movimientos y un commit
+    assert sum(sentencia.startswith('INSERT INTO movimientos') for sentencia in sentencias) == 1
+    assert sentencias.count('COMMIT') == 1
+
+
+def test_agrupados_publican_un_evento_por_movimiento_con_su_id(eventos):
+    movimientos, filas = _lote_movimientos(cantidad=3, canastillas=3)
+    # IDs no consecutivos, como con innodb_autoinc_lock_mode = 2
+    filas.append([(31,), (17,), (12,)])
+    respuestas, _ = _ejecutar(api.add_movimientos_agrupados, movimientos, filas)
+    assert [status for _, status in respuestas] == [201, 201, 201]
+    assert [tipo for tipo, _ in eventos] == ['movimiento'] * 3
+    assert [datos['movimiento']['id_movimiento'] for _, datos in eventos] == [12, 17, 31]
+    assert [datos['movimiento']['id_canastilla'] for _, datos in eventos] == ['C0', 'C1', 'C2']
+    assert all(datos['conteos']['por_ubicacion'] == {'A': -1, 'B': 1} for _, datos in eventos)
+
+
+def test_agrupados_sin_todos_los_ids_publican_el_resumen(eventos):
+    movimientos, filas = _lote_movimientos(cantidad=3, canastillas=3)
+    filas.append([(17,)])
+    respuestas, _ = _ejecutar(api.add_movimientos_agrupados, movimientos, filas)
+    assert [status for _, status in respuestas] == [201, 201, 201]
+    assert [tipo for tipo, _ in eventos] == ['movimientos_lote']
@@ -0,0 +1,91 @@
+from datetime import date, datetime
+from unittest import mock
+
+import pytest
+
+import api
+from api import ParametroInvalido, _codificar_cursor, _condicion_cursor_orden, _decodificar_cursor
+from viajes import _Conexion, _Cursor
+
+
+class _CursorRegistrado(_Cursor):
+    def execute(self, sql, parametros=()):
+        self._conexion.consultas.append((' '.join(sql.split()), list(parametros)))
+        super().execute(sql, parametros)
+
+
+class _ConexionRegistrada(_Conexion):
+    def __init__(self, filas):
+        super().__init__(filas)
+        self.consultas = []
+
+    def cursor(self, dictionary=False):
+        return _CursorRegistrado(self)
+
+
+@pytest.mark.parametrize('valores, esperados', [
+    (['C-001'], ['C-001']),
+    ([datetime(2026, 1, 2, 3, 4, 5, 6), 17], ['2026-01-02 03:04:05.000006', 17]),
+    ([date(2026, 1, 2), 'C-9'], ['2026-01-02', 'C-9']),
+    ([None, 'C-9'], [None, 'C-9']),
+])
+def test_cursor_ida_y_vuelta(valores, esperados):
+    token = _codificar_cursor(valores)
+    assert token.isascii() and '/' not in token and '+' not in token
+    assert _decodificar_cursor(token, len(valores)) == esperados
+
+
+@pytest.mark.parametrize('token', ['no es base64!', _codificar_cursor(['a']), 'e30='])
+def test_cursor_invalido(token):
+    with pytest.raises(ParametroInvalido):
+        _decodificar_cursor(token, 2)
+
+
+def test_condicion_desc_con_valor_incluye_los_null():
+    condicion, parametros = _condicion_cursor_orden('c.fecha', 'DESC', '2026-01-01', 'C-5')
+    assert 'c.fecha IS NULL' in condicion
+    assert parametros == ['2026-01-01', '2026-01-01', 'C-5']
+
+
+def test_condicion_desc_desde_un_null():
+    assert _condicion_cursor_orden('c.fecha', 'DESC', None, 'C-5') == \
+        ("(c.fecha IS NULL AND c.id_canastilla < %s)", ['C-5'])
+
+
+def test_condicion_asc_desde_un_null_sigue_con_los_valores():
+    condicion, parametros = _condicion_cursor_orden('c.estado', 'ASC', None, 'C-5')
+    assert 'c.estado IS NOT NULL' in condicion
+    assert parametros == ['C-5']
+
+
+def _pagina(filas, **parametros):
+    conexion = _ConexionRegistrada([filas])
+    with mock.patch.object(api, 'get_db_connection', return_value=conexion), \
+            mock.patch.object(api, 'close_db_connection'):
+        data, status = api.get_inventario.sin_cache(**parametros)
+    return data, status, conexion
+
+
+def _fila(id_canastilla, fecha):
+    return {'seccion': 'fila', 'id_canastilla': id_canastilla, 'estado': 'Disponible', 'ubicacion': 'A',
+            'usuario_asignado': None, 'fecha_ultimo_movimiento': fecha, 'cantidad': None}
+
+
+def test_inventario_pagina_despues_de_un_null():
+    filas = [_fila('C-3', datetime(2026, 1, 1)), _fila('C-2', None), _fila('C-1', None)]
+    data, status, _ = _pagina(filas, orden='fecha_ultimo_movimiento', cursor_pagina=_codificar_cursor(['2026-02-01', 'C-9']),
+                              limite=2)
+    assert status == 200
+    assert [fila['id_canastilla'] for fila in data['data']] == ['C-3', 'C-2']
+    assert _decodificar_cursor(data['siguiente_cursor'], 2) == [None, 'C-2']
+
+    _, status, conexion = _pagina([], orden='fecha_ultimo_movimiento', cursor_pagina=data['siguiente_cursor'], limite=2)
+    assert status == 200
+    sql, parametros = conexion.consultas[0]
+    assert 'WHERE (c.fecha_ultimo_movimiento IS NULL AND c.id_canastilla < %s)' in sql
+    assert parametros == ['C-2', 3]
+
+
+def test_inventario_orden_invalido():
+    data, status, _ = _pagina([], orden='precio')
+    assert status == 400
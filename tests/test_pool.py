@@ -0,0 +1,126 @@
+from unittest import mock
+
+import pytest
+from mysql.connector import Error
+
+import db_connection
+from db_connection import PoolConexiones
+
+
+class _ConexionFalsa:
+    def __init__(self, pool=None):
+        self.pool = pool
+        self.in_transaction = False
+        self.cerrada = False
+        self.cerrada_con_lock = None
+        self.ping_falla = False
+        self.rollback_falla = False
+
+    def ping(self, reconnect=False):
+        if self.ping_falla:
+            raise Error("conexión perdida")
+
+    def rollback(self):
+        if self.rollback_falla:
+            raise Error("conexión perdida")
+        self.in_transaction = False
+
+    def close(self):
+        self.cerrada = True
+        if self.pool is not None:
+            # Cerrar no debe ocurrir con el lock del pool tomado
+            libre = self.pool._condicion.acquire(blocking=False)
+            if libre:
+                self.pool._condicion.release()
+            self.cerrada_con_lock = not libre
+
+
+@pytest.fixture
+def conexiones():
+    creadas = []
+
+    def conectar(**config):
+        conexion = _ConexionFalsa()
+        creadas.append(conexion)
+        return conexion
+
+    with mock.patch('mysql.connector.connect', side_effect=conectar):
+        yield creadas
+
+
+def _pool(**opciones):
+    return PoolConexiones({}, **dict({'minimo': 0, 'maximo': 2, 'timeout_espera': 0.05}, **opciones))
+
+
+def test_reutiliza_la_conexion_devuelta(conexiones):
+    pool = _pool()
+    conexion = pool.obtener()
+    pool.devolver(conexion)
+    assert pool.obtener() is conexion
+    assert len(conexiones) == 1
+
+
+def test_timeout_con_el_pool_agotado(conexiones):
+    pool = _pool(maximo=1)
+    assert pool.obtener() is not None
+    assert pool.obtener() is None
+    assert pool.estadisticas()['timeouts'] == 1
+
+
+def test_devolver_deshace_la_transaccion_abierta(conexiones):
+    pool = _pool()
+    conexion = pool.obtener()
+    conexion.in_transaction = True
+    pool.devolver(conexion)
+    assert not conexion.in_transaction
+    assert pool.estadisticas()['inactivas'] == 1
+
+
+def test_conexion_caida_se_descarta_fuera_del_lock(conexiones):
+    pool = _pool()
+    conexion = pool.obtener()
+    conexion.pool = pool
+    conexion.in_transaction = True
+    conexion.rollback_falla = True
+    pool.devolver(conexion)
+    assert conexion.cerrada and conexion.cerrada_con_lock is False
+    assert pool.estadisticas()['descartadas'] == 1
+
+
+def test_inactiva_invalida_se_reemplaza(conexiones):
+    pool = _pool(intervalo_verificacion=0)
+    conexion = pool.obtener()
+    conexion.pool = pool
+    pool.devolver(conexion)
+    conexion.ping_falla = True
+    nueva = pool.obtener()
+    assert nueva is not conexion
+    assert conexion.cerrada and conexion.cerrada_con_lock is False
+
+
+def test_desalojo_de_inactivas_fuera_del_lock(conexiones):
+    pool = _pool(tiempo_inactividad=0)
+    primera = pool.obtener()
+    segunda = pool.obtener()
+    for conexion in (primera, segunda):
+        conexion.pool = pool
+    pool.devolver(primera)
+    pool.devolver(segunda)
+    pool.obtener()
+    assert primera.cerrada and primera.cerrada_con_lock is False
+
+
+def test_pool_nuevo_tras_el_fork_sin_cerrar_las_heredadas(conexiones):
+    with mock.patch.object(db_connection, '_pool', None), mock.patch.object(db_connection, '_pid_pool', None):
+        padre = db_connection._obtener_pool()
+        heredada = padre.obtener()
+        assert db_connection._obtener_pool() is padre
+        with mock.patch('os.getpid', return_value=-1):
+            hijo = db_connection._obtener_pool()
+        assert hijo is not padre
+        assert not heredada.cerrada
+
+
+def test_tamano_invalido():
+    with pytest.raises(ValueError):
+        PoolConexiones({}, minimo=3, maximo=2)
@@ -0,0 +1,130 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+import db_connection
+import versiones
+from db_connection import (PRIMARIA, Replica, cumple_requisito_lectura, exigir_versiones, fijar_requisito_lectura,
+                           restablecer_requisito_lectura, versiones_replicas)
+
+
+class _PoolFalso:
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.entregas = 0
+
+    def obtener(self):
+        self.entregas += 1
+        return self.nombre
+
+    def estadisticas(self):
+        return {'en_uso': 0}
+
+
+def _replica(nombre, versiones_replica, retraso=0.1):
+    replica = Replica(nombre, _PoolFalso(nombre))
+    replica.versiones = versiones_replica
+    replica.retraso = retraso
+    return replica
+
+
+@pytest.fixture
+def replicas():
+    lista = [
+        _replica('r1', {'canastillas': 5, 'movimientos': 9, 'usuarios': 2}),
+        _replica('r2', {'canastillas': 4, 'movimientos': 9, 'usuarios': 2}),
+        _replica('r3', {'canastillas': 9, 'movimientos': 9, 'usuarios': 9}, retraso=None),
+    ]
+    monitor = SimpleNamespace(replicas=lista)
+    with mock.patch.object(db_connection, 'DB_REPLICAS', ['r1', 'r2', 'r3']), \
+            mock.patch.object(db_connection, '_obtener_monitor', return_value=monitor):
+        yield lista
+
+
+@pytest.fixture
+def requisito():
+    tokens = []
+
+    def fijar(valor):
+        tokens.append(fijar_requisito_lectura(valor))
+
+    fijar(None)
+    yield fijar
+    for token in reversed(tokens):
+        restablecer_requisito_lectura(token)
+
+
+def test_exigir_versiones_combina_el_maximo(requisito):
+    requisito({'canastillas': 3, 'usuarios': 7})
+    exigir_versiones({'canastillas': 5, 'usuarios': 1})
+    assert db_connection._requisito_lectura.get() == {'canastillas': 5, 'usuarios': 7}
+
+
+def test_exigir_versiones_no_cambia_primaria(requisito):
+    requisito(PRIMARIA)
+    exigir_versiones({'canastillas': 5})
+    assert db_connection._requisito_lectura.get() == PRIMARIA
+
+
+def test_cumple_requisito_solo_con_los_recursos_dados(requisito):
+    requisito({'canastillas': 5, 'usuarios': 7})
+    assert cumple_requisito_lectura({'canastillas': 5})
+    assert not cumple_requisito_lectura({'canastillas': 4})
+    requisito(PRIMARIA)
+    assert not cumple_requisito_lectura({'canastillas': 5})
+
+
+def test_versiones_replicas_minimo_de_las_elegibles(replicas, requisito):
+    assert versiones_replicas() == {'canastillas': 4, 'movimientos': 9, 'usuarios': 2}
+
+
+def test_versiones_replicas_con_token(replicas, requisito):
+    requisito({'canastillas': 5})
+    assert versiones_replicas() == {'canastillas': 5, 'movimientos': 9, 'usuarios': 2}
+    requisito({'canastillas': 6})
+    assert versiones_replicas() is None
+
+
+def test_lectura_va_a_una_replica_que_cumple(replicas, requisito):
+    requisito({'canastillas': 5})
+    with mock.patch.object(db_connection, '_leer_versiones') as leer:
+        assert db_connection.get_db_connection(lectura=True) == 'r1'
+    leer.assert_not_called()
+    assert replicas[0].lecturas == 1
+
+
+def test_sin_replica_que_cumpla_va_a_la_primaria(replicas, requisito):
+    requisito({'canastillas': 6})
+    primaria = _PoolFalso('primaria')
+    antes = db_connection._lecturas_primaria
+    with mock.patch.object(db_connection, '_leer_versiones') as leer, \
+            mock.patch.object(db_connection, '_obtener_pool', return_value=primaria):
+        assert db_connection.get_db_connection(lectura=True) == 'primaria'
+    leer.assert_not_called()
+    assert db_connection._lecturas_primaria == antes + 1
+
+
+def test_versiones_de_la_peticion_sin_viaje_con_replicas(replicas, requisito):
+    versiones.olvidar_versiones()
+    token = versiones.iniciar_peticion()
+    try:
+        with mock.patch.object(versiones, 'leer_versiones') as leer:
+            assert versiones.versiones_vigentes('canastillas') == {'canastillas': 4}
+        leer.assert_not_called()
+    finally:
+        versiones.terminar_peticion(token)
+        versiones.olvidar_versiones()
+
+
+def test_versiones_recordadas_no_sirven_a_un_token_mas_nuevo(replicas, requisito):
+    versiones.olvidar_versiones()
+    versiones.versiones_vigentes('canastillas')
+    requisito({'canastillas': 7})
+    leidas = {'canastillas': 7, 'movimientos': 9, 'usuarios': 2}
+    try:
+        with mock.patch.object(versiones, 'leer_versiones', return_value=leidas) as leer:
+            assert versiones.versiones_vigentes('canastillas') == {'canastillas': 7}
+        leer.assert_called_once()
+    finally:
+        versiones.olvidar_versiones()
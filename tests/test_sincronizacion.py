@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from api import ParametroInvalido, _codificar_cursor, _leer_marca
+from sincronizacion import _avanzar, _pagina, leer_cambios
+
+
+@pytest.mark.parametrize('valor', [None, '', '0'])
+def test_marca_vacia_recibe_todo(valor):
+    assert _leer_marca(valor, 0) is None
+
+
+def test_marca_ahora():
+    assert _leer_marca('ahora', 0) == 'ahora'
+
+
+def test_marca_con_fecha_iso():
+    fecha = datetime(2026, 1, 1, 8, 30)
+    assert _leer_marca('2026-01-01T08:30:00', '') == ((fecha, ''), (fecha, 0))
+
+
+@pytest.mark.parametrize('valor', ['2026-01-01T00:00:00Z', '2026-01-01T00:00:00+02:00'])
+def test_marca_con_zona_horaria(valor):
+    with pytest.raises(ParametroInvalido):
+        _leer_marca(valor, 0)
+
+
+def test_marca_de_la_consulta_anterior():
+    filas = datetime(2026, 1, 2, 3, 4, 5, 678901)
+    eliminaciones = datetime(2026, 1, 2, 3, 4, 0)
+    marca = _codificar_cursor([filas, 'C-9', eliminaciones, 12])
+    assert _leer_marca(marca, '') == ((filas, 'C-9'), (eliminaciones, 12))
+
+
+@pytest.mark.parametrize('valor', ['basura', _codificar_cursor(['x', 1, 'y', 2]), _codificar_cursor([1, 2])])
+def test_marca_invalida(valor):
+    with pytest.raises(ParametroInvalido):
+        _leer_marca(valor, 0)
+
+
+CORTE = datetime(2026, 1, 1, 12, 0, 0)
+
+
+class _CursorFalso:
+    """
+    Responde con las filas preparadas, en el orden de las consultas
+    """
+
+    def __init__(self, *resultados):
+        self.resultados = list(resultados)
+
+    def execute(self, sql, parametros=None):
+        self.actual = self.resultados.pop(0)
+
+    def fetchone(self):
+        return self.actual[0]
+
+    def fetchall(self):
+        return self.actual
+
+
+def _filas(*segundos):
+    return [{'actualizado_en': CORTE + timedelta(seconds=s), 'id_movimiento': i + 1} for i, s in enumerate(segundos)]
+
+
+def test_avanzar_hasta_la_ultima_fila():
+    assert _avanzar((CORTE - timedelta(hours=1), 0), (CORTE - timedelta(seconds=1), 7), CORTE, 0) == \
+        (CORTE - timedelta(seconds=1), 7)
+
+
+def test_avanzar_no_pasa_del_corte():
+    assert _avanzar((CORTE - timedelta(hours=1), 0), (CORTE + timedelta(seconds=1), 7), CORTE, 0) == (CORTE, 0)
+
+
+def test_avanzar_sin_filas_ni_retroceso():
+    marca = (CORTE, 5)
+    assert _avanzar(marca, None, CORTE, 0) == marca
+    assert _avanzar(marca, (CORTE - timedelta(seconds=1), 9), CORTE, 0) == marca
+
+
+def test_pagina_completa_incluye_filas_del_margen():
+    filas = _filas(-2, 1)
+    assert _pagina(filas, 2, CORTE, 'actualizado_en') == (filas, True)
+
+
+def test_pagina_llena_se_corta_en_el_corte():
+    filas = _filas(-2, -1, 1, 2)
+    assert _pagina(filas, 3, CORTE, 'actualizado_en') == (filas[:2], False)
+
+
+def test_pagina_llena_dentro_del_margen_se_da_por_completa():
+    filas = _filas(1, 2, 3)
+    assert _pagina(filas, 2, CORTE, 'actualizado_en') == (filas[:2], True)
+
+
+def test_leer_cambios_avanza_en_cada_pagina():
+    marca = ((CORTE - timedelta(hours=1), 0), (CORTE, 0))
+    filas = _filas(-3, -2, 1, 2)
+    cursor = _CursorFalso([(CORTE,)], filas, [])
+    entregadas, eliminados, nueva_marca, completo = leer_cambios(
+        cursor, 'SELECT * FROM movimientos m', 'm', 'id_movimiento', 'movimientos', marca, 3, 0)
+    assert entregadas == filas[:2]
+    assert eliminados == []
+    assert not completo
+    assert nueva_marca[0] == (filas[1]['actualizado_en'], 2)
+
+
+def test_leer_cambios_rafaga_dentro_del_margen_termina():
+    marca = ((CORTE, 0), (CORTE, 0))
+    cursor = _CursorFalso([(CORTE,)], _filas(1, 2, 3), [])
+    entregadas, _, nueva_marca, completo = leer_cambios(
+        cursor, 'SELECT * FROM movimientos m', 'm', 'id_movimiento', 'movimientos', marca, 2, 0)
+    assert len(entregadas) == 2
+    assert completo
+    assert nueva_marca == marca
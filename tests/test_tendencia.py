@@ -0,0 +1,50 @@
+from datetime import datetime
+
+import pytest
+
+import api
+from api import ParametroInvalido, _rango_tendencia
+
+AHORA = datetime(2026, 3, 15, 10, 30)
+
+
+def test_rango_por_meses_alineado_al_mes():
+    inicio, fin = _rango_tendencia('6m', None, None, 'mes', AHORA)
+    assert inicio == datetime(2025, 9, 1)
+    assert fin == datetime(2026, 4, 1)
+
+
+def test_desde_hasta_incluye_el_dia_hasta():
+    inicio, fin = _rango_tendencia(None, '2026-01-01', '2026-01-31', 'dia', AHORA)
+    assert inicio == datetime(2026, 1, 1)
+    assert fin == datetime(2026, 2, 1)
+
+
+@pytest.mark.parametrize('rango', ['9999a', '2026a'])
+def test_rango_antes_del_anio_1(rango):
+    with pytest.raises(ParametroInvalido):
+        _rango_tendencia(rango, None, None, 'mes', AHORA)
+
+
+@pytest.mark.parametrize('granularidad', ['dia', 'anio'])
+def test_hasta_en_el_ultimo_dia_admitido(granularidad):
+    with pytest.raises(ParametroInvalido):
+        _rango_tendencia(None, None, '9999-12-31', granularidad, AHORA)
+
+
+@pytest.mark.parametrize('rango', ['x', '10s', '12345d'])
+def test_rango_con_formato_invalido(rango):
+    with pytest.raises(ParametroInvalido):
+        _rango_tendencia(rango, None, None, 'dia', AHORA)
+
+
+def test_desde_posterior_a_hasta():
+    with pytest.raises(ParametroInvalido):
+        _rango_tendencia(None, '2026-02-01', '2026-01-01', 'dia', AHORA)
+
+
+@pytest.mark.parametrize('parametros', [{'rango': '9999a'}, {'hasta': '9999-12-31'}])
+def test_get_tendencia_responde_400(parametros):
+    data, status = api.get_tendencia.sin_cache(**parametros)
+    assert status == 400
+    assert 'error' in data
@@ -0,0 +1,85 @@
+from unittest import mock
+
+import pytest
+
+from db_connection import fijar_requisito_lectura, restablecer_requisito_lectura
+import versiones
+from versiones import (codificar_versiones, decodificar_versiones, etag_recursos, iniciar_peticion,
+                       olvidar_versiones, terminar_peticion, versiones_vigentes)
+
+VERSIONES = {'canastillas': 3, 'movimientos': 8, 'usuarios': 1}
+
+
+@pytest.fixture
+def lecturas():
+    with mock.patch.object(versiones, 'leer_versiones', return_value=dict(VERSIONES)) as leer:
+        yield leer
+
+
+@pytest.fixture
+def peticion():
+    olvidar_versiones()
+    token_requisito = fijar_requisito_lectura(None)
+    token = iniciar_peticion()
+    yield
+    terminar_peticion(token)
+    restablecer_requisito_lectura(token_requisito)
+
+
+def test_una_lectura_por_peticion(lecturas, peticion):
+    assert etag_recursos(('movimientos',)) == 'W/"m8"'
+    assert versiones_vigentes('canastillas', 'usuarios') == {'canastillas': 3, 'usuarios': 1}
+    assert versiones_vigentes('usuarios') == {'usuarios': 1}
+    assert lecturas.call_count == 1
+
+
+def test_la_lectura_se_reutiliza_entre_peticiones(lecturas, peticion):
+    for _ in range(3):
+        token = iniciar_peticion()
+        assert versiones_vigentes('movimientos') == {'movimientos': 8}
+        terminar_peticion(token)
+    assert lecturas.call_count == 1
+
+
+def test_olvidar_versiones_fuerza_otra_lectura(lecturas, peticion):
+    versiones_vigentes('movimientos')
+    olvidar_versiones()
+    token = iniciar_peticion()
+    versiones_vigentes('movimientos')
+    terminar_peticion(token)
+    assert lecturas.call_count == 2
+
+
+def test_lectura_anterior_a_una_escritura_no_se_recuerda(peticion):
+    def leer(*recursos):
+        # Una escritura del proceso se confirma mientras la lectura está en curso
+        olvidar_versiones()
+        return dict(VERSIONES)
+
+    with mock.patch.object(versiones, 'leer_versiones', side_effect=leer) as leer_versiones:
+        versiones_vigentes('movimientos')
+        token = iniciar_peticion()
+        versiones_vigentes('movimientos')
+        terminar_peticion(token)
+    assert leer_versiones.call_count == 2
+
+
+def test_etag_con_datos_extra(lecturas, peticion):
+    assert etag_recursos(('canastillas', 'usuarios'), '2026-01-01') == 'W/"c3.u1.2026-01-01"'
+
+
+def test_sin_versiones_no_hay_etag(peticion):
+    with mock.patch.object(versiones, 'leer_versiones', return_value=None):
+        assert etag_recursos(('movimientos',)) is None
+        assert versiones_vigentes('movimientos') is None
+
+
+def test_token_de_lectura_ida_y_vuelta():
+    token = codificar_versiones(VERSIONES)
+    assert token == 'c3.m8.u1'
+    assert decodificar_versiones(token) == VERSIONES
+
+
+@pytest.mark.parametrize('token', ['x3', 'c', 'c3.mx'])
+def test_token_de_lectura_invalido(token):
+    assert decodificar_versiones(token) is None
@@ -0,0 +1,31 @@
+import pytest
+
+import api
+import medicion
+from viajes import ESCENARIOS, _Conexion, _lote_movimientos, contar_viajes
+
+
+def _viajes_dashboard(funcion):
+    usadas = medicion._con_conexion(funcion, _Conexion)
+    return sum(len(conexion.sentencias) for conexion in usadas)
+
+
+def test_dashboard_en_dos_viajes():
+    assert _viajes_dashboard(medicion._dashboard_antes) == len(medicion.CONSULTAS_DASHBOARD_ANTES)
+    assert _viajes_dashboard(api.get_dashboard_metrics.sin_cache) <= 2
+
+
+@pytest.mark.parametrize('nombre, funcion, argumentos, filas, opciones, esperado, maximo', ESCENARIOS,
+                         ids=[escenario[0] for escenario in ESCENARIOS])
+def test_presupuesto_de_viajes(nombre, funcion, argumentos, filas, opciones, esperado, maximo):
+    status, sentencias = contar_viajes(funcion, argumentos, filas, **opciones)
+    assert status == esperado
+    assert len(sentencias) <= maximo
+
+
+def test_lote_no_crece_con_la_cantidad():
+    chico, filas_chico = _lote_movimientos(cantidad=10)
+    grande, filas_grande = _lote_movimientos(cantidad=400)
+    _, viajes_chico = contar_viajes(api.add_movimientos_lote, (chico,), filas_chico)
+    _, viajes_grande = contar_viajes(api.add_movimientos_lote, (grande,), filas_grande)
+    assert len(viajes_grande) == len(viajes_chico)
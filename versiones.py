@@ -0,0 +1,182 @@
+from db_connection import get_db_connection, close_db_connection, exigir_versiones
+from db_connection import cumple_requisito_lectura, versiones_replicas
+import contextvars
+import logging
+import os
+import threading
+import time
+
+from mysql.connector import Error
+
+logger = logging.getLogger(__name__)
+
+RECURSOS = ('canastillas', 'movimientos', 'usuarios')
+
+# Versiones leídas en la petición en curso. El ETag y la caché usan esta
+# misma lectura, así el cuerpo corresponde al ETag.
+_versiones_peticion = contextvars.ContextVar('versiones_peticion', default=None)
+
+# Segundos que el proceso reutiliza su última lectura de versiones. Sus
+# propias escrituras la descartan al invalidar la caché; las de otros
+# procesos se ven a más tardar pasado este tiempo.
+VERSIONES_TTL = float(os.environ.get('VERSIONES_TTL', '1'))
+
+_ultimas_versiones = None  # (expira, versiones)
+_generacion = 0
+_versiones_lock = threading.Lock()
+
+
+def incrementar_versiones(cursor, *recursos):
+    """
+    Incrementa la versión de los recursos dentro de la transacción del
+    llamador. Conviene llamarla justo antes del commit para retener el
+    bloqueo de la fila el menor tiempo posible.
+    """
+    recursos = sorted(set(recursos))
+    cursor.execute(f"""
+        UPDATE versiones_recursos SET version = version + 1
+        WHERE recurso IN ({', '.join(['%s'] * len(recursos))})
+    """, recursos)
+
+
+def leer_versiones(*recursos):
+    """
+    Retorna {recurso: version}, o None si no se pudo consultar
+    """
+    connection = get_db_connection()
+    if connection is None:
+        return None
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            SELECT recurso, version FROM versiones_recursos
+            WHERE recurso IN ({', '.join(['%s'] * len(recursos))})
+        """, recursos)
+        return {recurso: int(version) for recurso, version in cursor.fetchall()}
+
+    except Error as e:
+        logger.error(f"Error al leer las versiones de los recursos: {e}")
+        return None
+
+    finally:
+        if connection:
+            cursor.close()
+            close_db_connection(connection)
+
+
+def _versiones_recientes():
+    """
+    Versiones de todos los RECURSOS según la última lectura del proceso, si
+    no venció y alcanza el requisito de lectura de la petición. Si no, con
+    réplicas se toman las que ya tienen según el monitor, sin viaje a la
+    base; la primaria solo se consulta sin réplicas o si ninguna alcanza el
+    requisito. Retorna None si no se pudieron consultar.
+    """
+    ultimas = _ultimas_versiones
+    if ultimas is not None and time.monotonic() < ultimas[0] and cumple_requisito_lectura(ultimas[1]):
+        return ultimas[1]
+    generacion = _generacion
+    versiones = versiones_replicas() or leer_versiones(*RECURSOS)
+    if versiones is None or not all(recurso in versiones for recurso in RECURSOS):
+        return None
+    versiones = {recurso: versiones[recurso] for recurso in RECURSOS}
+    _recordar_versiones(versiones, generacion)
+    return versiones
+
+
+def _recordar_versiones(versiones, generacion):
+    global _ultimas_versiones
+    with _versiones_lock:
+        # Una lectura que empezó antes de olvidar_versiones puede no incluir esa escritura
+        if generacion == _generacion:
+            _ultimas_versiones = (time.monotonic() + VERSIONES_TTL, versiones)
+
+
+def olvidar_versiones():
+    """
+    Descarta la última lectura del proceso; se llama tras confirmar una escritura
+    """
+    global _ultimas_versiones, _generacion
+    with _versiones_lock:
+        _generacion += 1
+        _ultimas_versiones = None
+
+
+def iniciar_peticion():
+    """
+    Abre el registro de versiones de una petición. Retorna el token para
+    terminar_peticion.
+    """
+    return _versiones_peticion.set({})
+
+
+def terminar_peticion(token):
+    _versiones_peticion.reset(token)
+
+
+def _versiones_de_la_peticion():
+    """
+    Versiones de todos los RECURSOS, leídas una sola vez por petición: el
+    ETag y cada función cacheada que se llame después usan la misma lectura.
+    Retorna None si no se pudieron consultar.
+    """
+    leidas = _versiones_peticion.get()
+    if leidas:
+        return leidas
+    versiones = _versiones_recientes()
+    if versiones is None:
+        return None
+    if leidas is not None:
+        leidas.update(versiones)
+    return versiones
+
+
+def versiones_vigentes(*recursos):
+    """
+    Versiones de los recursos para validar una lectura: las que la petición
+    ya leyó, o una lectura de todos los recursos si es la primera. Retorna
+    None si no se pudieron consultar.
+    """
+    versiones = _versiones_de_la_peticion()
+    if versiones is None:
+        return None
+    return {recurso: versiones[recurso] for recurso in recursos}
+
+
+def etag_recursos(recursos, *extra):
+    """
+    ETag débil a partir de la versión de los recursos de los que depende una
+    respuesta. `extra` agrega otros datos que la cambian sin escrituras,
+    como la fecha del día. Retorna None si no se pudieron leer las versiones.
+    """
+    versiones = versiones_vigentes(*recursos)
+    if versiones is None:
+        return None
+    # Las lecturas de la petición no pueden venir de una réplica más atrasada que el ETag
+    exigir_versiones(versiones)
+    partes = [f"{recurso[0]}{versiones[recurso]}" for recurso in recursos]
+    partes.extend(str(valor) for valor in extra)
+    return 'W/"' + '.'.join(partes) + '"'
+
+
+def codificar_versiones(versiones):
+    """
+    Token de lectura con el formato del ETag: 'c105.m230.u7'
+    """
+    return '.'.join(f"{recurso[0]}{versiones[recurso]}" for recurso in RECURSOS if recurso in versiones)
+
+
+def decodificar_versiones(token):
+    """
+    Retorna {recurso: version} de un token de codificar_versiones, o None
+    si no es válido
+    """
+    por_inicial = {recurso[0]: recurso for recurso in RECURSOS}
+    versiones = {}
+    for parte in (token or '').split('.'):
+        recurso = por_inicial.get(parte[:1])
+        if recurso is None or not parte[1:].isdigit():
+            return None
+        versiones[recurso] = int(parte[1:])
+    return versiones
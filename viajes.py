@@ -0,0 +1,138 @@
+import sys
+from unittest import mock
+
+from mysql.connector import errorcode, errors
+
+import api
+
+
+class _Cursor:
+    """
+    Cursor que cuenta cada sentencia como un viaje a la base y responde
+    con las filas preparadas, en orden, a cada SELECT
+    """
+
+    def __init__(self, conexion):
+        self._conexion = conexion
+        self._resultado = None
+        self.rowcount = 0
+        self.lastrowid = 1
+
+    def execute(self, sql, parametros=()):
+        self._conexion.registrar(sql)
+        if self._conexion.fallo and self._conexion.fallo[0] in sql:
+            raise errors.IntegrityError(errno=self._conexion.fallo[1], msg="error simulado")
+        if sql.lstrip().upper().startswith('SELECT'):
+            self._resultado = self._conexion.filas.pop(0) if self._conexion.filas else None
+        else:
+            self.rowcount = self._conexion.filas_afectadas
+
+    def executemany(self, sql, filas):
+        # El driver envía los INSERT de varias filas en una sola sentencia
+        self.execute(sql)
+
+    def fetchone(self):
+        if isinstance(self._resultado, list):
+            return self._resultado[0] if self._resultado else None
+        return self._resultado
+
+    def fetchall(self):
+        if self._resultado is None:
+            return []
+        return self._resultado if isinstance(self._resultado, list) else [self._resultado]
+
+    def close(self):
+        pass
+
+
+class _Conexion:
+    """
+    Conexión falsa que cuenta los viajes: sentencias, commit y rollback
+    """
+
+    def __init__(self, filas=(), filas_afectadas=1, fallo=None):
+        self.filas = list(filas)
+        self.filas_afectadas = filas_afectadas
+        self.fallo = fallo  # (fragmento de SQL, errno) para simular una restricción violada
+        self.sentencias = []
+
+    def registrar(self, sql):
+        self.sentencias.append(' '.join(sql.split())[:70])
+
+    def cursor(self, dictionary=False):
+        return _Cursor(self)
+
+    def commit(self):
+        self.registrar('COMMIT')
+
+    def rollback(self):
+        self.registrar('ROLLBACK')
+
+
+def _lote_movimientos(cantidad=100, canastillas=10):
+    movimientos = [{"id_canastilla": f"C{i % canastillas}", "tipo_movimiento": 'entrada',
+                    "ubicacion_origen": 'A', "ubicacion_destino": 'B', "id_usuario_responsable": 1}
+                   for i in range(cantidad)]
+    filas = [[(f"C{i}", 'A', 'Disponible') for i in range(canastillas)]]
+    return movimientos, filas
+
+
+# (nombre, función, argumentos, filas de los SELECT, opciones, status esperado, máximo de viajes)
+_MOVIMIENTOS_LOTE, _FILAS_LOTE = _lote_movimientos()
+ESCENARIOS = [
+    ("add_canastilla", api.add_canastilla, ('C1', 'Disponible', 'A'), [], {}, 201, 4),
+    ("add_canastilla duplicada", api.add_canastilla, ('C1', 'Disponible', 'A'), [],
+     {"fallo": ('INSERT INTO canastillas', errorcode.ER_DUP_ENTRY)}, 400, 2),
+    ("update_canastilla", api.update_canastilla, ('C1', 'Disponible', 'B'), [('A', 'Disponible')], {}, 200, 5),
+    ("delete_canastilla", api.delete_canastilla, ('C1',), [('A', 'Disponible', 0)], {}, 200, 6),
+    ("delete_canastilla con movimientos", api.delete_canastilla, ('C1',), [('A', 'Disponible', 1)], {}, 400, 1),
+    ("add_movimiento", api.add_movimiento, ('C1', 'entrada', 'A', 'B', 1), [('A', 'Disponible')], {}, 201, 8),
+    ("add_movimientos_lote (100)", api.add_movimientos_lote, (_MOVIMIENTOS_LOTE,), _FILAS_LOTE, {}, 200, 8),
+    ("update_movimiento", api.update_movimiento, (1, 'C1', 'salida', 'A', 'B', 1),
+     [{"tipo_movimiento": 'entrada', "id_canastilla": 'C1', "ubicacion_origen": 'A', "ubicacion_destino": 'B',
+       "fecha_movimiento": None, "ubicacion": 'B', "estado": 'Disponible'}], {}, 200, 7),
+    ("update_movimiento inexistente", api.update_movimiento, (1, 'C1', 'salida', 'A', 'B', 1), [], {}, 404, 1),
+    ("delete_movimiento", api.delete_movimiento, (1,), [('2026-01', 'C1', None, 'entrada', 'A', 'B')], {}, 200, 7),
+    ("add_usuario", api.add_usuario, ('Ana', 'ana@x.co', 'clave', 'admin', 'activo'), [], {}, 201, 3),
+    ("add_usuario email repetido", api.add_usuario, ('Ana', 'ana@x.co', 'clave', 'admin', 'activo'), [],
+     {"fallo": ('INSERT INTO usuarios', errorcode.ER_DUP_ENTRY)}, 400, 2),
+    ("update_usuario", api.update_usuario, (1, 'Ana', 'ana@x.co', 'admin', 'activo'), [], {}, 200, 3),
+    ("update_usuario inexistente", api.update_usuario, (1, 'Ana', 'ana@x.co', 'admin', 'activo'), [],
+     {"filas_afectadas": 0}, 404, 2),
+    ("delete_usuario", api.delete_usuario, (1,), [], {}, 200, 4),
+    ("delete_usuario con movimientos", api.delete_usuario, (1,), [(1,)], {"filas_afectadas": 0}, 400, 2),
+]
+
+
+def contar_viajes(funcion, argumentos, filas=(), **opciones):
+    """
+    Ejecuta una función de api.py contra una conexión falsa. Retorna
+    (status, sentencias enviadas incluyendo commit y rollback).
+    """
+    conexion = _Conexion(filas, **opciones)
+    with mock.patch.object(api, 'get_db_connection', return_value=conexion), \
+            mock.patch.object(api, 'close_db_connection'):
+        _, status = funcion(*argumentos)
+    return status, conexion.sentencias
+
+
+def main():
+    """
+    Verifica el presupuesto de viajes a la base de cada escritura. Retorna
+    1 si alguna lo supera o responde un status distinto del esperado.
+    """
+    fallidos = 0
+    for nombre, funcion, argumentos, filas, opciones, esperado, maximo in ESCENARIOS:
+        status, sentencias = contar_viajes(funcion, argumentos, filas, **opciones)
+        correcto = status == esperado and len(sentencias) <= maximo
+        fallidos += not correcto
+        print(f"{'ok ' if correcto else 'ERR'} {nombre:<36} status {status} (esperado {esperado})  "
+              f"viajes {len(sentencias)} / {maximo}")
+        if not correcto:
+            for sentencia in sentencias:
+                print(f"      {sentencia}")
+    return 1 if fallidos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())